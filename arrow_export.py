@@ -0,0 +1,207 @@
+import datetime
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+    pq = None
+
+from common_functions_ss import prepareDate
+from sheet_frame import SheetFrame
+
+ROW_GROUP_SIZE = 50000
+
+
+def _requirePyarrow() -> None:
+    if pa is None:
+        raise ImportError("pyarrow is needed to export sheets and reports: pip install pyarrow")
+
+
+def _toString(value: Any) -> Optional[str]:
+    if value is None or isinstance(value, str):
+        return value
+    if isinstance(value, bool):
+        return str(value).lower()
+    return str(value)
+
+
+def _toFloat(value: Any) -> Optional[float]:
+    if value is None or isinstance(value, bool):
+        return None
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _toBool(value: Any) -> Optional[bool]:
+    if value is None:
+        return None
+    return value is True or (isinstance(value, str) and value.lower() == "true")
+
+
+def _toDate(value: Any) -> Optional[datetime.date]:
+    if not isinstance(value, str):
+        return None
+    date = prepareDate(value)
+    return date.date() if isinstance(date, datetime.datetime) else None
+
+
+def _toTimestamp(value: Any) -> Optional[datetime.datetime]:
+    if not isinstance(value, str):
+        return None
+    try:
+        date = datetime.datetime.fromisoformat(value.replace("Z", "+00:00"))
+    except ValueError:
+        return None
+    if date.tzinfo is None:
+        date = date.replace(tzinfo=datetime.timezone.utc)
+    return date
+
+
+def arrowType(column: dict, types: Optional[Dict[str, str]] = None):
+    """
+    Arrow type and value converter of a smartsheet column. TEXT_NUMBER columns can mix text and
+    numbers so they are exported as strings unless types asks for "float64" for the column title,
+    see frameTypes to choose it from the values of a SheetFrame
+    Args:
+        :param column is a column of a sheet or report with its type (columnType=true)
+        :param types is a dictionary {column_title: "string"|"float64"|"bool"|"date"|"timestamp"} to override the mapping
+    Return:
+        :return arrow_type, converter is the arrow type and the function applied to each cell value
+    """
+    _requirePyarrow()
+    kind = (types or {}).get(column["title"])
+    if kind is None:
+        column_type = column.get("type")
+        if column_type == "DATE":
+            kind = "date"
+        elif column_type in ("DATETIME", "ABSTRACT_DATETIME"):
+            kind = "timestamp"
+        elif column_type == "CHECKBOX":
+            kind = "bool"
+        else:
+            kind = "string"
+    mapping = {
+        "string": (pa.string(), _toString),
+        "float64": (pa.float64(), _toFloat),
+        "bool": (pa.bool_(), _toBool),
+        "date": (pa.date32(), _toDate),
+        "timestamp": (pa.timestamp("s", tz="UTC"), _toTimestamp),
+    }
+    if kind not in mapping:
+        raise ValueError(f"unknown export type {kind} for {column['title']}")
+    return mapping[kind]
+
+
+def frameTypes(frame: SheetFrame) -> Dict[str, str]:
+    """Export types of the TEXT_NUMBER columns of a frame: "float64" for the columns stored as numbers
+    and "string" for the columns with text, mixed values or empty"""
+    return {title: "float64" if frame.column(title).valueType() is float else "string"
+            for title, column_type in frame.column_types.items() if column_type == "TEXT_NUMBER"}
+
+
+class ArrowExporter:
+
+    def __init__(self, path: str, columns: List[dict], file_format: str = "parquet",
+                 row_group_size: int = ROW_GROUP_SIZE, types: Optional[Dict[str, str]] = None,
+                 compression: str = "snappy"):
+        """
+        Typed columnar writer of sheet or report rows. Cell values are written into one buffer per
+        column and every row_group_size rows the buffers are converted to arrow arrays and written as a
+        row group, so memory is bounded by row_group_size whatever the number of rows.
+        Report columns and cells use virtualId/virtualColumnId and sheet ones id/columnId, both are accepted
+        Args:
+            :param path is the file to write
+            :param columns is the columns info of the sheet or report
+            :param file_format is "parquet" or "arrow" (arrow IPC file)
+            :param row_group_size is the number of rows of each row group
+            :param types is a dictionary {column_title: type} to override the type of some columns, see arrowType
+            :param compression is the parquet compression codec
+        """
+        _requirePyarrow()
+        self.row_group_size = row_group_size
+        self.rows = 0
+        fields = [pa.field("rowId", pa.int64()), pa.field("rowNumber", pa.int32()),
+                  pa.field("sheetId", pa.int64())]
+        self.types = []
+        self.converters: List[Callable[[Any], Any]] = []
+        self.positions = {}
+        for position, column in enumerate(columns):
+            arrow_type, converter = arrowType(column, types)
+            fields.append(pa.field(column["title"], arrow_type))
+            self.types.append(arrow_type)
+            self.converters.append(converter)
+            self.positions[column["virtualId"] if "virtualId" in column else column["id"]] = position
+        self.schema = pa.schema(fields)
+        if file_format == "parquet":
+            self.writer = pq.ParquetWriter(path, self.schema, compression=compression)
+        elif file_format == "arrow":
+            self.writer = pa.ipc.new_file(path, self.schema)
+        else:
+            raise ValueError(f"unknown export format {file_format}")
+        self._reset()
+
+    def _reset(self) -> None:
+        self._count = 0
+        self._row_ids = []
+        self._row_numbers = []
+        self._sheet_ids = []
+        self._values = [[None] * self.row_group_size for _ in self.converters]
+
+    def write(self, row: dict) -> None:
+        position = self._count
+        self._row_ids.append(row.get("id"))
+        self._row_numbers.append(row.get("rowNumber"))
+        self._sheet_ids.append(row.get("sheetId"))
+        for cell in row.get("cells", []):
+            column = self.positions.get(cell["virtualColumnId"] if "virtualColumnId" in cell else cell.get("columnId"))
+            if column is not None:
+                self._values[column][position] = cell.get("value")
+        self._count += 1
+        if self._count == self.row_group_size:
+            self.flush()
+
+    def writeRows(self, rows: Iterable[dict]) -> int:
+        for row in rows:
+            self.write(row)
+        return self.rows
+
+    def flush(self) -> None:
+        if not self._count:
+            return
+        count = self._count
+        arrays = [pa.array(self._row_ids, type=pa.int64()),
+                  pa.array(self._row_numbers, type=pa.int32()),
+                  pa.array(self._sheet_ids, type=pa.int64())]
+        for arrow_type, converter, values in zip(self.types, self.converters, self._values):
+            arrays.append(pa.array([converter(value) for value in values[:count]], type=arrow_type))
+        self.writer.write_batch(pa.record_batch(arrays, schema=self.schema))
+        self.rows += count
+        self._reset()
+
+    def close(self) -> None:
+        self.flush()
+        self.writer.close()
+
+    def __enter__(self) -> "ArrowExporter":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+def exportRows(path: str, columns: List[dict], rows: Iterable[dict], **kwargs) -> int:
+    """Write the rows of a sheet or report to path, kwargs are the options of ArrowExporter.
+    Returns the number of rows written"""
+    with ArrowExporter(path, columns, **kwargs) as exporter:
+        exporter.writeRows(rows)
+    return exporter.rows
+
+
+def exportFrame(path: str, frame: SheetFrame, types: Optional[Dict[str, str]] = None, **kwargs) -> int:
+    """Write a SheetFrame to path with the TEXT_NUMBER columns typed by frameTypes, types overrides them
+    and kwargs are the other options of ArrowExporter. Returns the number of rows written"""
+    return exportRows(path, frame.columns_list, frame.iterRows(), types={**frameTypes(frame), **(types or {})}, **kwargs)
@@ -0,0 +1,64 @@
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+
+from smartsheetControler import Smartsheet
+
+
+class AsyncSmartsheet:
+
+    def __init__(self, TOKEN: str, max_concurrency: int = 10, client: Optional[Smartsheet] = None):
+        """
+        asyncio version of smartsheetControler.Smartsheet, it exposes the same methods as coroutines.
+        Every call runs the sync method on a worker thread sharing the pooled transport, the number of
+        workers bounds how many calls are in flight at the same time
+        Args:
+            :param TOKEN is the token to connect to smartsheet
+            :param max_concurrency is the maximum number of requests running at the same time
+            :param client is an optional sync client to reuse its transport and configuration, it is not closed by close()
+        """
+        self._owns_client = client is None
+        self.client = client if client else Smartsheet(TOKEN, pool_size=max_concurrency)
+        self.max_concurrency = max_concurrency
+        self.executor = ThreadPoolExecutor(max_workers=max_concurrency)
+
+    async def _run(self, method, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, functools.partial(method, *args, **kwargs))
+
+    def __getattr__(self, name: str):
+        method = getattr(self.client, name)
+        if not callable(method) or name.startswith("_"):
+            return method
+
+        @functools.wraps(method)
+        async def wrapper(*args, **kwargs):
+            return await self._run(method, *args, **kwargs)
+        return wrapper
+
+    async def _fanOut(self, method, sheetIds: list, **kwargs) -> list:
+        """Run a multi sheet method once per sheet concurrently, the result list keeps the order of
+        sheetIds and exceptions are returned in place so one failed sheet does not cancel the others.
+        Every call gets a single sheet, so it runs on its worker thread without a pool of its own"""
+        tasks = [self._run(method, sheetIds=[sheetId], **kwargs) for sheetId in sheetIds]
+        return await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def create_columns(self, sheetIds: list, payload: list, reference_column: Optional[str] = None) -> list:
+        return await self._fanOut(self.client.create_columns, sheetIds, payload=payload, reference_column=reference_column,
+                                  max_workers=1)
+
+    async def update_columns(self, sheetIds: list, row_data: dict) -> list:
+        return await self._fanOut(self.client.update_columns, sheetIds, row_data=row_data, max_workers=1)
+
+    async def delete_columns(self, sheetIds: list, list_columns: set) -> list:
+        return await self._fanOut(self.client.delete_columns, sheetIds, list_columns=list_columns, max_workers=1)
+
+    async def changeSheetPlace(self, sheetIds: list, destinationId: int, destinationType: str = "folder") -> list:
+        return await self._fanOut(self.client.changeSheetPlace, sheetIds, destinationId=destinationId, destinationType=destinationType)
+
+    async def close(self) -> None:
+        """Stop the workers, the transport is closed only when the client was created here"""
+        self.executor.shutdown(wait=True)
+        if self._owns_client:
+            self.client.transport.close()
@@ -0,0 +1,67 @@
+import logging
+import os
+import re
+from typing import Optional
+
+import requests
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 1024 * 1024
+
+
+def attachmentPath(dest: str, attachment: dict) -> str:
+    """Local path of an attachment, the id avoids collisions between files with the same name"""
+    name = re.sub(r'[\\/:*?"<>|]', "_", attachment.get("name") or "attachment")
+    return os.path.join(dest, f"{attachment['id']}_{name}")
+
+
+def isDownloaded(path: str, attachment: dict) -> bool:
+    """A file is only renamed to its final path once it is complete, its size must also match the
+    size in KB reported by smartsheet"""
+    if not os.path.exists(path):
+        return False
+    size_kb = attachment.get("sizeInKb")
+    if size_kb is None:
+        return True
+    return abs(os.path.getsize(path) / 1024 - size_kb) <= 1
+
+
+def downloadFile(transport, url: str, path: str, chunk_size: int = CHUNK_SIZE) -> Optional[int]:
+    """
+    Stream a file to disk in chunks so memory stays flat whatever the file size. The body is written to
+    path.part and renamed when complete, an existing .part file is resumed with a Range request.
+    Args:
+        :param transport is the pooled transport used for the request
+        :param url is the download url of the attachment, it is presigned so no Authorization is sent
+        :param path is the final path of the file
+        :param chunk_size is the size of the chunks written to disk
+    Return:
+        :return size is the size of the file or None if the download failed, the .part file of a
+        connection error is kept so the next call resumes it
+    """
+    partial_path = f"{path}.part"
+    offset = os.path.getsize(partial_path) if os.path.exists(partial_path) else 0
+    headers = {"Range": f"bytes={offset}-"} if offset else None
+    try:
+        response = transport.get(url=url, headers=headers, stream=True)
+        try:
+            if response.status_code == 416:
+                # the .part file already has the full body
+                os.replace(partial_path, path)
+                return os.path.getsize(path)
+            if response.status_code not in (200, 206):
+                logger.error("failed downloading %s: %s", os.path.basename(path), response.status_code)
+                return None
+            # a server that ignores the Range header sends the full body again
+            mode = "ab" if response.status_code == 206 else "wb"
+            with open(partial_path, mode) as f:
+                for chunk in response.iter_content(chunk_size=chunk_size):
+                    f.write(chunk)
+        finally:
+            response.close()
+        os.replace(partial_path, path)
+        return os.path.getsize(path)
+    except (requests.RequestException, OSError) as e:
+        logger.error("failed downloading %s: %s", os.path.basename(path), e)
+        return None
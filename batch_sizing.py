@@ -0,0 +1,111 @@
+import json
+import os
+import threading
+from typing import Optional
+
+from common_functions_ss import writeAtomically
+from instrumentation import emit
+
+
+DEFAULT_STATE_PATH = os.path.join(os.path.expanduser("~"), ".smartsheet_batch_sizes.json")
+# answers that mean the lot was too big: body too large, url too long or a 400 with a limit error code
+SIZE_STATUS = {413, 414}
+SIZE_ERROR_CODES = {1018}
+
+
+def isSizeRejection(response) -> bool:
+    """True if smartsheet rejected a request because of its size, any other failure (auth, missing sheet,
+    throttling or an outage) does not depend on the lot size"""
+    if response.status_code in SIZE_STATUS:
+        return True
+    if response.status_code != 400:
+        return False
+    try:
+        body = response.json()
+    except ValueError:
+        return False
+    return isinstance(body, dict) and body.get("errorCode") in SIZE_ERROR_CODES
+
+
+class BatchSizer:
+
+    def __init__(self, path: Optional[str] = DEFAULT_STATE_PATH, maximum: int = 500, minimum: int = 1,
+                 increase: int = 50, reprobe_after: int = 20):
+        """
+        Learn the biggest lot of rows accepted by smartsheet for each sheet and operation.
+        A failure remembers the failing size as ceiling and retries between the biggest size known to
+        work and the failing one (or halves it when nothing is known), successes grow the size back with
+        a binary search towards the ceiling (or additively if there is no ceiling). After
+        reprobe_after successes in a row the ceiling is forgotten so the size can grow again.
+        Args:
+            :param path is the json file where learned sizes are kept between runs, None to keep them only in memory
+            :param maximum is the biggest lot ever tried
+            :param minimum is the smallest lot, failing with it means the request is not a size problem
+            :param increase is the additive growth used when there is no known ceiling
+            :param reprobe_after is the number of consecutive successes before forgetting the ceiling
+        """
+        self.path = path
+        self.maximum = maximum
+        self.minimum = minimum
+        self.increase = increase
+        self.reprobe_after = reprobe_after
+        self._lock = threading.Lock()
+        self.state = self._load()
+
+    @staticmethod
+    def key(sheetId: int, operation: str) -> str:
+        return f"{sheetId}:{operation}"
+
+    def _load(self) -> dict:
+        if not self.path or not os.path.exists(self.path):
+            return {}
+        try:
+            with open(self.path, "r") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _save(self) -> None:
+        if not self.path:
+            return
+        # a file that can not be written keeps the learned sizes only in memory
+        writeAtomically(self.path, lambda f: json.dump(self.state, f))
+
+    def size(self, key: str) -> int:
+        with self._lock:
+            return self.state.get(key, {}).get("size", self.maximum)
+
+    def success(self, key: str, used: int) -> None:
+        emit("batch", key=key, size=used, success=True)
+        with self._lock:
+            info = self.state.setdefault(key, {"size": self.maximum, "floor": None, "ceiling": None, "streak": 0})
+            info["streak"] += 1
+            if info["ceiling"] and info["streak"] >= self.reprobe_after:
+                info["ceiling"] = None
+                info["streak"] = 0
+            # only a full lot proves the size, the last lot of an operation is usually shorter
+            if used >= info["size"]:
+                info["floor"] = max(info.get("floor") or 0, used)
+                if info["ceiling"]:
+                    new_size = used + (info["ceiling"] - used) // 2
+                else:
+                    new_size = used + self.increase
+                info["size"] = max(self.minimum, min(self.maximum, new_size))
+            self._save()
+
+    def failure(self, key: str, used: int) -> int:
+        """Register a failed lot and return the new size to retry with"""
+        emit("batch", key=key, size=used, success=False)
+        with self._lock:
+            info = self.state.setdefault(key, {"size": self.maximum, "floor": None, "ceiling": None, "streak": 0})
+            info["ceiling"] = used
+            info["streak"] = 0
+            floor = info.get("floor")
+            if floor and floor < used:
+                new_size = (floor + used) // 2 if used - floor > 1 else floor
+            else:
+                info["floor"] = None
+                new_size = used // 2
+            info["size"] = max(self.minimum, new_size)
+            self._save()
+            return info["size"]
@@ -0,0 +1,141 @@
+import argparse
+import gc
+import json
+import logging
+import os
+import subprocess
+import sys
+import time
+import tracemalloc
+from typing import Callable, List
+
+import requests
+
+from instrumentation import Metrics
+from smartsheetControler import Smartsheet
+import smartsheet_manage
+
+DEFAULT_SIZES = [1000, 10000, 100000]
+NEW_COLUMNS = [{"title": "Benchmark 1", "type": "TEXT_NUMBER"}, {"title": "Benchmark 2", "type": "TEXT_NUMBER"}]
+
+
+class MockProcess:
+
+    def __init__(self, **options):
+        """
+        Mock server in its own process, so its memory and cpu are not measured with the client
+        Args:
+            :param options are the options of mock_smartsheet.py, e.g. latency=0.05
+        """
+        command = [sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)), "mock_smartsheet.py"), "--port", "0"]
+        for key, value in options.items():
+            if value is not None:
+                command += [f"--{key.replace('_', '-')}", str(value)]
+        self.process = subprocess.Popen(command, stdout=subprocess.PIPE, text=True)
+        self.url = self.process.stdout.readline().strip()
+
+    def control(self, method: str, name: str, payload: dict = None) -> dict:
+        response = requests.request(method, f"{self.url}/_mock/{name}", json=payload)
+        response.raise_for_status()
+        return response.json()
+
+    def seed(self, **payload) -> dict:
+        return self.control("POST", "seed", payload)
+
+    def stats(self) -> dict:
+        return self.control("GET", "stats")
+
+    def resetStats(self) -> None:
+        self.control("DELETE", "stats")
+
+    def stop(self) -> None:
+        self.process.terminate()
+        self.process.wait()
+
+
+def measure(server: MockProcess, name: str, size: int, operation: Callable[[], object]) -> dict:
+    """Run an operation and return the calls and bytes seen by the server, the wall time and the peak of
+    memory allocated by the client while it ran"""
+    gc.collect()
+    server.resetStats()
+    tracemalloc.reset_peak()
+    base = tracemalloc.get_traced_memory()[0]
+    start = time.perf_counter()
+    operation()
+    wall = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1] - base
+    stats = server.stats()
+    return {"rows": size, "operation": name, "calls": stats["calls"], "wallSeconds": round(wall, 3),
+            "bytesSent": stats["bytesIn"], "bytesReceived": stats["bytesOut"], "throttled": stats["throttled"],
+            "errors": stats["errors"], "peakMemoryBytes": peak}
+
+
+def runSize(server: MockProcess, size: int, requests_per_minute: int) -> List[dict]:
+    origin = server.seed(rows=size, name=f"origin {size}")["sheetId"]
+    target = server.seed(rows=0, name=f"target {size}")["sheetId"]
+    report = server.seed(report=[origin])["reportId"]
+    # a token per size so every run starts with its own rate limiter
+    token = f"benchmark-{size}-{time.time()}"
+    client = Smartsheet(token, base_url=server.url, batch_state_path=None, journal_dir=None,
+                        requests_per_minute=requests_per_minute)
+    manage = smartsheet_manage.Smartsheet(token, base_url=server.url, transport=client.transport)
+    operations = [
+        ("getSheet", lambda: client.getSheet(origin)),
+        ("getReports", lambda: manage.getReports(report)),
+        ("create_columns", lambda: client.create_columns([origin], NEW_COLUMNS)),
+        ("moveRowsByCriteria", lambda: client.moveRowsByCriteria(origin, target, {"column": "Status", "values": ["Closed"]})),
+        ("deleteRowsByCriteria", lambda: client.deleteRowsByCriteria(origin, {"column": "Status", "values": ["Late"]})),
+    ]
+    results = [measure(server, name, size, operation) for name, operation in operations]
+    client.transport.close()
+    return results
+
+
+def printTable(results: List[dict]) -> None:
+    header = f"{'rows':>8} {'operation':<22} {'calls':>6} {'wall s':>9} {'sent MB':>9} {'recv MB':>9} {'429':>5} {'peak MB':>9}"
+    print(header)
+    print("-" * len(header))
+    for result in results:
+        print(f"{result['rows']:>8} {result['operation']:<22} {result['calls']:>6} {result['wallSeconds']:>9.3f} "
+              f"{result['bytesSent'] / 1e6:>9.2f} {result['bytesReceived'] / 1e6:>9.2f} {result['throttled']:>5} "
+              f"{result['peakMemoryBytes'] / 1e6:>9.2f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="benchmark of the clients against the local mock of the Smartsheet API")
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES, help="rows of the benchmark sheets")
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds added by the server to every request")
+    parser.add_argument("--jitter", type=float, default=0.0)
+    parser.add_argument("--server-requests-per-minute", type=int, default=None, help="answer 429 above this rate")
+    parser.add_argument("--max-rows-per-request", type=int, default=None, help="answer 400 above this number of rows")
+    parser.add_argument("--max-body-bytes", type=int, default=None)
+    parser.add_argument("--max-url-length", type=int, default=None)
+    parser.add_argument("--client-requests-per-minute", type=int, default=100000, help="budget of the client rate limiter")
+    parser.add_argument("--json", help="file to write the results as json")
+    parser.add_argument("--metrics", help="file to write the client metrics, .json or prometheus text otherwise")
+    parser.add_argument("--verbose", action="store_true", help="show the logs of the clients")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO if args.verbose else logging.WARNING)
+    metrics = Metrics().register()
+
+    server = MockProcess(latency=args.latency, jitter=args.jitter, requests_per_minute=args.server_requests_per_minute,
+                         max_rows_per_request=args.max_rows_per_request, max_body_bytes=args.max_body_bytes,
+                         max_url_length=args.max_url_length)
+    tracemalloc.start()
+    results = []
+    try:
+        for size in args.sizes:
+            results.extend(runSize(server, size, args.client_requests_per_minute))
+    finally:
+        tracemalloc.stop()
+        server.stop()
+    printTable(results)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+    if args.metrics:
+        if args.metrics.endswith(".json"):
+            metrics.toJson(args.metrics)
+        else:
+            with open(args.metrics, "w") as f:
+                f.write(metrics.toPrometheus())
@@ -1,5 +1,10 @@
-from typing import Optional,List,Union
+from typing import Optional,List,Union,Callable,IO
 import datetime
+import logging
+import os
+import tempfile
+
+logger = logging.getLogger(__name__)
 
 
 def createColumnDict(columns_info: List[dict], columns_names: Optional[set] = None) -> dict:
@@ -36,4 +41,59 @@ def prepareDate(date: str)-> Union[datetime.datetime,str]:
         date_value = datetime.datetime(year=int(date_array[0]), month=int(date_array[1]),day=int(date_array[2]))
         return date_value
     except:
-        return "no date"
\ No newline at end of file
+        return "no date"
+
+
+def chunkIds(ids: list, base_length: int = 0, max_ids: int = 400, max_url_length: int = 7000) -> List[list]:
+    """
+    Split a list of ids in chunks to be sent in an url parameter like ids=1,2,3, every chunk has
+    at most max_ids ids and the url with the ids joined by commas stays under max_url_length
+
+    :param ids are the ids to split
+    :param base_length is the length of the url without the ids
+    :param max_ids is the maximum of ids for each chunk
+    :param max_url_length is the maximum length of the full url
+    :return chunks is the list of chunks of ids
+    """
+    chunks = []
+    chunk = []
+    length = base_length
+    for id in ids:
+        id_length = len(str(id)) + 1
+        if chunk and (len(chunk) >= max_ids or length + id_length > max_url_length):
+            chunks.append(chunk)
+            chunk = []
+            length = base_length
+        chunk.append(id)
+        length += id_length
+    if chunk:
+        chunks.append(chunk)
+    return chunks
+
+
+def writeAtomically(path: str, write: Callable[[IO], None]) -> bool:
+    """
+    Write a text file through a unique temporal file in the same folder and rename it over path, so a
+    reader never sees a half written file and processes saving the same path do not share a temporal file.
+    Errors are logged instead of raised, the caller keeps its data in memory
+
+    :param path is the final path of the file
+    :param write is a function that receives the opened temporal file and writes the content
+    :return saved is True if the file was replaced
+    """
+    temporal_path = None
+    try:
+        descriptor, temporal_path = tempfile.mkstemp(
+            dir=os.path.dirname(os.path.abspath(path)), prefix=f".{os.path.basename(path)}.", suffix=".tmp")
+        with os.fdopen(descriptor, "w") as f:
+            write(f)
+        os.replace(temporal_path, path)
+        return True
+    except OSError as e:
+        logger.warning("could not save %s: %s", path, e)
+        if temporal_path and os.path.exists(temporal_path):
+            try:
+                os.remove(temporal_path)
+            except OSError:
+                pass
+        return False
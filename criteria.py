@@ -0,0 +1,212 @@
+import datetime
+import re
+from abc import ABC, abstractmethod
+from typing import Any, Callable, List, Optional, Set
+
+from common_functions_ss import prepareDate
+from sheet_frame import SheetFrame
+
+AVOID_LINES = ["xxx", "XXX"]
+
+
+class Criteria(ABC):
+    """Compiled criteria, positions(frame) returns the positions of the matching rows of a SheetFrame.
+    Leaves use the hash index of their column, so a query costs the number of matches and not the
+    number of rows once the index of the frame exists"""
+
+    @abstractmethod
+    def positions(self, frame: SheetFrame) -> Set[int]:
+        """Positions of the rows of the frame that match"""
+
+    @abstractmethod
+    def columns(self) -> Set[str]:
+        """Titles of the columns used by the criteria"""
+
+
+class _In(Criteria):
+
+    def __init__(self, column: str, values: List[Any]):
+        self.column = column
+        self.values = values
+
+    def positions(self, frame: SheetFrame) -> Set[int]:
+        index = frame.index(self.column)
+        found = set()
+        for value in self.values:
+            found.update(index.positions(value))
+        return found
+
+    def columns(self) -> Set[str]:
+        return {self.column}
+
+
+class _Where(Criteria):
+
+    def __init__(self, column: str, predicate: Callable[[Any], bool]):
+        self.column = column
+        self.predicate = predicate
+
+    def positions(self, frame: SheetFrame) -> Set[int]:
+        return set(frame.index(self.column).positionsWhere(self.predicate))
+
+    def columns(self) -> Set[str]:
+        return {self.column}
+
+
+class _Range(Criteria):
+
+    def __init__(self, column: str, low: Any, high: Any):
+        self.column = column
+        self.low = low
+        self.high = high
+
+    def _bound(self, bound: Any, kind: Optional[type]) -> Any:
+        """Bound converted to the type of the values of the column, numbers sent as text are accepted"""
+        if bound is None or kind is None:
+            return bound
+        if kind is float:
+            try:
+                return float(bound)
+            except (TypeError, ValueError):
+                raise ValueError(f"range of {self.column} needs numbers, {bound!r} is not a number") from None
+        if not isinstance(bound, str):
+            raise ValueError(f"range of {self.column} compares text, {bound!r} is not text")
+        return bound
+
+    def positions(self, frame: SheetFrame) -> Set[int]:
+        kind = frame.column(self.column).valueType()
+        low, high = self._bound(self.low, kind), self._bound(self.high, kind)
+        return set(frame.index(self.column).positionsBetween(low, high))
+
+    def columns(self) -> Set[str]:
+        return {self.column}
+
+
+class _And(Criteria):
+
+    def __init__(self, parts: List[Criteria]):
+        self.parts = parts
+
+    def positions(self, frame: SheetFrame) -> Set[int]:
+        # negated parts are subtracted instead of complemented, so they never walk every row
+        included = [part for part in self.parts if not isinstance(part, _Not)]
+        excluded = [part.part for part in self.parts if isinstance(part, _Not)]
+        if not included:
+            return set(range(len(frame))) - _Or(excluded).positions(frame)
+        found = None
+        # the smallest result first keeps every intersection bounded by the matches
+        for part in sorted((part.positions(frame) for part in included), key=len):
+            found = part if found is None else found & part
+            if not found:
+                return found
+        for part in excluded:
+            found -= part.positions(frame)
+        return found
+
+    def columns(self) -> Set[str]:
+        return set().union(*(part.columns() for part in self.parts))
+
+
+class _Or(Criteria):
+
+    def __init__(self, parts: List[Criteria]):
+        self.parts = parts
+
+    def positions(self, frame: SheetFrame) -> Set[int]:
+        found = set()
+        for part in self.parts:
+            found |= part.positions(frame)
+        return found
+
+    def columns(self) -> Set[str]:
+        return set().union(*(part.columns() for part in self.parts))
+
+
+class _Not(Criteria):
+
+    def __init__(self, part: Criteria):
+        self.part = part
+
+    def positions(self, frame: SheetFrame) -> Set[int]:
+        return set(range(len(frame))) - self.part.positions(frame)
+
+    def columns(self) -> Set[str]:
+        return self.part.columns()
+
+
+def _toDate(value: Any) -> Optional[datetime.datetime]:
+    if not isinstance(value, str):
+        return None
+    date = prepareDate(value)
+    return date if isinstance(date, datetime.datetime) else None
+
+
+def _dateBetween(low: Optional[str], high: Optional[str]) -> Callable[[Any], bool]:
+    low_date = _toDate(low) if low else None
+    high_date = _toDate(high) if high else None
+
+    def predicate(value: Any) -> bool:
+        date = _toDate(value)
+        if date is None:
+            return False
+        return (low_date is None or date >= low_date) and (high_date is None or date <= high_date)
+    return predicate
+
+
+def _regex(pattern: str) -> Callable[[Any], bool]:
+    compiled = re.compile(pattern)
+    return lambda value: value is not None and compiled.search(str(value)) is not None
+
+
+def compileCriteria(expression: dict) -> Criteria:
+    """Compile a criteria expression. Leaves have a column and one condition, combine them with
+    "and", "or" and "not":
+
+        {"column": "Status", "values": ["Open", "Late"]}        same as "in", the old exact search
+        {"column": "Amount", "range": [100, None]}              low <= value <= high, None is open
+        {"column": "Due", "dateRange": ["2024-01-01", None]}    dates parsed with prepareDate
+        {"column": "Name", "regex": "^ACME"}
+        {"column": "Owner", "isNull": True}
+        {"and": [...]}, {"or": [...]}, {"not": {...}}
+        any leaf accepts "not": True to negate it
+
+    Args:
+        expression (dict): criteria expression
+
+    Returns:
+        Criteria: compiled criteria
+    """
+    if "and" in expression:
+        return _And([compileCriteria(part) for part in expression["and"]])
+    if "or" in expression:
+        return _Or([compileCriteria(part) for part in expression["or"]])
+    if isinstance(expression.get("not"), dict):
+        return _Not(compileCriteria(expression["not"]))
+    column = expression["column"]
+    if "values" in expression or "in" in expression:
+        compiled = _In(column, list(expression.get("values", expression.get("in"))))
+    elif "range" in expression:
+        low, high = expression["range"]
+        compiled = _Range(column, low, high)
+    elif "dateRange" in expression:
+        compiled = _Where(column, _dateBetween(*expression["dateRange"]))
+    elif "regex" in expression:
+        compiled = _Where(column, _regex(expression["regex"]))
+    elif "isNull" in expression:
+        compiled = _In(column, [None])
+        if not expression["isNull"]:
+            compiled = _Not(compiled)
+    else:
+        raise ValueError(f"criteria for {column} has no condition")
+    if expression.get("not") is True:
+        compiled = _Not(compiled)
+    return compiled
+
+
+def avoidLines(criteria: Criteria) -> Criteria:
+    """Add to the criteria the exclusion of the rows with AVOID_LINES (xxx) in any of its columns,
+    those are the lines where formulas are storaged"""
+    avoided = [_In(column, AVOID_LINES) for column in criteria.columns()]
+    if not avoided:
+        return criteria
+    return _And([criteria, _Not(_Or(avoided))])
@@ -1,18 +1,106 @@
 import json
+import logging
+import os
+import threading
+
+from smartsheetControler import Smartsheet
+from snapshot_store import SnapshotStore
+from webhook_queue import EventQueue
+
+SNAPSHOT_DIR = os.environ.get("SNAPSHOT_DIR", "/tmp/smartsheet_snapshots")
+QUEUE_PATH = os.environ.get("WEBHOOK_QUEUE_PATH", "/tmp/smartsheet_webhook_queue.db")
+DEBOUNCE_SECONDS = float(os.environ.get("WEBHOOK_DEBOUNCE_SECONDS", "5"))
+QUEUE_WORKERS = int(os.environ.get("WEBHOOK_QUEUE_WORKERS", "4"))
+
+logger = logging.getLogger(__name__)
+
+_client = None
+_queue = None
+_lock = threading.Lock()
+
+
+def summarize_events(events: list) -> tuple:
+    """Split the events of a callback in changed row ids, deleted row ids and a flag for
+    changes that affect the whole sheet (columns or the sheet itself)"""
+    changed = set()
+    deleted = set()
+    structural = False
+    for event in events:
+        object_type = event.get("objectType")
+        event_type = event.get("eventType")
+        if object_type == "row":
+            if event_type == "deleted":
+                deleted.add(event["id"])
+            else:
+                changed.add(event["id"])
+        elif object_type == "cell":
+            changed.add(event["rowId"])
+        elif object_type == "column":
+            structural = True
+    return changed - deleted, deleted, structural
+
+
+def apply_events(client: Smartsheet, store: SnapshotStore, sheet_id: int, events: list) -> dict:
+    """Apply the events of a callback to the stored snapshot of the sheet, only the changed rows are
+    downloaded. The full sheet is downloaded when there is no snapshot or the columns changed"""
+    changed, deleted, structural = summarize_events(events)
+    if structural or not store.exists(sheet_id):
+        frame = client.getSheetFrame(sheetId=sheet_id)
+        if frame is None:
+            return {"sheetId": sheet_id, "refreshed": False}
+        store.saveFrame(sheet_id, frame)
+        return {"sheetId": sheet_id, "refreshed": True, "rows": len(frame)}
+    rows = []
+    if changed:
+        columns, rows = client.getRows(sheetId=sheet_id, rowIds=sorted(changed))
+        if columns is None:
+            return {"sheetId": sheet_id, "refreshed": False}
+    store.appendChanges(sheet_id, rows, deleted)
+    return {"sheetId": sheet_id, "changed": len(rows), "deleted": len(deleted)}
+
+
+def process_events(sheet_id: int, events: list) -> dict:
+    """Apply the merged events of a sheet, the client is shared by every batch"""
+    global _client
+    with _lock:
+        if _client is None:
+            _client = Smartsheet(os.environ["SMARTSHEET_TOKEN"], batch_state_path=None, journal_dir=None)
+    return apply_events(_client, SnapshotStore(SNAPSHOT_DIR), sheet_id, events)
+
+
+def get_queue() -> EventQueue:
+    """Queue shared by the callbacks of this process, started on first use"""
+    global _queue
+    with _lock:
+        if _queue is None:
+            _queue = EventQueue(QUEUE_PATH, process=process_events, window=DEBOUNCE_SECONDS,
+                                max_workers=QUEUE_WORKERS).start()
+        return _queue
+
+
+def get_data(event: dict) -> dict:
+    body = event.get("body")
+    if not body:
+        return {'statusCode': 200}
+    callback = json.loads(body) if isinstance(body, str) else body
+    if callback.get("scope") != "sheet" or "events" not in callback:
+        return {'statusCode': 200}
+    # bursts of callbacks of a sheet are merged and applied once by the queue
+    get_queue().enqueue(callback["scopeObjectId"], callback["events"])
+    return {'statusCode': 200, 'body': json.dumps({"queued": len(callback["events"])})}
+
 
-def get_data():
-    print("mamastrukis")
 def handler(event, context):
 
 
-    print("Received event: " + json.dumps(event, indent=2))
+    logger.debug("Received event: %s", event)
     operation = event['httpMethod']
 
 
     if operation == 'GET':
     # GET is the normal webhook firing on save,
-    # so we just fetch the SmartSheet anbd save as parquet in S3
-        return (get_data())
+    # so we just queue the changed rows to apply them to the stored snapshot
+        return (get_data(event))
     elif operation == 'POST':
     
     # POST is the test from SmartSheet to see if the function 
@@ -31,7 +119,7 @@ def handler(event, context):
                 }
             }
         else:
-            return (get_data())
+            return (get_data(event))
     elif operation == 'OPTIONS':
         return {'statusCode': 200}
     else:
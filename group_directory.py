@@ -0,0 +1,141 @@
+import json
+import logging
+import os
+import threading
+import time
+from typing import Dict, Optional, Set
+
+from common_functions_ss import writeAtomically
+
+logger = logging.getLogger(__name__)
+
+
+class GroupDirectory:
+
+    def __init__(self, client, path: Optional[str] = None, ttl: float = 3600):
+        """
+        Directory of smartsheet groups indexed by name and by member email, kept in memory and
+        optionally on disk. The list of groups and the members of each group are downloaded again
+        when they are older than ttl seconds.
+        Args:
+            :param client is the smartsheetControler.Smartsheet used for the requests
+            :param path is the json file to keep the directory between runs, None to keep it only in memory
+            :param ttl is the number of seconds the directory is used before downloading it again
+        """
+        self.client = client
+        self.path = path
+        self.ttl = ttl
+        self._lock = threading.RLock()
+        self.groups = {}
+        self.loaded_at = 0.0
+        # groupId -> {"loadedAt": time, "members": {email: userId}}
+        self.members = {}
+        # email -> ids of the groups with the email as member
+        self.by_email = {}
+        self._load()
+
+    def _load(self) -> None:
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, "r") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return
+        self.groups = data.get("groups", {})
+        self.loaded_at = data.get("loadedAt", 0.0)
+        self.members = {int(groupId): info for groupId, info in data.get("members", {}).items()}
+        self._reindex()
+
+    def _reindex(self) -> None:
+        self.by_email = {}
+        for groupId, info in self.members.items():
+            for email in info["members"]:
+                self.by_email.setdefault(email, set()).add(groupId)
+
+    def _save(self) -> None:
+        if not self.path:
+            return
+        writeAtomically(self.path, lambda f: json.dump(
+            {"groups": self.groups, "loadedAt": self.loaded_at, "members": self.members}, f))
+
+    def _expired(self, loaded_at: float) -> bool:
+        return time.time() - loaded_at > self.ttl
+
+    def refresh(self) -> bool:
+        """Download the list of groups, members of groups that did not change are kept"""
+        url = f"{self.client.base_url}/groups?includeAll=true"
+        response = self.client.transport.get(url=url, headers=self.client.header)
+        if response.status_code != 200:
+            logger.error("not conected to groups: %s %s", response.status_code, response.text)
+            return False
+        groups = {group["name"]: {"id": group["id"], "modifiedAt": group.get("modifiedAt")}
+                  for group in response.json()["data"]}
+        with self._lock:
+            previous = {info["id"]: info.get("modifiedAt") for info in self.groups.values()}
+            current = {info["id"]: info.get("modifiedAt") for info in groups.values()}
+            self.members = {groupId: info for groupId, info in self.members.items()
+                            if groupId in current and previous.get(groupId) == current[groupId]}
+            self.groups = groups
+            self.loaded_at = time.time()
+            self._reindex()
+            self._save()
+        return True
+
+    def expire(self) -> None:
+        """Force the download of the list of groups on the next use, e.g. after creating a group"""
+        with self._lock:
+            self.loaded_at = 0.0
+
+    def groupId(self, name: str) -> Optional[int]:
+        with self._lock:
+            if not self.groups or self._expired(self.loaded_at):
+                self.refresh()
+            group = self.groups.get(name)
+        return group["id"] if group else None
+
+    def membersOf(self, name: str) -> Optional[Dict[str, int]]:
+        """Members of a group as {email: userId}, downloaded only if they are not in the directory or expired"""
+        groupId = self.groupId(name)
+        if groupId is None:
+            return None
+        with self._lock:
+            info = self.members.get(groupId)
+            if info and not self._expired(info["loadedAt"]):
+                return dict(info["members"])
+        url = f"{self.client.base_url}/groups/{groupId}"
+        response = self.client.transport.get(url=url, headers=self.client.header)
+        if response.status_code != 200:
+            logger.error("%s %s", response.status_code, response.text)
+            return None
+        members = {member["email"].lower(): member["id"] for member in response.json().get("members", [])}
+        with self._lock:
+            for email in self.members.get(groupId, {}).get("members", {}):
+                self.by_email.get(email, set()).discard(groupId)
+            self.members[groupId] = {"loadedAt": time.time(), "members": members}
+            for email in members:
+                self.by_email.setdefault(email, set()).add(groupId)
+            self._save()
+        return dict(members)
+
+    def groupsOf(self, email: str) -> Set[str]:
+        """Names of the groups with the email as member, only groups already in the directory are used"""
+        with self._lock:
+            names = {info["id"]: name for name, info in self.groups.items()}
+            return {names[groupId] for groupId in self.by_email.get(email.lower(), set()) if groupId in names}
+
+    def addMembers(self, groupId: int, members: Dict[str, int]) -> None:
+        with self._lock:
+            if groupId in self.members:
+                for email, userId in members.items():
+                    self.members[groupId]["members"][email.lower()] = userId
+                    self.by_email.setdefault(email.lower(), set()).add(groupId)
+                self._save()
+
+    def removeMembers(self, groupId: int, emails: Set[str]) -> None:
+        with self._lock:
+            if groupId in self.members:
+                for email in emails:
+                    self.members[groupId]["members"].pop(email.lower(), None)
+                    self.by_email.get(email.lower(), set()).discard(groupId)
+                self._save()
@@ -0,0 +1,161 @@
+import json
+import logging
+import re
+import threading
+from typing import Callable, Dict, List, Optional
+from urllib.parse import urlsplit
+
+logger = logging.getLogger(__name__)
+
+# upper bounds in seconds of the latency histogram buckets, the last bucket is +Inf
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# events: "request" {endpoint, method, status, seconds, bytesSent, bytesReceived, attempt}
+#         "retry" {endpoint, status, wait}
+#         "throttle" {seconds}
+#         "batch" {key, size, success}
+Hook = Callable[[str, dict], None]
+
+_hooks: List[Hook] = []
+_hooks_lock = threading.Lock()
+
+
+def addHook(hook: Hook) -> Hook:
+    """Register a function called as hook(event, data) for every event of the clients"""
+    with _hooks_lock:
+        if hook not in _hooks:
+            _hooks.append(hook)
+    return hook
+
+
+def removeHook(hook: Hook) -> None:
+    with _hooks_lock:
+        if hook in _hooks:
+            _hooks.remove(hook)
+
+
+def emit(event: str, **data) -> None:
+    if not _hooks:
+        return
+    for hook in list(_hooks):
+        try:
+            hook(event, data)
+        except Exception:
+            # a broken hook must never break a request
+            logger.exception("instrumentation hook failed on %s", event)
+
+
+def endpointOf(method: str, url: str) -> str:
+    """Endpoint name of a request without ids nor query, e.g. "GET /sheets/{id}/rows" """
+    path = urlsplit(url).path
+    path = re.sub(r"^/\d+\.\d+", "", path)
+    return f"{method.upper()} {re.sub(r'/[0-9]+(?=/|$)', '/{id}', path)}"
+
+
+class Metrics:
+
+    def __init__(self, buckets: tuple = LATENCY_BUCKETS):
+        """
+        Hook that aggregates the events: latency histograms, bytes and status codes per endpoint, retries,
+        throttling and the batch sizes used per sheet and operation. Register it with register()
+        Args:
+            :param buckets are the upper bounds in seconds of the latency histogram
+        """
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self) -> None:
+        with self._lock:
+            self.endpoints: Dict[str, dict] = {}
+            self.retries: Dict[str, int] = {}
+            self.throttled = 0
+            self.throttled_seconds = 0.0
+            self.batches: Dict[str, dict] = {}
+
+    def register(self) -> "Metrics":
+        addHook(self)
+        return self
+
+    def unregister(self) -> None:
+        removeHook(self)
+
+    def __call__(self, event: str, data: dict) -> None:
+        with self._lock:
+            if event == "request":
+                endpoint = self.endpoints.setdefault(data["endpoint"], {
+                    "count": 0, "seconds": 0.0, "buckets": [0] * (len(self.buckets) + 1),
+                    "bytesSent": 0, "bytesReceived": 0, "status": {}})
+                endpoint["count"] += 1
+                endpoint["seconds"] += data["seconds"]
+                bucket = next((index for index, bound in enumerate(self.buckets) if data["seconds"] <= bound), len(self.buckets))
+                endpoint["buckets"][bucket] += 1
+                endpoint["bytesSent"] += data.get("bytesSent") or 0
+                endpoint["bytesReceived"] += data.get("bytesReceived") or 0
+                status = str(data["status"])
+                endpoint["status"][status] = endpoint["status"].get(status, 0) + 1
+            elif event == "retry":
+                self.retries[data["endpoint"]] = self.retries.get(data["endpoint"], 0) + 1
+            elif event == "throttle":
+                self.throttled += 1
+                self.throttled_seconds += data["seconds"]
+            elif event == "batch":
+                batch = self.batches.setdefault(data["key"], {"successes": 0, "failures": 0, "rows": 0, "sizes": {}})
+                batch["successes" if data["success"] else "failures"] += 1
+                if data["success"]:
+                    batch["rows"] += data["size"]
+                size = str(data["size"])
+                batch["sizes"][size] = batch["sizes"].get(size, 0) + 1
+
+    def toDict(self) -> dict:
+        with self._lock:
+            return json.loads(json.dumps({
+                "buckets": list(self.buckets),
+                "endpoints": self.endpoints,
+                "retries": self.retries,
+                "throttled": self.throttled,
+                "throttledSeconds": self.throttled_seconds,
+                "batches": self.batches
+            }))
+
+    def toJson(self, path: Optional[str] = None) -> str:
+        text = json.dumps(self.toDict(), indent=2)
+        if path:
+            with open(path, "w") as f:
+                f.write(text)
+        return text
+
+    def toPrometheus(self) -> str:
+        """Metrics in the Prometheus text exposition format"""
+        data = self.toDict()
+
+        def label(value: str) -> str:
+            return value.replace("\\", "\\\\").replace('"', '\\"')
+        lines = ["# TYPE smartsheet_request_seconds histogram"]
+        for endpoint, info in data["endpoints"].items():
+            cumulative = 0
+            for bound, count in zip(list(self.buckets) + ["+Inf"], info["buckets"]):
+                cumulative += count
+                lines.append(f'smartsheet_request_seconds_bucket{{endpoint="{label(endpoint)}",le="{bound}"}} {cumulative}')
+            lines.append(f'smartsheet_request_seconds_sum{{endpoint="{label(endpoint)}"}} {info["seconds"]}')
+            lines.append(f'smartsheet_request_seconds_count{{endpoint="{label(endpoint)}"}} {info["count"]}')
+        lines.append("# TYPE smartsheet_request_bytes_total counter")
+        for endpoint, info in data["endpoints"].items():
+            lines.append(f'smartsheet_request_bytes_total{{endpoint="{label(endpoint)}",direction="sent"}} {info["bytesSent"]}')
+            lines.append(f'smartsheet_request_bytes_total{{endpoint="{label(endpoint)}",direction="received"}} {info["bytesReceived"]}')
+        lines.append("# TYPE smartsheet_responses_total counter")
+        for endpoint, info in data["endpoints"].items():
+            for status, count in info["status"].items():
+                lines.append(f'smartsheet_responses_total{{endpoint="{label(endpoint)}",status="{status}"}} {count}')
+        lines.append("# TYPE smartsheet_retries_total counter")
+        for endpoint, count in data["retries"].items():
+            lines.append(f'smartsheet_retries_total{{endpoint="{label(endpoint)}"}} {count}')
+        lines.append("# TYPE smartsheet_throttled_total counter")
+        lines.append(f"smartsheet_throttled_total {data['throttled']}")
+        lines.append("# TYPE smartsheet_throttled_seconds_total counter")
+        lines.append(f"smartsheet_throttled_seconds_total {data['throttledSeconds']}")
+        lines.append("# TYPE smartsheet_batch_size_total counter")
+        for key, batch in data["batches"].items():
+            for size, count in batch["sizes"].items():
+                lines.append(f'smartsheet_batch_size_total{{key="{label(key)}",size="{size}"}} {count}')
+        return "\n".join(lines) + "\n"
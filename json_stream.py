@@ -0,0 +1,127 @@
+import codecs
+import json
+from typing import Iterable, Iterator, Tuple, Any
+
+WHITESPACE = " \t\r\n"
+# characters that can continue a number, "0" of "0.5" or "1" of "1e3" is not complete yet
+NUMBER_CHARS = "0123456789+-.eE"
+# trim the consumed part of the buffer once it is bigger than this amount of characters
+TRIM_SIZE = 1 << 20
+
+
+class _Reader:
+
+    def __init__(self, chunks: Iterable[bytes]):
+        self.chunks = iter(chunks)
+        self.decoder = codecs.getincrementaldecoder("utf-8")()
+        self.json = json.JSONDecoder()
+        self.buf = ""
+        self.pos = 0
+        self.done = False
+
+    def _fill(self) -> bool:
+        """Add the next chunk to the buffer, returns False when the body is finished"""
+        if self.done:
+            return False
+        try:
+            chunk = next(self.chunks)
+        except StopIteration:
+            self.done = True
+            self.buf = self.buf[self.pos:] + self.decoder.decode(b"", final=True)
+            self.pos = 0
+            return False
+        if isinstance(chunk, bytes):
+            chunk = self.decoder.decode(chunk)
+        self.buf = self.buf[self.pos:] + chunk
+        self.pos = 0
+        return True
+
+    def _skipWhitespace(self) -> None:
+        while True:
+            while self.pos < len(self.buf) and self.buf[self.pos] in WHITESPACE:
+                self.pos += 1
+            if self.pos < len(self.buf):
+                return
+            if not self._fill() and self.pos >= len(self.buf):
+                raise ValueError("unexpected end of json body")
+
+    def nextChar(self) -> str:
+        self._skipWhitespace()
+        char = self.buf[self.pos]
+        self.pos += 1
+        return char
+
+    def peek(self) -> str:
+        self._skipWhitespace()
+        return self.buf[self.pos]
+
+    def expect(self, char: str) -> None:
+        found = self.nextChar()
+        if found != char:
+            raise ValueError(f"expected {char!r} and found {found!r} in json body")
+
+    def _hasDelimiter(self, end: int, number: bool) -> bool:
+        # a number at the end of the buffer can be cut, it is complete only if something that can not
+        # continue it follows
+        while end < len(self.buf):
+            char = self.buf[end]
+            if char not in WHITESPACE:
+                return not (number and char in NUMBER_CHARS)
+            end += 1
+        return False
+
+    def value(self) -> Any:
+        """Decode the next complete json value, reading more chunks while it is cut"""
+        self._skipWhitespace()
+        while True:
+            try:
+                value, end = self.json.raw_decode(self.buf, self.pos)
+                number = isinstance(value, (int, float)) and not isinstance(value, bool)
+                if self._hasDelimiter(end, number) or self.done:
+                    break
+            except json.JSONDecodeError:
+                if self.done:
+                    raise
+            self._fill()
+        self.pos = end
+        if self.pos > TRIM_SIZE:
+            self.buf = self.buf[self.pos:]
+            self.pos = 0
+        return value
+
+
+def iterObject(chunks: Iterable[bytes], stream_key: str) -> Iterator[Tuple[str, str, Any]]:
+    """
+    Parse a json object incrementally from chunks of its body. Every top level key is yielded as
+    ("item", key, value) except stream_key, which must be an array and is yielded one element at a time
+    as ("element", key, element), so the array is never fully in memory
+    Args:
+        :param chunks is an iterable of bytes, e.g. response.iter_content()
+        :param stream_key is the top level key of the array to stream
+    """
+    reader = _Reader(chunks)
+    reader.expect("{")
+    if reader.peek() == "}":
+        return
+    while True:
+        key = reader.value()
+        reader.expect(":")
+        if key == stream_key and reader.peek() == "[":
+            reader.expect("[")
+            if reader.peek() == "]":
+                reader.expect("]")
+            else:
+                while True:
+                    yield "element", key, reader.value()
+                    char = reader.nextChar()
+                    if char == "]":
+                        break
+                    if char != ",":
+                        raise ValueError(f"expected ',' or ']' and found {char!r} in json body")
+        else:
+            yield "item", key, reader.value()
+        char = reader.nextChar()
+        if char == "}":
+            return
+        if char != ",":
+            raise ValueError(f"expected ',' or '}}' and found {char!r} in json body")
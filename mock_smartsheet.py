@@ -0,0 +1,794 @@
+import argparse
+import datetime
+import itertools
+import json
+import random
+import re
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, List, Optional, Tuple
+from urllib.parse import parse_qs, urlsplit
+
+API_PREFIX = "/2.0"
+
+
+def _now() -> str:
+    return datetime.datetime.now(datetime.timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+def _parseDate(value: str) -> datetime.datetime:
+    return datetime.datetime.fromisoformat(value.replace("Z", "+00:00"))
+
+
+class MockError(Exception):
+
+    def __init__(self, status: int, message: str, errorCode: int = 1000, headers: Optional[dict] = None):
+        super().__init__(message)
+        self.status = status
+        self.body = {"errorCode": errorCode, "message": message}
+        self.headers = headers or {}
+
+
+class MockConfig:
+
+    def __init__(self, latency: float = 0.0, jitter: float = 0.0, requests_per_minute: Optional[int] = None,
+                 retry_after: int = 1, max_rows_per_request: Optional[int] = None,
+                 max_body_bytes: Optional[int] = None, max_url_length: Optional[int] = None):
+        """
+        Faults injected by the mock server
+        Args:
+            :param latency is the number of seconds added to every request
+            :param jitter is a random number of seconds between 0 and jitter added to the latency
+            :param requests_per_minute answers 429 with Retry-After when more requests arrive in a minute, None is unlimited
+            :param retry_after is the Retry-After header of the 429 responses
+            :param max_rows_per_request answers 400 when a request writes, moves or deletes more rows
+            :param max_body_bytes answers 413 when the body of a request is bigger
+            :param max_url_length answers 414 when the url of a request is longer
+        """
+        self.latency = latency
+        self.jitter = jitter
+        self.requests_per_minute = requests_per_minute
+        self.retry_after = retry_after
+        self.max_rows_per_request = max_rows_per_request
+        self.max_body_bytes = max_body_bytes
+        self.max_url_length = max_url_length
+
+    def update(self, values: dict) -> None:
+        for key, value in values.items():
+            if not hasattr(self, key):
+                raise MockError(400, f"unknown config {key}")
+            setattr(self, key, value)
+
+    def toDict(self) -> dict:
+        return dict(vars(self))
+
+
+class MockStats:
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self) -> None:
+        with self._lock:
+            self.calls = {}
+            self.bytes_in = 0
+            self.bytes_out = 0
+            self.throttled = 0
+            self.errors = 0
+
+    def record(self, endpoint: str, bytes_in: int, bytes_out: int, status: int) -> None:
+        with self._lock:
+            self.calls[endpoint] = self.calls.get(endpoint, 0) + 1
+            self.bytes_in += bytes_in
+            self.bytes_out += bytes_out
+            if status == 429:
+                self.throttled += 1
+            elif status >= 400:
+                self.errors += 1
+
+    def toDict(self) -> dict:
+        with self._lock:
+            return {"calls": sum(self.calls.values()), "byEndpoint": dict(self.calls), "bytesIn": self.bytes_in,
+                    "bytesOut": self.bytes_out, "throttled": self.throttled, "errors": self.errors}
+
+
+class MockState:
+    """Sheets, reports, groups, attachments and webhooks kept in memory. Rows keep their cells as
+    {columnId: value} and are rendered in column order when a sheet is requested"""
+
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.sheets = {}
+        self.reports = {}
+        self.groups = {}
+        self.attachments = {}
+        self.webhooks = {}
+        self._ids = itertools.count(1000000)
+
+    def newId(self) -> int:
+        return next(self._ids)
+
+    def _sheet(self, sheetId: int) -> dict:
+        sheet = self.sheets.get(sheetId)
+        if sheet is None:
+            raise MockError(404, f"sheet {sheetId} not found", errorCode=1006)
+        return sheet
+
+    @staticmethod
+    def _touch(sheet: dict) -> None:
+        sheet["version"] += 1
+        for number, row in enumerate(sheet["rows"], start=1):
+            row["rowNumber"] = number
+
+    def addSheet(self, name: str, columns: List[dict], rows: Optional[List[list]] = None) -> int:
+        """Create a sheet, columns are {title, type} and rows are lists of values in column order"""
+        with self.lock:
+            sheetId = self.newId()
+            sheet = {"id": sheetId, "name": name, "version": 1, "columns": [], "rows": []}
+            for index, column in enumerate(columns):
+                sheet["columns"].append({"id": self.newId(), "index": index, "title": column["title"],
+                                         "type": column.get("type", "TEXT_NUMBER"), "primary": index == 0})
+            ids = [col["id"] for col in sheet["columns"]]
+            stamp = _now()
+            for values in rows or []:
+                sheet["rows"].append({"id": self.newId(), "modifiedAt": stamp,
+                                      "cells": {columnId: value for columnId, value in zip(ids, values) if value is not None}})
+            self.sheets[sheetId] = sheet
+            self._touch(sheet)
+            return sheetId
+
+    def generateSheet(self, rows: int, columns: int = 10, name: Optional[str] = None, seed: int = 0) -> int:
+        """Sheet with generated data: a Status column (Open/Closed/Late), an Amount number column,
+        a Due date column and text columns"""
+        generator = random.Random(seed)
+        titles = [{"title": "Key"}, {"title": "Status", "type": "PICKLIST"}, {"title": "Amount"},
+                  {"title": "Due", "type": "DATE"}]
+        titles += [{"title": f"Text {number}"} for number in range(max(columns - len(titles), 0))]
+        data = []
+        for number in range(rows):
+            values = [f"K{number}", generator.choice(["Open", "Closed", "Late"]), generator.randint(1, 10000),
+                      f"2024-{generator.randint(1, 12):02d}-{generator.randint(1, 28):02d}"]
+            values += [f"text {number} {column}" for column in range(len(titles) - 4)]
+            data.append(values[:len(titles)])
+        return self.addSheet(name or f"generated {rows}", titles[:max(columns, 1)], data)
+
+    def addReport(self, sheetIds: List[int], name: str = "report") -> int:
+        with self.lock:
+            reportId = self.newId()
+            self.reports[reportId] = {"id": reportId, "name": name, "sheetIds": list(sheetIds)}
+            return reportId
+
+    def addGroup(self, name: str, emails: List[str]) -> int:
+        with self.lock:
+            groupId = self.newId()
+            self.groups[groupId] = {"id": groupId, "name": name, "modifiedAt": _now(),
+                                    "members": [{"id": self.newId(), "email": email} for email in emails]}
+            return groupId
+
+    def addAttachment(self, sheetId: int, rowId: int, name: str, data: bytes, mime_type: str = "application/octet-stream") -> int:
+        with self.lock:
+            attachmentId = self.newId()
+            self.attachments[attachmentId] = {
+                "id": attachmentId, "name": name, "attachmentType": "FILE", "mimeType": mime_type,
+                "sizeInKb": len(data) // 1024, "parentType": "ROW", "parentId": rowId, "sheetId": sheetId,
+                "createdAt": _now(), "data": data
+            }
+            return attachmentId
+
+    @staticmethod
+    def renderRow(sheet: dict, row: dict, columnIds: Optional[set] = None, existing_only: bool = False) -> dict:
+        cells = []
+        for column in sheet["columns"]:
+            if columnIds is not None and column["id"] not in columnIds:
+                continue
+            if column["id"] in row["cells"]:
+                cells.append({"columnId": column["id"], "value": row["cells"][column["id"]]})
+            elif not existing_only:
+                cells.append({"columnId": column["id"]})
+        return {"id": row["id"], "rowNumber": row["rowNumber"], "modifiedAt": row["modifiedAt"], "cells": cells}
+
+
+class MockSmartsheet:
+
+    def __init__(self, config: Optional[MockConfig] = None, host: str = "127.0.0.1", port: int = 0):
+        """
+        Local stand-in of the Smartsheet API for benchmarks and tests, it answers the sheets, rows, columns,
+        reports, groups, attachments and webhooks endpoints used by the clients and injects the faults
+        of config. Point a client to it with base_url=server.url.
+        /_mock/seed, /_mock/config and /_mock/stats let another process prepare data and read the counters
+        Args:
+            :param config is the faults to inject
+            :param host is the interface to listen
+            :param port is the port to listen, 0 to use a free one
+        """
+        self.config = config or MockConfig()
+        self.state = MockState()
+        self.stats = MockStats()
+        self._window = deque()
+        self._window_lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), _Handler)
+        self._server.daemon_threads = True
+        self._server.mock = self
+        self._thread = None
+        self.routes = [
+            ("GET", r"/sheets/(\d+)/version", self.sheetVersion),
+            ("GET", r"/sheets/(\d+)", self.getSheet),
+            ("GET", r"/sheets/(\d+)/columns", self.getColumns),
+            ("POST", r"/sheets/(\d+)/columns", self.addColumns),
+            ("PUT", r"/sheets/(\d+)/columns/(\d+)", self.updateColumn),
+            ("DELETE", r"/sheets/(\d+)/columns/(\d+)", self.deleteColumn),
+            ("POST", r"/sheets/(\d+)/rows", self.addRows),
+            ("PUT", r"/sheets/(\d+)/rows", self.updateRows),
+            ("DELETE", r"/sheets/(\d+)/rows", self.deleteRows),
+            ("POST", r"/sheets/(\d+)/rows/(move|copy)", self.moveRows),
+            ("POST", r"/sheets/(\d+)/copy", self.copySheet),
+            ("POST", r"/sheets/(\d+)/move", self.moveSheet),
+            ("GET", r"/sheets/(\d+)/attachments", self.sheetAttachments),
+            ("GET", r"/sheets/(\d+)/attachments/(\d+)", self.getAttachment),
+            ("GET", r"/sheets/(\d+)/rows/(\d+)/attachments", self.rowAttachments),
+            ("POST", r"/sheets/(\d+)/rows/(\d+)/attachments", self.uploadAttachment),
+            ("POST", r"/folders/(\d+)/sheets", self.createSheet),
+            ("GET", r"/reports/(\d+)", self.getReport),
+            ("GET", r"/groups", self.listGroups),
+            ("POST", r"/groups", self.createGroup),
+            ("GET", r"/groups/(\d+)", self.getGroup),
+            ("POST", r"/groups/(\d+)/members", self.addMembers),
+            ("DELETE", r"/groups/(\d+)/members/(\d+)", self.removeMember),
+            ("POST", r"/webhooks", self.createWebhook),
+            ("PUT", r"/webhooks/(\d+)", self.updateWebhook),
+            ("POST", r"/_mock/seed", self.seed),
+            ("GET", r"/_mock/stats", self.getStats),
+            ("DELETE", r"/_mock/stats", self.resetStats),
+            ("PUT", r"/_mock/config", self.setConfig),
+        ]
+        self.routes = [(method, re.compile(f"^{pattern}$"), function) for method, pattern, function in self.routes]
+
+    @property
+    def root(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @property
+    def url(self) -> str:
+        return self.root + API_PREFIX
+
+    def start(self) -> "MockSmartsheet":
+        self._thread = threading.Thread(target=self._server.serve_forever, name="mock-smartsheet", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self) -> "MockSmartsheet":
+        return self.start()
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
+
+    # faults
+
+    def _throttle(self) -> None:
+        limit = self.config.requests_per_minute
+        if not limit:
+            return
+        now = time.monotonic()
+        with self._window_lock:
+            while self._window and now - self._window[0] > 60:
+                self._window.popleft()
+            if len(self._window) >= limit:
+                raise MockError(429, "Rate limit exceeded.", errorCode=4003,
+                                headers={"Retry-After": str(self.config.retry_after)})
+            self._window.append(now)
+
+    def _checkRows(self, count: int) -> None:
+        limit = self.config.max_rows_per_request
+        if limit and count > limit:
+            raise MockError(400, f"{count} rows in the request, the limit is {limit}", errorCode=1018)
+
+    def handle(self, method: str, target: str, body: bytes, headers: Optional[dict] = None) -> Tuple[int, Any, dict, str]:
+        """Answer a request, returns status, body (bytes or json object), headers and endpoint name"""
+        headers = headers or {}
+        parts = urlsplit(target)
+        path = parts.path[len(API_PREFIX):] if parts.path.startswith(API_PREFIX) else parts.path
+        query = {key: values[-1] for key, values in parse_qs(parts.query).items()}
+        endpoint = f"{method} {re.sub(r'/[0-9]+', '/{id}', path)}"
+        try:
+            if not path.startswith("/_mock"):
+                delay = self.config.latency + random.uniform(0, self.config.jitter)
+                if delay:
+                    time.sleep(delay)
+                if self.config.max_url_length and len(target) > self.config.max_url_length:
+                    raise MockError(414, "URI too long", errorCode=1000)
+                if self.config.max_body_bytes and len(body) > self.config.max_body_bytes:
+                    raise MockError(413, "Request entity too large", errorCode=1000)
+                self._throttle()
+            for route_method, pattern, function in self.routes:
+                match = pattern.match(path)
+                if match and route_method == method:
+                    args = [int(group) if group.isdigit() else group for group in match.groups()]
+                    result = function(*args, query=query, body=body, headers=headers)
+                    if isinstance(result, tuple):
+                        return result[0], result[1], result[2], endpoint
+                    return 200, result, {}, endpoint
+            if path.startswith("/files/") and method == "GET":
+                return self.download(int(path.rsplit("/", 1)[1]), query=query, body=body, headers=headers) + (endpoint,)
+            raise MockError(404, f"no endpoint {method} {path}", errorCode=1006)
+        except MockError as e:
+            return e.status, e.body, e.headers, endpoint
+
+    @staticmethod
+    def _json(body: bytes) -> Any:
+        try:
+            return json.loads(body or b"null")
+        except ValueError:
+            raise MockError(400, "invalid json", errorCode=1008)
+
+    # sheets
+
+    def sheetVersion(self, sheetId: int, query: dict, body: bytes, headers: dict) -> dict:
+        with self.state.lock:
+            return {"version": self.state._sheet(sheetId)["version"]}
+
+    def getSheet(self, sheetId: int, query: dict, body: bytes, headers: dict) -> dict:
+        with self.state.lock:
+            sheet = self.state._sheet(sheetId)
+            rows = sheet["rows"]
+            if "rowIds" in query:
+                wanted = {int(rowId) for rowId in query["rowIds"].split(",") if rowId}
+                rows = [row for row in rows if row["id"] in wanted]
+            if "rowsModifiedSince" in query:
+                since = _parseDate(query["rowsModifiedSince"])
+                rows = [row for row in rows if _parseDate(row["modifiedAt"]) >= since]
+            if "pageSize" in query:
+                size = int(query["pageSize"])
+                page = int(query.get("page", 1))
+                rows = rows[(page - 1) * size:page * size]
+            columns = sheet["columns"]
+            columnIds = None
+            if "columnIds" in query:
+                columnIds = {int(columnId) for columnId in query["columnIds"].split(",")}
+                columns = [col for col in columns if col["id"] in columnIds]
+            existing_only = "nonexistentCells" in query.get("exclude", "")
+            return {
+                "id": sheet["id"], "name": sheet["name"], "version": sheet["version"],
+                "totalRowCount": len(sheet["rows"]), "columns": [dict(col) for col in columns],
+                "rows": [self.state.renderRow(sheet, row, columnIds, existing_only) for row in rows]
+            }
+
+    def getColumns(self, sheetId: int, query: dict, body: bytes, headers: dict) -> dict:
+        with self.state.lock:
+            columns = [dict(col) for col in self.state._sheet(sheetId)["columns"]]
+        return {"pageNumber": 1, "totalCount": len(columns), "data": columns}
+
+    def addColumns(self, sheetId: int, query: dict, body: bytes, headers: dict) -> dict:
+        payload = self._json(body)
+        payload = payload if isinstance(payload, list) else [payload]
+        with self.state.lock:
+            sheet = self.state._sheet(sheetId)
+            created = []
+            for column in payload:
+                if "title" not in column or "index" not in column:
+                    raise MockError(400, "columns need title and index", errorCode=1012)
+                if any(col["title"] == column["title"] for col in sheet["columns"]):
+                    raise MockError(400, f"column {column['title']} already exists", errorCode=1012)
+                new_column = {"id": self.state.newId(), "index": column["index"], "title": column["title"],
+                              "type": column.get("type", "TEXT_NUMBER")}
+                sheet["columns"].insert(min(column["index"], len(sheet["columns"])), new_column)
+                created.append(new_column)
+            for index, column in enumerate(sheet["columns"]):
+                column["index"] = index
+            self.state._touch(sheet)
+        return {"message": "SUCCESS", "resultCode": 0, "result": created}
+
+    def updateColumn(self, sheetId: int, columnId: int, query: dict, body: bytes, headers: dict) -> dict:
+        payload = self._json(body)
+        with self.state.lock:
+            sheet = self.state._sheet(sheetId)
+            column = next((col for col in sheet["columns"] if col["id"] == columnId), None)
+            if column is None:
+                raise MockError(404, f"column {columnId} not found", errorCode=1006)
+            index = payload.pop("index", None)
+            column.update({key: value for key, value in payload.items() if key != "id"})
+            if index is not None:
+                sheet["columns"].remove(column)
+                sheet["columns"].insert(index, column)
+                for position, col in enumerate(sheet["columns"]):
+                    col["index"] = position
+            self.state._touch(sheet)
+            return {"message": "SUCCESS", "resultCode": 0, "result": dict(column)}
+
+    def deleteColumn(self, sheetId: int, columnId: int, query: dict, body: bytes, headers: dict) -> dict:
+        with self.state.lock:
+            sheet = self.state._sheet(sheetId)
+            if not any(col["id"] == columnId for col in sheet["columns"]):
+                raise MockError(404, f"column {columnId} not found", errorCode=1006)
+            sheet["columns"] = [col for col in sheet["columns"] if col["id"] != columnId]
+            for index, column in enumerate(sheet["columns"]):
+                column["index"] = index
+            for row in sheet["rows"]:
+                row["cells"].pop(columnId, None)
+            self.state._touch(sheet)
+        return {"message": "SUCCESS", "resultCode": 0}
+
+    @staticmethod
+    def _applyCells(sheet: dict, row: dict, cells: List[dict]) -> None:
+        columnIds = {col["id"] for col in sheet["columns"]}
+        for cell in cells:
+            if cell.get("columnId") not in columnIds:
+                raise MockError(400, f"column {cell.get('columnId')} not found", errorCode=1036)
+        for cell in cells:
+            value = cell.get("formula", cell.get("value"))
+            if value is None or value == "":
+                row["cells"].pop(cell["columnId"], None)
+            else:
+                row["cells"][cell["columnId"]] = value
+        row["modifiedAt"] = _now()
+
+    def _writeRows(self, sheetId: int, query: dict, body: bytes, update: bool) -> dict:
+        payload = self._json(body)
+        payload = payload if isinstance(payload, list) else [payload]
+        self._checkRows(len(payload))
+        partial = query.get("allowPartialSuccess") == "true"
+        with self.state.lock:
+            sheet = self.state._sheet(sheetId)
+            by_id = {row["id"]: row for row in sheet["rows"]}
+            written = []
+            failed = []
+            for index, data in enumerate(payload):
+                try:
+                    if update:
+                        row = by_id.get(data.get("id"))
+                        if row is None:
+                            raise MockError(404, f"row {data.get('id')} not found", errorCode=1006)
+                        self._applyCells(sheet, row, data.get("cells", []))
+                    else:
+                        row = {"id": self.state.newId(), "cells": {}}
+                        self._applyCells(sheet, row, data.get("cells", []))
+                        if data.get("toTop"):
+                            sheet["rows"].insert(0, row)
+                        else:
+                            sheet["rows"].append(row)
+                    written.append(row)
+                except MockError as e:
+                    if not partial:
+                        raise
+                    failed.append({"index": index, "rowId": data.get("id"), "error": e.body})
+            self.state._touch(sheet)
+            result = [self.state.renderRow(sheet, row, existing_only=True) for row in written]
+        response = {"message": "PARTIAL_SUCCESS" if failed else "SUCCESS", "resultCode": 3 if failed else 0,
+                    "version": sheet["version"], "result": result}
+        if partial:
+            response["failedItems"] = failed
+        return response
+
+    def addRows(self, sheetId: int, query: dict, body: bytes, headers: dict) -> dict:
+        return self._writeRows(sheetId, query, body, update=False)
+
+    def updateRows(self, sheetId: int, query: dict, body: bytes, headers: dict) -> dict:
+        return self._writeRows(sheetId, query, body, update=True)
+
+    def deleteRows(self, sheetId: int, query: dict, body: bytes, headers: dict) -> dict:
+        ids = [int(rowId) for rowId in query.get("ids", "").split(",") if rowId]
+        self._checkRows(len(ids))
+        with self.state.lock:
+            sheet = self.state._sheet(sheetId)
+            existing = {row["id"] for row in sheet["rows"]}
+            missing = [rowId for rowId in ids if rowId not in existing]
+            if missing and query.get("ignoreRowsNotFound") != "true":
+                raise MockError(404, f"rows {missing[:10]} not found", errorCode=1006)
+            deleted = set(ids) & existing
+            sheet["rows"] = [row for row in sheet["rows"] if row["id"] not in deleted]
+            self.state._touch(sheet)
+        return {"message": "SUCCESS", "resultCode": 0, "result": [rowId for rowId in ids if rowId in deleted]}
+
+    def moveRows(self, sheetId: int, operation: str, query: dict, body: bytes, headers: dict) -> dict:
+        payload = self._json(body)
+        ids = payload.get("rowIds", [])
+        self._checkRows(len(ids))
+        with self.state.lock:
+            origin = self.state._sheet(sheetId)
+            target = self.state._sheet(payload.get("to", {}).get("sheetId"))
+            by_id = {row["id"]: row for row in origin["rows"]}
+            missing = [rowId for rowId in ids if rowId not in by_id]
+            if missing and query.get("ignoreRowsNotFound") != "true":
+                raise MockError(404, f"rows {missing[:10]} not found", errorCode=1006)
+            # cells go to the column with the same title in the target sheet
+            titles = {col["title"]: col["id"] for col in target["columns"]}
+            mapping = {col["id"]: titles[col["title"]] for col in origin["columns"] if col["title"] in titles}
+            rowMappings = []
+            for rowId in ids:
+                row = by_id.get(rowId)
+                if row is None:
+                    continue
+                new_row = {"id": row["id"] if operation == "move" else self.state.newId(), "modifiedAt": _now(),
+                           "cells": {mapping[columnId]: value for columnId, value in row["cells"].items() if columnId in mapping}}
+                target["rows"].append(new_row)
+                rowMappings.append({"from": rowId, "to": new_row["id"]})
+            if operation == "move":
+                moved = {mapped["from"] for mapped in rowMappings}
+                origin["rows"] = [row for row in origin["rows"] if row["id"] not in moved]
+                self.state._touch(origin)
+            self.state._touch(target)
+        return {"destinationSheetId": target["id"], "rowMappings": rowMappings}
+
+    def copySheet(self, sheetId: int, query: dict, body: bytes, headers: dict) -> dict:
+        payload = self._json(body) or {}
+        with self.state.lock:
+            sheet = self.state._sheet(sheetId)
+            include = query.get("include", "")
+            columns = [{"title": col["title"], "type": col["type"]} for col in sheet["columns"]]
+            rows = []
+            if "data" in include or "all" in include:
+                rows = [[row["cells"].get(col["id"]) for col in sheet["columns"]] for row in sheet["rows"]]
+            newId = self.state.addSheet(payload.get("newName", f"Copy of {sheet['name']}"), columns, rows)
+        return {"message": "SUCCESS", "resultCode": 0,
+                "result": {"id": newId, "name": self.state.sheets[newId]["name"], "type": "sheet"}}
+
+    def moveSheet(self, sheetId: int, query: dict, body: bytes, headers: dict) -> dict:
+        with self.state.lock:
+            sheet = self.state._sheet(sheetId)
+        return {"message": "SUCCESS", "resultCode": 0, "result": {"id": sheet["id"], "name": sheet["name"]}}
+
+    def createSheet(self, folderId: int, query: dict, body: bytes, headers: dict) -> dict:
+        payload = self._json(body)
+        newId = self.state.addSheet(payload["name"], payload.get("columns", []))
+        return {"message": "SUCCESS", "resultCode": 0, "result": {"id": newId, "name": payload["name"]}}
+
+    # attachments
+
+    @staticmethod
+    def _attachmentInfo(attachment: dict) -> dict:
+        return {key: value for key, value in attachment.items() if key not in ("data", "sheetId")}
+
+    def sheetAttachments(self, sheetId: int, query: dict, body: bytes, headers: dict) -> dict:
+        with self.state.lock:
+            self.state._sheet(sheetId)
+            data = [self._attachmentInfo(a) for a in self.state.attachments.values() if a["sheetId"] == sheetId]
+        return {"pageNumber": 1, "totalCount": len(data), "data": data}
+
+    def rowAttachments(self, sheetId: int, rowId: int, query: dict, body: bytes, headers: dict) -> dict:
+        with self.state.lock:
+            data = [self._attachmentInfo(a) for a in self.state.attachments.values()
+                    if a["sheetId"] == sheetId and a["parentId"] == rowId]
+        return {"pageNumber": 1, "totalCount": len(data), "data": data}
+
+    def getAttachment(self, sheetId: int, attachmentId: int, query: dict, body: bytes, headers: dict) -> dict:
+        with self.state.lock:
+            attachment = self.state.attachments.get(attachmentId)
+            if attachment is None or attachment["sheetId"] != sheetId:
+                raise MockError(404, f"attachment {attachmentId} not found", errorCode=1006)
+            info = self._attachmentInfo(attachment)
+        info["url"] = f"{self.root}/files/{attachmentId}"
+        info["urlExpiresInMillis"] = 120000
+        return info
+
+    def uploadAttachment(self, sheetId: int, rowId: int, query: dict, body: bytes, headers: dict) -> dict:
+        match = re.search(r'filename="([^"]*)"', headers.get("Content-Disposition", ""))
+        name = match.group(1) if match else "file"
+        with self.state.lock:
+            sheet = self.state._sheet(sheetId)
+            if not any(row["id"] == rowId for row in sheet["rows"]):
+                raise MockError(404, f"row {rowId} not found", errorCode=1006)
+        attachmentId = self.state.addAttachment(sheetId, rowId, name, body)
+        return {"message": "SUCCESS", "resultCode": 0, "result": self._attachmentInfo(self.state.attachments[attachmentId])}
+
+    def download(self, attachmentId: int, query: dict, body: bytes, headers: dict) -> tuple:
+        attachment = self.state.attachments.get(attachmentId)
+        if attachment is None:
+            raise MockError(404, "file not found", errorCode=1006)
+        data = attachment["data"]
+        range_header = headers.get("Range")
+        if range_header:
+            start = int(range_header.split("=")[1].split("-")[0])
+            if start >= len(data):
+                return 416, b"", {"Content-Range": f"bytes */{len(data)}"}
+            return 206, data[start:], {"Content-Range": f"bytes {start}-{len(data) - 1}/{len(data)}"}
+        return 200, data, {}
+
+    # reports
+
+    def getReport(self, reportId: int, query: dict, body: bytes, headers: dict) -> dict:
+        with self.state.lock:
+            report = self.state.reports.get(reportId)
+            if report is None:
+                raise MockError(404, f"report {reportId} not found", errorCode=1006)
+            # columns with the same title in the source sheets are one virtual column of the report
+            virtual = report.setdefault("virtual", {})
+            columns = []
+            for sheetId in report["sheetIds"]:
+                for column in self.state._sheet(sheetId)["columns"]:
+                    if column["title"] not in virtual:
+                        virtual[column["title"]] = self.state.newId()
+                    if not any(col["title"] == column["title"] for col in columns):
+                        columns.append({"virtualId": virtual[column["title"]], "title": column["title"],
+                                        "type": column["type"], "index": len(columns)})
+            rows = [(sheetId, row) for sheetId in report["sheetIds"] for row in self.state.sheets[sheetId]["rows"]]
+            size = int(query.get("pageSize", 100))
+            page = int(query.get("page", 1))
+            page_rows = []
+            for number, (sheetId, row) in enumerate(rows[(page - 1) * size:page * size], start=(page - 1) * size + 1):
+                titles = {col["id"]: col["title"] for col in self.state.sheets[sheetId]["columns"]}
+                page_rows.append({"id": row["id"], "rowNumber": number, "sheetId": sheetId,
+                                  "cells": [{"columnId": columnId, "virtualColumnId": virtual[titles[columnId]], "value": value}
+                                            for columnId, value in row["cells"].items()]})
+        return {"id": reportId, "name": report["name"], "totalRowCount": len(rows), "columns": columns, "rows": page_rows}
+
+    # groups
+
+    def listGroups(self, query: dict, body: bytes, headers: dict) -> dict:
+        with self.state.lock:
+            data = [{"id": group["id"], "name": group["name"], "modifiedAt": group["modifiedAt"]}
+                    for group in self.state.groups.values()]
+        return {"pageNumber": 1, "totalCount": len(data), "data": data}
+
+    def getGroup(self, groupId: int, query: dict, body: bytes, headers: dict) -> dict:
+        with self.state.lock:
+            group = self.state.groups.get(groupId)
+            if group is None:
+                raise MockError(404, f"group {groupId} not found", errorCode=1006)
+            return json.loads(json.dumps(group))
+
+    def createGroup(self, query: dict, body: bytes, headers: dict) -> dict:
+        payload = self._json(body)
+        if any(group["name"] == payload["name"] for group in self.state.groups.values()):
+            raise MockError(400, f"group {payload['name']} already exists", errorCode=1020)
+        groupId = self.state.addGroup(payload["name"], [member["email"] for member in payload.get("members", [])])
+        return {"message": "SUCCESS", "resultCode": 0, "result": self.getGroup(groupId, query, body, headers)}
+
+    def addMembers(self, groupId: int, query: dict, body: bytes, headers: dict) -> dict:
+        payload = self._json(body)
+        payload = payload if isinstance(payload, list) else [payload]
+        with self.state.lock:
+            group = self.state.groups.get(groupId)
+            if group is None:
+                raise MockError(404, f"group {groupId} not found", errorCode=1006)
+            existing = {member["email"].lower(): member for member in group["members"]}
+            added = []
+            for member in payload:
+                email = member["email"].lower()
+                if email not in existing:
+                    existing[email] = {"id": self.state.newId(), "email": member["email"]}
+                    group["members"].append(existing[email])
+                added.append(existing[email])
+            group["modifiedAt"] = _now()
+        return {"message": "SUCCESS", "resultCode": 0, "result": added}
+
+    def removeMember(self, groupId: int, userId: int, query: dict, body: bytes, headers: dict) -> dict:
+        with self.state.lock:
+            group = self.state.groups.get(groupId)
+            if group is None or not any(member["id"] == userId for member in group["members"]):
+                raise MockError(404, f"member {userId} not found", errorCode=1006)
+            group["members"] = [member for member in group["members"] if member["id"] != userId]
+            group["modifiedAt"] = _now()
+        return {"message": "SUCCESS", "resultCode": 0}
+
+    # webhooks
+
+    def createWebhook(self, query: dict, body: bytes, headers: dict) -> dict:
+        payload = self._json(body)
+        with self.state.lock:
+            webhookId = self.state.newId()
+            webhook = dict(payload, id=webhookId, enabled=False, status="NEW_NOT_VERIFIED")
+            self.state.webhooks[webhookId] = webhook
+        return {"message": "SUCCESS", "resultCode": 0, "result": webhook}
+
+    def updateWebhook(self, webhookId: int, query: dict, body: bytes, headers: dict) -> dict:
+        payload = self._json(body)
+        with self.state.lock:
+            webhook = self.state.webhooks.get(webhookId)
+            if webhook is None:
+                raise MockError(404, f"webhook {webhookId} not found", errorCode=1006)
+            webhook.update(payload)
+            if webhook.get("enabled"):
+                webhook["status"] = "ENABLED"
+        return {"message": "SUCCESS", "resultCode": 0, "result": webhook}
+
+    # control endpoints for another process
+
+    def seed(self, query: dict, body: bytes, headers: dict) -> dict:
+        """{"rows": n, "columns": c, "name": ...} creates a generated sheet, "report": [sheetIds] a report,
+        "group": {"name", "emails"} a group, "attachment": {"sheetId", "rowId", "name", "size"} a file and
+        "rowsOf": sheetId lists the row ids of a sheet"""
+        payload = self._json(body) or {}
+        result = {}
+        if "rows" in payload:
+            result["sheetId"] = self.state.generateSheet(payload["rows"], payload.get("columns", 10), payload.get("name"))
+        if "report" in payload:
+            result["reportId"] = self.state.addReport(payload["report"])
+        if "group" in payload:
+            result["groupId"] = self.state.addGroup(payload["group"]["name"], payload["group"].get("emails", []))
+        if "attachment" in payload:
+            attachment = payload["attachment"]
+            result["attachmentId"] = self.state.addAttachment(attachment["sheetId"], attachment["rowId"], attachment["name"],
+                                                              random.randbytes(attachment.get("size", 1024)))
+        if "rowsOf" in payload:
+            result["rowIds"] = [row["id"] for row in self.state._sheet(payload["rowsOf"])["rows"]]
+        return result
+
+    def getStats(self, query: dict, body: bytes, headers: dict) -> dict:
+        return self.stats.toDict()
+
+    def resetStats(self, query: dict, body: bytes, headers: dict) -> dict:
+        self.stats.reset()
+        return {}
+
+    def setConfig(self, query: dict, body: bytes, headers: dict) -> dict:
+        self.config.update(self._json(body) or {})
+        return self.config.toDict()
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format: str, *args) -> None:
+        pass
+
+    def _body(self) -> bytes:
+        if self.headers.get("Transfer-Encoding", "").lower() == "chunked":
+            chunks = []
+            while True:
+                size = int(self.rfile.readline().strip().split(b";")[0], 16)
+                if size == 0:
+                    self.rfile.readline()
+                    break
+                chunks.append(self.rfile.read(size))
+                self.rfile.readline()
+            return b"".join(chunks)
+        length = int(self.headers.get("Content-Length") or 0)
+        return self.rfile.read(length) if length else b""
+
+    def _answer(self) -> None:
+        body = self._body()
+        mock = self.server.mock
+        status, payload, headers, endpoint = mock.handle(self.command, self.path, body, dict(self.headers))
+        if isinstance(payload, bytes):
+            data = payload
+            content_type = "application/octet-stream"
+        else:
+            data = json.dumps(payload, separators=(",", ":")).encode()
+            content_type = "application/json;charset=UTF-8"
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        for key, value in headers.items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(data)
+        if " /_mock/" not in endpoint:
+            mock.stats.record(endpoint, len(body) + len(self.path), len(data), status)
+
+    do_GET = _answer
+    do_POST = _answer
+    do_PUT = _answer
+    do_DELETE = _answer
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="local mock of the Smartsheet API")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--jitter", type=float, default=0.0)
+    parser.add_argument("--requests-per-minute", type=int, default=None)
+    parser.add_argument("--max-rows-per-request", type=int, default=None)
+    parser.add_argument("--max-body-bytes", type=int, default=None)
+    parser.add_argument("--max-url-length", type=int, default=None)
+    parser.add_argument("--rows", type=int, default=0, help="rows of a generated sheet to start with")
+    args = parser.parse_args()
+    server = MockSmartsheet(MockConfig(latency=args.latency, jitter=args.jitter,
+                                       requests_per_minute=args.requests_per_minute,
+                                       max_rows_per_request=args.max_rows_per_request,
+                                       max_body_bytes=args.max_body_bytes, max_url_length=args.max_url_length),
+                            host=args.host, port=args.port)
+    if args.rows:
+        print(f"generated sheet {server.state.generateSheet(args.rows)}", flush=True)
+    print(server.url, flush=True)
+    try:
+        server._server.serve_forever()
+    except KeyboardInterrupt:
+        server.stop()
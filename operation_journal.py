@@ -0,0 +1,122 @@
+import json
+import logging
+import os
+import re
+import threading
+import time
+from typing import List, Optional
+
+from common_functions_ss import writeAtomically
+
+DEFAULT_JOURNAL_DIR = os.path.join(os.path.expanduser("~"), ".smartsheet_journal")
+# unfinished jobs older than this are not resumed, the rows of the sheet may have changed since then
+JOURNAL_MAX_AGE = 24 * 3600
+
+logger = logging.getLogger(__name__)
+
+
+class Job:
+
+    def __init__(self, path: Optional[str], header: dict, done: Optional[set] = None):
+        """
+        Journal of one long operation: the header has the ids to process and the data needed to resume
+        or verify it, then every completed lot is appended as a line, so a restarted job skips them
+        Args:
+            :param path is the journal file, None to keep the job only in memory
+            :param header is the data of the job, "ids" are the ids to process
+            :param done are the ids already processed
+        """
+        self.path = path
+        self.header = header
+        self.done = done if done is not None else set()
+        self._lock = threading.Lock()
+
+    @property
+    def ids(self) -> list:
+        return self.header.get("ids", [])
+
+    def remaining(self) -> list:
+        return [rowId for rowId in self.ids if rowId not in self.done]
+
+    def _append(self, record: dict) -> None:
+        if not self.path:
+            return
+        with open(self.path, "a") as f:
+            f.write(json.dumps(record) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+    def record(self, ids: list) -> None:
+        """Mark a lot as completed"""
+        with self._lock:
+            self.done.update(ids)
+            self._append({"done": list(ids)})
+
+    def update(self, **fields) -> None:
+        """Store more data of the job, e.g. the id of a sheet created by one of its steps"""
+        with self._lock:
+            self.header.update(fields)
+            self._append({"header": fields})
+
+    def finish(self) -> None:
+        if self.path and os.path.exists(self.path):
+            os.remove(self.path)
+
+
+class OperationJournal:
+
+    def __init__(self, directory: Optional[str] = DEFAULT_JOURNAL_DIR, max_age: Optional[float] = JOURNAL_MAX_AGE):
+        """
+        Local journals of the long operations (moves, copies, deletes, history copies), one file per job
+        Args:
+            :param directory is the folder of the journals, None to keep them only in memory
+            :param max_age is the number of seconds an unfinished job can be resumed, None to resume it always
+        """
+        self.directory = directory
+        self.max_age = max_age
+
+    def _path(self, name: str) -> Optional[str]:
+        if not self.directory:
+            return None
+        return os.path.join(self.directory, re.sub(r"[^\w.-]", "_", name) + ".jsonl")
+
+    def load(self, name: str) -> Optional[Job]:
+        """Job with the lots already completed, None if there is no unfinished job with the name or it expired"""
+        path = self._path(name)
+        if not path or not os.path.exists(path):
+            return None
+        header = None
+        done = set()
+        with open(path, "r") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    # the last line can be cut if the process died while writing it
+                    continue
+                if header is None:
+                    header = record
+                elif "done" in record:
+                    done.update(record["done"])
+                elif "header" in record:
+                    header.update(record["header"])
+        if header is None:
+            return None
+        job = Job(path, header, done)
+        if self.max_age is not None and time.time() - header.get("startedAt", 0) > self.max_age:
+            logger.warning("discarding %s, it was started more than %s seconds ago", name, self.max_age)
+            job.finish()
+            return None
+        return job
+
+    def start(self, name: str, ids: Optional[List] = None, **header) -> Job:
+        job = Job(self._path(name), dict(header, ids=list(ids or []), name=name, startedAt=time.time()))
+        if job.path:
+            try:
+                os.makedirs(self.directory, exist_ok=True)
+            except OSError as e:
+                logger.warning("could not create %s: %s", self.directory, e)
+            if not writeAtomically(job.path, lambda f: f.write(json.dumps(job.header) + "\n")):
+                # the job still runs, it just can not be resumed
+                job.path = None
+        return job
@@ -0,0 +1,110 @@
+import logging
+import threading
+import time
+from typing import Dict, Optional
+
+from instrumentation import emit
+
+logger = logging.getLogger(__name__)
+
+
+# Smartsheet documents a budget of 300 requests per minute for each access token
+REQUESTS_PER_MINUTE = 300
+
+
+class RateLimiter:
+
+    def __init__(self, requests_per_minute: int = REQUESTS_PER_MINUTE, burst: int = 10):
+        """
+        Token bucket shared by every request done with the same access token. Requests reserve a token
+        and sleep until it is available, so the sustained rate stays at the budget without bursts bigger
+        than burst. A 429 pauses the whole bucket for the Retry-After time.
+        Args:
+            :param requests_per_minute is the budget of the token
+            :param burst is the maximum amount of requests sent back to back after an idle period
+        """
+        self.requests_per_minute = requests_per_minute
+        self.rate = requests_per_minute / 60
+        self.capacity = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+        self._lock = threading.Lock()
+        self.counters = {
+            "requests": 0,
+            "throttled_requests": 0,
+            "throttled_seconds": 0.0,
+            "rate_limited_responses": 0,
+            "retries": 0,
+            "backoff_seconds": 0.0
+        }
+
+    def acquire(self) -> float:
+        """Take one token, sleeping if needed. Returns the seconds waited"""
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= 1
+            wait = max(-self.tokens / self.rate if self.tokens < 0 else 0.0, self.blocked_until - now)
+            self.counters["requests"] += 1
+            if wait > 0:
+                self.counters["throttled_requests"] += 1
+                self.counters["throttled_seconds"] += wait
+        if wait > 0:
+            emit("throttle", seconds=wait)
+            time.sleep(wait)
+        return wait
+
+    def pause(self, seconds: float) -> None:
+        """Stop every request of the token for some seconds, used when smartsheet answers 429"""
+        with self._lock:
+            self.counters["rate_limited_responses"] += 1
+            self.blocked_until = max(self.blocked_until, time.monotonic() + seconds)
+            # the server says we went over the budget, start again with an empty bucket
+            self.tokens = min(self.tokens, 0.0)
+
+    def limitTo(self, requests_per_minute: int, burst: int) -> None:
+        """Lower the budget and the burst, values bigger than the current ones are ignored"""
+        with self._lock:
+            self.requests_per_minute = min(self.requests_per_minute, requests_per_minute)
+            self.rate = self.requests_per_minute / 60
+            self.capacity = min(self.capacity, burst)
+            self.tokens = min(self.tokens, self.capacity)
+
+    def record_retry(self, seconds: float) -> None:
+        with self._lock:
+            self.counters["retries"] += 1
+            self.counters["backoff_seconds"] += seconds
+
+    def stats(self) -> dict:
+        with self._lock:
+            return dict(self.counters)
+
+
+_limiters: Dict[str, RateLimiter] = {}
+_limiters_lock = threading.Lock()
+
+
+def limiter_for(key: str, requests_per_minute: Optional[int] = None, burst: Optional[int] = None) -> RateLimiter:
+    """Return the limiter of an access token, all the clients using the same token share it. The first
+    call creates it (REQUESTS_PER_MINUTE and a burst of 10 when they are not given), a later call with a
+    lower budget or burst lowers the shared limiter so no client goes over the smallest budget asked"""
+    with _limiters_lock:
+        limiter = _limiters.get(key)
+        if limiter is None:
+            limiter = RateLimiter(requests_per_minute=requests_per_minute or REQUESTS_PER_MINUTE, burst=burst or 10)
+            _limiters[key] = limiter
+            return limiter
+    requests_per_minute = requests_per_minute or limiter.requests_per_minute
+    burst = burst or limiter.capacity
+    if requests_per_minute < limiter.requests_per_minute or burst < limiter.capacity:
+        # the key is the authorization header, it is not logged
+        logger.warning("the limiter of this token runs %s requests per minute with a burst of %s, using %s and %s",
+                       limiter.requests_per_minute, limiter.capacity,
+                       min(requests_per_minute, limiter.requests_per_minute), min(burst, limiter.capacity))
+        limiter.limitTo(requests_per_minute, burst)
+    elif requests_per_minute > limiter.requests_per_minute or burst > limiter.capacity:
+        logger.warning("the limiter of this token already runs %s requests per minute with a burst of %s, "
+                       "the bigger budget asked is ignored", limiter.requests_per_minute, limiter.capacity)
+    return limiter
@@ -0,0 +1,91 @@
+import json
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+MAX_PAYLOAD_BYTES = 1024 * 1024
+
+
+class Row:
+    """Row of a sheet keyed by column title, the column ids are resolved when the payload is built.
+    A value starting with "=" is sent as a formula
+
+        Row({"Name": "ACME", "Amount": 10}).set("Status", "Open")
+        Row({"Status": "Closed"}, rowId=123)        update of an existing row
+    """
+    __slots__ = ("values", "rowId", "location")
+
+    def __init__(self, values: Optional[Dict[str, Any]] = None, rowId: Optional[int] = None, **location: Any):
+        """
+        Args:
+            :param values is a dictionary {column_title: value}
+            :param rowId is the id of the row to update, None for new rows
+            :param location are the location attributes of the row (toTop, toBottom, parentId, siblingId...),
+            new rows go to the bottom by default
+        """
+        self.values = dict(values) if values else {}
+        self.rowId = rowId
+        self.location = location
+
+    def set(self, title: str, value: Any) -> "Row":
+        self.values[title] = value
+        return self
+
+    def __setitem__(self, title: str, value: Any) -> None:
+        self.values[title] = value
+
+    def __getitem__(self, title: str) -> Any:
+        return self.values[title]
+
+    def toPayload(self, columns: Dict[str, dict]) -> dict:
+        """
+        Build the payload of the row for the rows endpoints
+        Args:
+            :param columns is the dictionary by title of createColumnDict or getColumnDict
+        Return:
+            :return payload is the row with cells by columnId, empty values clear the cell on updates
+        """
+        cells = []
+        for title, value in self.values.items():
+            if title not in columns:
+                raise KeyError(f"column {title} does not exist in the sheet")
+            if value is None:
+                if self.rowId is None:
+                    continue
+                value = ""
+            cell = {"columnId": columns[title]["id"]}
+            if isinstance(value, str) and value.startswith("="):
+                cell["formula"] = value
+            else:
+                cell["value"] = value
+            cells.append(cell)
+        payload = {"cells": cells}
+        if self.rowId is not None:
+            payload["id"] = self.rowId
+        elif not self.location:
+            payload["toBottom"] = True
+        payload.update(self.location)
+        return payload
+
+
+def toRow(row: Any) -> Row:
+    """Accept Row objects or plain dictionaries {column_title: value}"""
+    return row if isinstance(row, Row) else Row(row)
+
+
+def splitBatches(payloads: List[dict], max_rows: int, max_bytes: int = MAX_PAYLOAD_BYTES) -> Iterator[Tuple[int, List[dict]]]:
+    """
+    Split row payloads in batches with at most max_rows rows and max_bytes of json
+    Return:
+        :return batches as (position of the first row in payloads, rows of the batch)
+    """
+    start = 0
+    batch = []
+    size = 2
+    for position, payload in enumerate(payloads):
+        length = len(json.dumps(payload, separators=(",", ":"))) + 1
+        if batch and (len(batch) >= max_rows or size + length > max_bytes):
+            yield start, batch
+            start, batch, size = position, [], 2
+        batch.append(payload)
+        size += length
+    if batch:
+        yield start, batch
@@ -0,0 +1,109 @@
+import hashlib
+import json
+from typing import Any, Dict, Iterable, List, Optional
+
+from criteria import AVOID_LINES
+from row_builder import Row, toRow
+from sheet_frame import SheetFrame
+
+
+def normalize(value: Any) -> Any:
+    """Value as smartsheet stores it: empty strings are empty cells, whole floats are integers and
+    numbers sent as text come back as numbers"""
+    if value is None or value == "":
+        return None
+    if isinstance(value, bool):
+        return value
+    if isinstance(value, float):
+        return int(value) if value.is_integer() else value
+    if isinstance(value, str):
+        try:
+            number = float(value)
+        except ValueError:
+            return value
+        number = int(number) if number.is_integer() else number
+        return number if str(number) == value else value
+    return value
+
+
+def rowHash(values: Iterable[Any]) -> bytes:
+    return hashlib.blake2b(json.dumps([normalize(value) for value in values], default=str).encode(),
+                           digest_size=16).digest()
+
+
+def planUpsert(frame: SheetFrame, records: List[Any], key_column: str, delete_missing: bool = True) -> dict:
+    """
+    Compare records with the rows of a sheet by key. Only the columns present in the records are
+    compared, a row is updated when the hash of those cells changes and only the changed cells are sent.
+    Rows with an empty key or AVOID_LINES (xxx) as key and the first row of the sheet, where the formulas
+    are storaged, are never deleted.
+    Args:
+        :param frame is the current sheet as SheetFrame
+        :param records are Row objects or dictionaries {column_title: value}, all with the key column
+        :param key_column is the title of the column that identifies a row
+        :param delete_missing deletes the rows of the sheet whose key is not in the records
+    Return:
+        :return plan {"add": [Row], "update": [Row], "delete": [rowId], "unchanged": int,
+        "duplicateKeys": [key], "changedColumns": {key: [title]}}
+    """
+    records = [toRow(record) for record in records]
+    titles = []
+    for record in records:
+        for title in record.values:
+            if title not in titles:
+                titles.append(title)
+    missing = [title for title in titles if title not in frame.columns]
+    if key_column not in frame.columns:
+        missing.append(key_column)
+    if missing:
+        raise KeyError(f"columns {missing} do not exist in the sheet")
+    by_key: Dict[Any, Row] = {}
+    duplicates = []
+    for record in records:
+        if key_column not in record.values:
+            raise KeyError(f"a record has no value for the key column {key_column}")
+        key = normalize(record[key_column])
+        if key in by_key:
+            duplicates.append(key)
+        # the last record of a key wins
+        by_key[key] = record
+
+    plan = {"add": [], "update": [], "delete": [], "unchanged": 0, "duplicateKeys": duplicates, "changedColumns": {}}
+    keys = frame.column(key_column)
+    columns = {title: frame.column(title) for title in titles}
+    seen = set()
+    for position in range(len(frame)):
+        key = normalize(keys.value(position))
+        rowId = int(frame.row_ids[position])
+        record = by_key.get(key)
+        if record is None or key in seen:
+            # rows not in the records and repeated keys of the sheet
+            if delete_missing and key is not None and key not in AVOID_LINES and frame.row_numbers[position] != 1:
+                plan["delete"].append(rowId)
+            continue
+        seen.add(key)
+        compared = [title for title in titles if title in record.values]
+        current = [columns[title].value(position) for title in compared]
+        wanted = [record[title] for title in compared]
+        if rowHash(current) == rowHash(wanted):
+            plan["unchanged"] += 1
+            continue
+        changed = [title for title, old, new in zip(compared, current, wanted) if normalize(old) != normalize(new)]
+        plan["update"].append(Row({title: record[title] for title in changed}, rowId=rowId))
+        plan["changedColumns"][key] = changed
+    plan["add"] = [record for key, record in by_key.items() if key not in seen]
+    return plan
+
+
+def summarizePlan(plan: dict, examples: Optional[int] = 10) -> dict:
+    """Counts of a plan with some examples of each change, used as dry run output"""
+    return {
+        "add": len(plan["add"]),
+        "update": len(plan["update"]),
+        "delete": len(plan["delete"]),
+        "unchanged": plan["unchanged"],
+        "duplicateKeys": plan["duplicateKeys"][:examples],
+        "addExamples": [row.values for row in plan["add"][:examples]],
+        "updateExamples": dict(list(plan["changedColumns"].items())[:examples]),
+        "deleteExamples": plan["delete"][:examples]
+    }
@@ -0,0 +1,47 @@
+import threading
+import time
+from typing import List, Optional
+
+
+class SchemaCache:
+
+    def __init__(self, ttl: float = 60):
+        """
+        In memory cache of the columns of each sheet with title -> id/index/type maps. An entry is used
+        without any request during ttl seconds after its version was checked, after that the client checks
+        the sheet version again before reusing it.
+        Args:
+            :param ttl is the number of seconds an entry is trusted without checking the sheet version
+        """
+        self.ttl = ttl
+        self.entries = {}
+        self._lock = threading.Lock()
+
+    def put(self, sheetId: int, version: Optional[int], columns: List[dict]) -> dict:
+        entry = {
+            "version": version,
+            "columns": columns,
+            "byTitle": {col["title"]: {"id": col["id"], "index": col["index"], "type": col.get("type")}
+                        for col in columns},
+            "checkedAt": time.monotonic()
+        }
+        with self._lock:
+            self.entries[sheetId] = entry
+        return entry
+
+    def get(self, sheetId: int) -> Optional[dict]:
+        with self._lock:
+            return self.entries.get(sheetId)
+
+    def isFresh(self, entry: dict) -> bool:
+        return time.monotonic() - entry["checkedAt"] < self.ttl
+
+    def touch(self, sheetId: int) -> None:
+        """Mark an entry as checked against the current version"""
+        with self._lock:
+            if sheetId in self.entries:
+                self.entries[sheetId]["checkedAt"] = time.monotonic()
+
+    def invalidate(self, sheetId: int) -> None:
+        with self._lock:
+            self.entries.pop(sheetId, None)
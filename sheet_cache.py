@@ -0,0 +1,69 @@
+import json
+import os
+import threading
+from typing import Optional
+
+from common_functions_ss import writeAtomically
+
+
+class SheetCache:
+
+    def __init__(self, directory: str, max_bytes: int = 500 * 1024 * 1024):
+        """
+        On disk cache of sheet snapshots keyed by sheet id. A snapshot is a dictionary with the
+        version, name, columns and rows of the sheet, the client compares the stored version with
+        the version endpoint before reusing it. When the files are bigger than max_bytes the least
+        recently used snapshots are removed.
+        Args:
+            :param directory is the folder where snapshots are stored
+            :param max_bytes is the maximum size of all the snapshots together
+        """
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, sheetId: int) -> str:
+        return os.path.join(self.directory, f"{sheetId}.json")
+
+    def get(self, sheetId: int) -> Optional[dict]:
+        path = self._path(sheetId)
+        with self._lock:
+            if not os.path.exists(path):
+                return None
+            try:
+                with open(path, "r") as f:
+                    snapshot = json.load(f)
+            except (OSError, ValueError):
+                os.remove(path)
+                return None
+            # the modification time is used as last access for the eviction
+            os.utime(path)
+        return snapshot
+
+    def put(self, sheetId: int, snapshot: dict) -> None:
+        path = self._path(sheetId)
+        with self._lock:
+            if writeAtomically(path, lambda f: json.dump(snapshot, f, separators=(",", ":"))):
+                self._evict()
+
+    def invalidate(self, sheetId: int) -> None:
+        with self._lock:
+            try:
+                os.remove(self._path(sheetId))
+            except FileNotFoundError:
+                pass
+
+    def _evict(self) -> None:
+        files = []
+        for name in os.listdir(self.directory):
+            if not name.endswith(".json"):
+                continue
+            stat = os.stat(os.path.join(self.directory, name))
+            files.append((stat.st_mtime, stat.st_size, name))
+        total = sum(size for _, size, _ in files)
+        for _, size, name in sorted(files):
+            if total <= self.max_bytes:
+                break
+            os.remove(os.path.join(self.directory, name))
+            total -= size
@@ -0,0 +1,245 @@
+from array import array
+from bisect import bisect_left, bisect_right
+from typing import Iterable, List, Optional, Callable, Any
+
+from common_functions_ss import createColumnDict
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+NULL_CODE = -1
+# integers above this lose precision as float64
+MAX_EXACT_FLOAT_INT = 2 ** 53
+
+
+class Column:
+    """Values of one column stored with dictionary encoding: an integer code per row and the list of
+    distinct values, NULL_CODE is an empty cell. Values are looked up with their type, so True, 1 and 1.0
+    keep their own codes. Columns with mostly distinct numbers that float64 represents exactly are stored
+    as floats with NaN for empty cells"""
+
+    def __init__(self):
+        self.codes = array("i")
+        self.categories = []
+        self._lookup = {}
+        self.numbers = None
+
+    def append(self, value: Any) -> None:
+        if value is None:
+            self.codes.append(NULL_CODE)
+            return
+        key = (type(value), value)
+        code = self._lookup.get(key)
+        if code is None:
+            code = len(self.categories)
+            self._lookup[key] = code
+            self.categories.append(value)
+        self.codes.append(code)
+
+    def finish(self) -> None:
+        numeric = all(isinstance(value, float) or (isinstance(value, int) and not isinstance(value, bool)
+                                                   and abs(value) <= MAX_EXACT_FLOAT_INT) for value in self.categories)
+        if numeric and self.categories and len(self.categories) > len(self.codes) // 2:
+            numbers = array("d", (self.categories[code] if code != NULL_CODE else float("nan") for code in self.codes))
+            self.numbers = np.frombuffer(numbers, dtype=np.float64) if np is not None else numbers
+            self.codes = None
+            self.categories = []
+        elif np is not None:
+            self.codes = np.frombuffer(self.codes, dtype=np.int32)
+        self._lookup = None
+
+    def __len__(self) -> int:
+        return len(self.numbers) if self.numbers is not None else len(self.codes)
+
+    def value(self, position: int) -> Any:
+        if self.numbers is not None:
+            number = float(self.numbers[position])
+            if number != number:
+                return None
+            return int(number) if number.is_integer() else number
+        code = self.codes[position]
+        return None if code == NULL_CODE else self.categories[code]
+
+    def values(self) -> List[Any]:
+        return [self.value(position) for position in range(len(self))]
+
+    def valueType(self) -> Optional[type]:
+        """float if every value is a number, str if every value is text, None for mixed or empty columns"""
+        if self.numbers is not None:
+            return float
+        kinds = {float if isinstance(value, (int, float)) and not isinstance(value, bool) else type(value)
+                 for value in self.categories}
+        return kinds.pop() if len(kinds) == 1 and kinds <= {float, str} else None
+
+
+class ColumnIndex:
+    """Hash index of a column: distinct value -> positions of the rows with that value. Numeric columns
+    also keep the positions sorted by value to answer ranges with a binary search"""
+
+    def __init__(self, column: Column):
+        self.column = column
+        self.by_value = {}
+        self.sorted_values = []
+        self.sorted_positions = []
+        if column.numbers is not None:
+            pairs = sorted((value, position) for position, value in enumerate(column.values()) if value is not None)
+            self.sorted_values = [value for value, _ in pairs]
+            self.sorted_positions = [position for _, position in pairs]
+            for value, position in pairs:
+                self.by_value.setdefault(value, []).append(position)
+            self.nulls = [position for position in range(len(column)) if column.value(position) is None]
+            return
+        by_code = {}
+        for position, code in enumerate(column.codes.tolist() if np is not None else column.codes):
+            by_code.setdefault(code, []).append(position)
+        self.nulls = by_code.pop(NULL_CODE, [])
+        self.by_value = {}
+        for code, positions in by_code.items():
+            # values equal in python (True and 1) share the positions of the index
+            self.by_value.setdefault(column.categories[code], []).extend(positions)
+
+    def positions(self, value: Any) -> List[int]:
+        if value is None:
+            return self.nulls
+        return self.by_value.get(value, [])
+
+    def positionsWhere(self, predicate: Callable[[Any], bool]) -> List[int]:
+        """Positions of the rows where predicate(value) is True, evaluated once per distinct value"""
+        found = []
+        for value, positions in self.by_value.items():
+            if predicate(value):
+                found.extend(positions)
+        if predicate(None):
+            found.extend(self.nulls)
+        return found
+
+    def positionsBetween(self, low: Any = None, high: Any = None) -> List[int]:
+        """Positions of the rows with low <= value <= high, None is an open limit"""
+        if self.column.numbers is None:
+            return self.positionsWhere(lambda value: _between(value, low, high))
+        start = bisect_left(self.sorted_values, low) if low is not None else 0
+        end = bisect_right(self.sorted_values, high) if high is not None else len(self.sorted_values)
+        return self.sorted_positions[start:end]
+
+
+def _between(value: Any, low: Any, high: Any) -> bool:
+    if value is None:
+        return False
+    try:
+        return (low is None or value >= low) and (high is None or value <= high)
+    except TypeError:
+        return False
+
+
+class SheetFrame:
+
+    def __init__(self, columns: List[dict]):
+        """
+        Columnar representation of a sheet: row ids and row numbers in integer arrays and every
+        column as a Column, keyed by title. Use SheetFrame.fromRows to build it.
+        Args:
+            :param columns is the list of columns obtained from smartsheet
+        """
+        self.columns_list = columns
+        self.columns_info = createColumnDict(columns_info=columns)
+        self.column_types = {col["title"]: col.get("type") for col in columns}
+        self.row_ids = array("q")
+        self.row_numbers = array("i")
+        self.columns = {title: Column() for title in self.columns_info}
+        self._indexes = {}
+
+    @classmethod
+    def fromRows(cls, columns: List[dict], rows: Iterable[dict]) -> "SheetFrame":
+        """Build the frame from the columns and rows of getSheet, rows can be an iterator from
+        streamSheet so the row dictionaries are never kept together in memory"""
+        frame = cls(columns)
+        positions = [(info["index"], info["id"], frame.columns[title]) for title, info in frame.columns_info.items()]
+        for row in rows:
+            frame.row_ids.append(row["id"])
+            frame.row_numbers.append(row["rowNumber"])
+            cells = row.get("cells", [])
+            by_id = None
+            for index, columnId, column in positions:
+                if index < len(cells) and cells[index].get("columnId") == columnId:
+                    column.append(cells[index].get("value"))
+                    continue
+                # cells are not aligned with the columns, e.g. when nonexistent cells are excluded
+                if by_id is None:
+                    by_id = {cell.get("columnId"): cell.get("value") for cell in cells}
+                column.append(by_id.get(columnId))
+        for column in frame.columns.values():
+            column.finish()
+        if np is not None:
+            frame.row_ids = np.frombuffer(frame.row_ids, dtype=np.int64)
+            frame.row_numbers = np.frombuffer(frame.row_numbers, dtype=np.int32)
+        return frame
+
+    def __len__(self) -> int:
+        return len(self.row_ids)
+
+    def column(self, title: str) -> Column:
+        return self.columns[title]
+
+    def index(self, title: str) -> ColumnIndex:
+        """Hash index of a column, built the first time it is used and kept for the next queries"""
+        if title not in self._indexes:
+            self._indexes[title] = ColumnIndex(self.columns[title])
+        return self._indexes[title]
+
+    def rowIdsAt(self, positions: Iterable[int]) -> List[int]:
+        return [int(self.row_ids[position]) for position in sorted(positions)]
+
+    def toRows(self, positions: Optional[Iterable[int]] = None, titles: Optional[List[str]] = None) -> List[dict]:
+        """Convert rows back to smartsheet payloads: {id, cells: [{columnId, value}]}, empty cells are
+        not included
+
+        Args:
+            positions (Optional[Iterable[int]]): positions of the rows, e.g. from a criteria, all rows by default
+            titles (Optional[List[str]]): columns to include, all columns by default
+
+        Returns:
+            List[dict]: rows ready to be used on updateRows
+        """
+        titles = titles if titles else list(self.columns_info)
+        rows = []
+        for position in (sorted(positions) if positions is not None else range(len(self))):
+            cells = []
+            for title in titles:
+                value = self.columns[title].value(position)
+                if value is not None:
+                    cells.append({"columnId": self.columns_info[title]["id"], "value": value})
+            rows.append({"id": int(self.row_ids[position]), "cells": cells})
+        return rows
+
+    def toColumnar(self) -> dict:
+        """Plain columnar dictionary of the frame, to store it as json"""
+        return {
+            "columns": self.columns_list,
+            "rowIds": [int(rowId) for rowId in self.row_ids],
+            "rowNumbers": [int(number) for number in self.row_numbers],
+            "values": {title: column.values() for title, column in self.columns.items()}
+        }
+
+    def iterRows(self) -> Iterable[dict]:
+        """Rows of the frame in the same format of getSheet, with id, rowNumber and cells"""
+        titles = [title for title, _ in sorted(self.columns_info.items(), key=lambda item: item[1]["index"])]
+        for position in range(len(self)):
+            yield {
+                "id": int(self.row_ids[position]),
+                "rowNumber": int(self.row_numbers[position]),
+                "cells": [{"columnId": self.columns_info[title]["id"], "value": self.columns[title].value(position)}
+                          for title in titles]
+            }
+
+    @classmethod
+    def fromColumnar(cls, data: dict) -> "SheetFrame":
+        titles = [col["title"] for col in sorted(data["columns"], key=lambda col: col["index"])]
+        ids = {col["title"]: col["id"] for col in data["columns"]}
+        rows = ({
+            "id": rowId,
+            "rowNumber": data["rowNumbers"][position],
+            "cells": [{"columnId": ids[title], "value": data["values"][title][position]} for title in titles]
+        } for position, rowId in enumerate(data["rowIds"]))
+        return cls.fromRows(columns=data["columns"], rows=rows)
@@ -1,7 +1,34 @@
-import requests
+import datetime
+import hashlib
 import json
-from typing import Tuple, List, Optional
-import time
+import logging
+import mimetypes
+import os
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, as_completed, wait, FIRST_COMPLETED
+from typing import Tuple, List, Optional, Iterator, Union, BinaryIO, Callable
+import requests
+from smartsheet_transport import SmartsheetTransport, API_URL
+from batch_sizing import BatchSizer, DEFAULT_STATE_PATH, isSizeRejection
+from rate_limit import limiter_for, REQUESTS_PER_MINUTE
+from json_stream import iterObject
+from sheet_cache import SheetCache
+from schema_cache import SchemaCache
+from group_directory import GroupDirectory
+from sheet_frame import SheetFrame
+from criteria import compileCriteria, avoidLines
+from common_functions_ss import chunkIds
+from attachment_transfer import attachmentPath, isDownloaded, downloadFile
+from arrow_export import exportFrame, exportRows, ROW_GROUP_SIZE
+from row_builder import toRow, splitBatches
+from row_diff import planUpsert, summarizePlan
+from operation_journal import OperationJournal, JOURNAL_MAX_AGE
+
+STREAM_CHUNK_SIZE = 64 * 1024
+SYNC_MARGIN_SECONDS = 60
+GROUP_MEMBERS_BATCH = 100
+
+logger = logging.getLogger(__name__)
 
 
 
@@ -33,41 +60,351 @@ def createColumnDict(columns_info: List[dict], columns_names: Optional[set] = No
 
 class Smartsheet:
 
-    def __init__(self, TOKEN: str):
+    def __init__(self, TOKEN: str, pool_size: int = 10, transport: Optional[SmartsheetTransport] = None,
+                 batch_state_path: Optional[str] = DEFAULT_STATE_PATH, requests_per_minute: int = REQUESTS_PER_MINUTE,
+                 cache_dir: Optional[str] = None, cache_max_bytes: int = 500 * 1024 * 1024, schema_ttl: float = 60,
+                 groups_path: Optional[str] = None, groups_ttl: float = 3600, journal_dir: Optional[str] = None,
+                 journal_max_age: Optional[float] = JOURNAL_MAX_AGE, base_url: str = API_URL):
         """
         Constructor de la Clase
         Args:
             :param  token is the token to connect to smartsheet
+            :param pool_size is the number of keep-alive connections used by the client
+            :param transport is an optional transport to share one connection pool between clients
+            :param batch_state_path is the file where learned lot sizes are stored, None to keep them only in memory
+            :param requests_per_minute is the budget of the token, shared by every client using the same token, the smallest budget asked is used
+            :param cache_dir is the folder to keep sheet snapshots, None to always download the sheets
+            :param cache_max_bytes is the maximum size of the snapshots stored in cache_dir
+            :param schema_ttl is the number of seconds the columns of a sheet are reused without checking its version
+            :param groups_path is the json file to keep the groups directory between runs, None to keep it only in memory
+            :param groups_ttl is the number of seconds the groups directory is used before downloading it again
+            :param journal_dir is the folder of the journals of long moves, copies and deletes, e.g.
+            operation_journal.DEFAULT_JOURNAL_DIR, so interrupted jobs are resumed. None (default) keeps them only in memory
+            :param journal_max_age is the number of seconds an interrupted job can be resumed, older jobs start again
+            :param base_url is the base url of the API, e.g. the url of the mock server in benchmarks
         """
         self.token = TOKEN
+        self.base_url = base_url.rstrip("/")
+        self.transport = transport if transport else SmartsheetTransport(pool_size=pool_size)
         self.header = {
             'Authorization': f'Bearer {TOKEN}',
             'Content-Type': 'application/json'
         }
+        self.attach_header = {'Authorization': f'Bearer {TOKEN}'}
+        self.rate_limiter = limiter_for(self.header["Authorization"], requests_per_minute=requests_per_minute)
         self.queryNotFound = "ignoreRowsNotFound=true"
         self.len_movement = 500
-        self.allow_movement = False
+        self.batch_sizer = BatchSizer(path=batch_state_path, maximum=self.len_movement)
+        self.cache = SheetCache(directory=cache_dir, max_bytes=cache_max_bytes) if cache_dir else None
+        self.schema = SchemaCache(ttl=schema_ttl)
+        self.groups = GroupDirectory(self, path=groups_path, ttl=groups_ttl)
+        self.journal = OperationJournal(directory=journal_dir, max_age=journal_max_age)
 
-    def getSheet(self, sheetId: int,return_name:bool = False) -> Tuple[List[dict], List[dict]]:
-        """Function to obtain sheet data and columns info from smartsheet 
+    def throttleStats(self) -> dict:
+        """Counters of the token rate limiter: requests, throttled requests, seconds waited for the budget,
+        429 answers received, retries and seconds spent in backoff"""
+        return self.rate_limiter.stats()
+
+    def getSheetVersion(self, sheetId: int) -> Optional[int]:
+        """Obtain the current version of a sheet, it changes every time the sheet is modified
 
         Args:
             sheetId (int): Sheet ID on smartsheet
 
         Returns:
-            data, columns: data from cells, columns info
+            Optional[int]: version of the sheet
+        """
+        url = f"{self.base_url}/sheets/{sheetId}/version"
+        response = self.transport.get(url=url, headers=self.header)
+        if response.status_code != 200:
+            logger.error("%s %s", response.status_code, response.text)
+            return None
+        return response.json()["version"]
+
+    def _freshSnapshot(self, sheetId: int) -> Optional[dict]:
+        """Return the cached snapshot of a sheet if its version is still the current one, when the
+        version changed the snapshot is brought up to date with a delta sync"""
+        if not self.cache:
+            return None
+        snapshot = self.cache.get(sheetId)
+        if not snapshot:
+            return None
+        version = self.getSheetVersion(sheetId)
+        if version is None:
+            return None
+        if version == snapshot["version"]:
+            return snapshot
+        return self._deltaSync(sheetId, snapshot)
+
+    def _deltaSync(self, sheetId: int, snapshot: dict) -> Optional[dict]:
+        """Merge into a snapshot only the rows modified since its last sync. Deleted, new and moved rows
+        change the number and order of rows, only in that case the ids of all the rows are listed using a
+        single column, so the snapshot drops deleted rows and gets the new row numbers
+
+        Args:
+            sheetId (int): Sheet ID on smartsheet
+            snapshot (dict): cached snapshot with syncedAt
+
+        Returns:
+            Optional[dict]: the updated snapshot or None if a full download is needed
         """
-        url = f"https://api.smartsheet.com/2.0/sheets/{sheetId}?columnType=true"
-        response = requests.get(url=url, headers=self.header)
+        if "syncedAt" not in snapshot:
+            return None
+        synced_at = self._syncStamp()
+        url = f"{self.base_url}/sheets/{sheetId}?columnType=true&rowsModifiedSince={snapshot['syncedAt']}"
+        response = self.transport.get(url=url, headers=self.header)
         if response.status_code != 200:
-            print("no conected")
-            return None, None
+            logger.error("%s %s", response.status_code, response.text)
+            return None
         response = response.json()
-        print(f"conected to {response['name']}")
+        # a column change touches every row, not only the modified ones
+        if [col["id"] for col in response["columns"]] != [col["id"] for col in snapshot["columns"]]:
+            return None
+        positions = {row["id"]: index for index, row in enumerate(snapshot["rows"], start=1)}
+        rows_by_id = {row["id"]: row for row in snapshot["rows"]}
+        new_rows = 0
+        moved_rows = 0
+        for row in response["rows"]:
+            if row["id"] not in rows_by_id:
+                new_rows += 1
+            elif row.get("rowNumber") != positions[row["id"]]:
+                # a moved row shifts the rows between its old and its new position
+                moved_rows += 1
+            rows_by_id[row["id"]] = row
+        rows = None
+        if new_rows == 0 and moved_rows == 0 and len(rows_by_id) == response["totalRowCount"]:
+            rows = [rows_by_id[row["id"]] for row in snapshot["rows"]]
+        else:
+            listed = self._listRowIds(sheetId, response["columns"][0]["id"])
+            if listed is None or any(row["id"] not in rows_by_id for row in listed):
+                return None
+            rows = []
+            for listed_row in listed:
+                row = rows_by_id[listed_row["id"]]
+                row["rowNumber"] = listed_row["rowNumber"]
+                rows.append(row)
+        logger.info("%s synced, %s rows modified", response["name"], len(response["rows"]))
+        snapshot = {
+            "version": response["version"],
+            "name": response["name"],
+            "columns": response["columns"],
+            "rows": rows,
+            "syncedAt": synced_at
+        }
+        self.cache.put(sheetId, snapshot)
+        return snapshot
+
+    def _listRowIds(self, sheetId: int, columnId: int) -> Optional[List[dict]]:
+        """List id and row number of every row downloading a single column without empty cells"""
+        url = f"{self.base_url}/sheets/{sheetId}?columnIds={columnId}&exclude=nonexistentCells"
+        response = self.transport.get(url=url, headers=self.header)
+        if response.status_code != 200:
+            logger.error("%s %s", response.status_code, response.text)
+            return None
+        return [{"id": row["id"], "rowNumber": row["rowNumber"]} for row in response.json()["rows"]]
+
+    @staticmethod
+    def _syncStamp() -> str:
+        # taken before the request and with a margin, so edits done during the download are not lost
+        moment = datetime.datetime.now(datetime.timezone.utc) - datetime.timedelta(seconds=SYNC_MARGIN_SECONDS)
+        return moment.strftime("%Y-%m-%dT%H:%M:%SZ")
+
+    def _invalidate(self, *sheetIds: int) -> None:
+        if not self.cache:
+            return
+        for sheetId in sheetIds:
+            self.cache.invalidate(sheetId)
+
+    def getSheet(self, sheetId: int,return_name:bool = False) -> Tuple[List[dict], List[dict]]:
+        """Function to obtain sheet data and columns info from smartsheet, if the client has a cache
+        the stored snapshot is used while the sheet version does not change and when it changes only
+        the rows modified since the last sync are downloaded
+
+        Args:
+            sheetId (int): Sheet ID on smartsheet
+
+        Returns:
+            data, columns: data from cells, columns info
+        """
+        snapshot = self._freshSnapshot(sheetId)
+        if snapshot:
+            logger.info("%s obtained from cache", snapshot["name"])
+        else:
+            url = f"{self.base_url}/sheets/{sheetId}?columnType=true"
+            synced_at = self._syncStamp()
+            response = self.transport.get(url=url, headers=self.header)
+            if response.status_code != 200:
+                logger.error("failed to obtain sheet %s: %s %s", sheetId, response.status_code, response.text)
+                return None, None
+            response = response.json()
+            logger.info("conected to %s", response["name"])
+            snapshot = {
+                "version": response["version"],
+                "name": response["name"],
+                "columns": response["columns"],
+                "rows": response["rows"],
+                "syncedAt": synced_at
+            }
+            if self.cache:
+                self.cache.put(sheetId, snapshot)
+        self.schema.put(sheetId, snapshot["version"], snapshot["columns"])
         if return_name == True:
-            return response["rows"], response["columns"], response["name"]
+            return snapshot["rows"], snapshot["columns"], snapshot["name"]
         else:
-            return response["rows"], response["columns"]
+            return snapshot["rows"], snapshot["columns"]
+
+    def streamSheet(self, sheetId: int) -> Tuple[Optional[List[dict]], Iterator[dict]]:
+        """Obtain a sheet parsing the body incrementally, columns are returned first and rows are
+        yielded one at a time, so the full sheet is never held in memory. With a cache a fresh snapshot
+        is used instead, and a fully consumed stream is stored as the new snapshot
+
+        Args:
+            sheetId (int): Sheet ID on smartsheet
+
+        Returns:
+            columns, rows: columns info and an iterator over the rows of the sheet
+        """
+        snapshot = self._freshSnapshot(sheetId)
+        if snapshot:
+            logger.info("%s obtained from cache", snapshot["name"])
+            self.schema.put(sheetId, snapshot["version"], snapshot["columns"])
+            return snapshot["columns"], iter(snapshot["rows"])
+        url = f"{self.base_url}/sheets/{sheetId}?columnType=true"
+        synced_at = self._syncStamp()
+        response = self.transport.get(url=url, headers=self.header, stream=True)
+        if response.status_code != 200:
+            logger.error("failed to obtain sheet %s: %s %s", sheetId, response.status_code, response.text)
+            response.close()
+            return None, iter([])
+        events = iterObject(response.iter_content(chunk_size=STREAM_CHUNK_SIZE), stream_key="rows")
+        sheet_info = {}
+        # rows only have to be buffered if smartsheet sends them before the columns
+        early_rows = []
+        for kind, key, value in events:
+            if kind == "element":
+                early_rows.append(value)
+                continue
+            sheet_info[key] = value
+            if key == "name":
+                logger.info("conected to %s", value)
+            elif key == "columns":
+                break
+        columns = sheet_info.get("columns", [])
+        self.schema.put(sheetId, sheet_info.get("version"), columns)
+
+        def rows() -> Iterator[dict]:
+            cached_rows = [] if self.cache else None
+            try:
+                for row in early_rows:
+                    if cached_rows is not None:
+                        cached_rows.append(row)
+                    yield row
+                for kind, key, value in events:
+                    if kind == "item":
+                        sheet_info[key] = value
+                        continue
+                    if cached_rows is not None:
+                        cached_rows.append(value)
+                    yield value
+            finally:
+                response.close()
+            if cached_rows is not None and "version" in sheet_info:
+                self.cache.put(sheetId, {
+                    "version": sheet_info["version"],
+                    "name": sheet_info.get("name"),
+                    "columns": columns,
+                    "rows": cached_rows,
+                    "syncedAt": synced_at
+                })
+        return columns, rows()
+
+    def getRows(self, sheetId: int, rowIds: list) -> Tuple[Optional[List[dict]], List[dict]]:
+        """Obtain only some rows of a sheet, ids are sent in chunks on the rowIds= parameter
+
+        Args:
+            sheetId (int): Sheet ID on smartsheet
+            rowIds (list): ids of the rows to obtain
+
+        Returns:
+            columns, rows: columns info and the rows that still exist
+        """
+        url = f"{self.base_url}/sheets/{sheetId}?columnType=true&rowIds="
+        columns = None
+        rows = []
+        for chunk in chunkIds(rowIds, base_length=len(url)):
+            response = self.transport.get(url=url + ",".join(str(rowId) for rowId in chunk), headers=self.header)
+            if response.status_code != 200:
+                logger.error("%s %s", response.status_code, response.text)
+                return None, []
+            response = response.json()
+            columns = response["columns"]
+            rows.extend(response["rows"])
+        return columns, rows
+
+    def _idsByCriteria(self, sheetId: int, criteria: Optional[dict] = None, skip_first: bool = False) -> list:
+        """Stream a sheet into a SheetFrame and keep only the ids of the rows matching the criteria,
+        rows with XXX in the columns of the criteria are never included
+
+        Args:
+            sheetId (int): Sheet ID on smartsheet
+            criteria (Optional[dict]): criteria expression of criteria.compileCriteria, None to keep every row
+            skip_first (bool, optional): do not keep the first row, where formulas are storaged. Defaults to False.
+
+        Returns:
+            list: ids of the rows
+        """
+        frame = self.getSheetFrame(sheetId=sheetId)
+        if frame is None:
+            return []
+        if criteria:
+            positions = avoidLines(compileCriteria(criteria)).positions(frame)
+        else:
+            positions = range(len(frame))
+        if skip_first:
+            positions = [position for position in positions if frame.row_numbers[position] != 1]
+        return frame.rowIdsAt(positions)
+
+    def getSheetFrame(self, sheetId: int) -> Optional[SheetFrame]:
+        """Obtain a sheet as a columnar SheetFrame, rows are streamed so only the compact columns are kept
+
+        Args:
+            sheetId (int): Sheet ID on smartsheet
+
+        Returns:
+            Optional[SheetFrame]: the sheet or None if it was not possible to obtain it
+        """
+        columns, rows = self.streamSheet(sheetId=sheetId)
+        if columns is None:
+            return None
+        return SheetFrame.fromRows(columns=columns, rows=rows)
+
+    def export_sheet(self, sheetId: int, path: str, file_format: str = "parquet", row_group_size: int = ROW_GROUP_SIZE,
+                     types: Optional[dict] = None, infer_numbers: bool = True) -> Optional[int]:
+        """Export a sheet to a typed parquet or arrow file. Needs pyarrow.
+        With infer_numbers the sheet is read first as a SheetFrame and its TEXT_NUMBER columns are exported
+        as float64 when the frame stores them as numbers and as string otherwise. Without it rows are
+        streamed into row groups, so memory is bounded by row_group_size, and TEXT_NUMBER columns are strings
+
+        Args:
+            sheetId (int): Sheet ID on smartsheet
+            path (str): file to write
+            file_format (str): "parquet" or "arrow"
+            row_group_size (int): number of rows of each row group
+            types (dict): {column_title: type} to override the type of some columns, see arrow_export.arrowType
+            infer_numbers (bool): type the TEXT_NUMBER columns from their values
+
+        Returns:
+            Optional[int]: number of rows exported or None if it was not possible to obtain the sheet
+        """
+        if infer_numbers:
+            frame = self.getSheetFrame(sheetId=sheetId)
+            if frame is None:
+                return None
+            return exportFrame(path, frame, file_format=file_format, row_group_size=row_group_size, types=types)
+        columns, rows = self.streamSheet(sheetId=sheetId)
+        if columns is None:
+            return None
+        return exportRows(path, columns, rows, file_format=file_format, row_group_size=row_group_size, types=types)
 
     def createNewRow(self, sheetId: int, payload: dict, return_id: bool = False) -> (int|None):
         """
@@ -76,14 +413,13 @@ class Smartsheet:
             :param sheetId is the sheet ID on smartsheet
             :param payload contains a dictionary with all the information for new rows
         """
-        url = f"https://api.smartsheet.com/2.0/sheets/{sheetId}/rows"
+        url = f"{self.base_url}/sheets/{sheetId}/rows"
         json_payload = json.dumps(payload)
-        response = requests.post(
+        self._invalidate(sheetId)
+        response = self.transport.post(
             url=url, headers=self.header, data=json_payload)
-        print(response.status_code)
         if response.status_code != 200:
-            response = response.json()
-            print(response)
+            logger.error("%s %s", response.status_code, response.text)
             return
         if return_id == True:
             response = response.json()
@@ -99,135 +435,361 @@ class Smartsheet:
             :param sheetId is the sheet ID on smartsheet
             :param payload contains a dictionary with all the information for update rows
         """
-        url = f"https://api.smartsheet.com/2.0/sheets/{sheetId}/rows"
+        url = f"{self.base_url}/sheets/{sheetId}/rows"
         json_payload = json.dumps(payload)
-        response = requests.put(
+        self._invalidate(sheetId)
+        response = self.transport.put(
             url=url, headers=self.header, data=json_payload)
-        print(response.status_code)
         if response.status_code != 200:
-            print(response.text)
+            logger.error("%s %s", response.status_code, response.text)
+
+    def _writeBatch(self, url: str, method, key: str, payloads: List[dict]) -> List[Optional[int]]:
+        """Send a batch of rows with allowPartialSuccess, rows rejected alone or missing from the answer
+        are None in the result. A batch rejected because of its size is split in halves with the new size
+        learned for the sheet, any other failure of the whole batch makes all its rows None"""
+        response = method(url=url, headers=self.header, data=json.dumps(payloads))
+        if response.status_code == 200:
+            self.batch_sizer.success(key, len(payloads))
+            body = response.json()
+            failed = {item["index"]: item for item in body.get("failedItems", [])}
+            for index, item in failed.items():
+                logger.warning("row %s of the batch failed: %s", index, item.get("error", {}).get("message"))
+            # result only has the rows written, in the order of the request
+            accepted = [index for index in range(len(payloads)) if index not in failed]
+            written = body.get("result", [])
+            ids = [None] * len(payloads)
+            for index, row in zip(accepted, written):
+                ids[index] = row["id"]
+            if len(written) < len(accepted):
+                logger.error("no result for %s rows of the batch, indexes %s", len(accepted) - len(written), accepted[len(written):])
+            return ids
+        if not isSizeRejection(response) or len(payloads) <= self.batch_sizer.minimum:
+            logger.error("failed with a batch of %s rows: %s %s", len(payloads), response.status_code, response.text)
+            return [None] * len(payloads)
+        self.batch_sizer.failure(key, len(payloads))
+        half = len(payloads) // 2
+        return self._writeBatch(url, method, key, payloads[:half]) + self._writeBatch(url, method, key, payloads[half:])
+
+    def _writeRows(self, sheetId: int, rows: list, operation: str, max_workers: int) -> List[Optional[int]]:
+        columns = self.getColumnDict(sheetId=sheetId)
+        if columns is None:
+            return [None] * len(rows)
+        rows = [toRow(row) for row in rows]
+        if operation == "update" and any(row.rowId is None for row in rows):
+            raise ValueError("rows to update need the rowId")
+        payloads = [row.toPayload(columns) for row in rows]
+        url = f"{self.base_url}/sheets/{sheetId}/rows?allowPartialSuccess=true"
+        method = self.transport.post if operation == "add" else self.transport.put
+        key = self.batch_sizer.key(sheetId, operation)
+        ids = [None] * len(payloads)
+        self._invalidate(sheetId)
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = {executor.submit(self._writeBatch, url, method, key, batch): start
+                       for start, batch in splitBatches(payloads, max_rows=self.batch_sizer.size(key))}
+            for future in as_completed(futures):
+                result = future.result()
+                start = futures[future]
+                ids[start:start + len(result)] = result
+        logger.info("%s of %s rows written", sum(rowId is not None for rowId in ids), len(ids))
+        return ids
+
+    def add_rows(self, sheetId: int, rows: list, max_workers: int = 4) -> List[Optional[int]]:
+        """Create rows from Row objects or dictionaries {column_title: value}. Rows are split in batches
+        within the size learned for the sheet and the payload limit, and batches are sent concurrently,
+        so with max_workers > 1 the batches can land in the sheet in a different order
 
-    def deleteRows(self, sheetId: int, deleteIds: list) -> None:
+        Args:
+            sheetId (int): Sheet ID on smartsheet
+            rows (list): Row objects or dictionaries by column title
+            max_workers (int): number of batches sent at the same time
+
+        Returns:
+            List[Optional[int]]: ids of the created rows in the order of rows, None for rows that failed
         """
-        Delete rows in a sheet
+        return self._writeRows(sheetId, rows, "add", max_workers)
+
+    def update_rows(self, sheetId: int, rows: list, max_workers: int = 4) -> List[Optional[int]]:
+        """Update rows from Row objects with rowId, same batching as add_rows
+
+        Args:
+            sheetId (int): Sheet ID on smartsheet
+            rows (list): Row objects with the id of the row to update
+            max_workers (int): number of batches sent at the same time
+
+        Returns:
+            List[Optional[int]]: ids of the updated rows in the order of rows, None for rows that failed
+        """
+        return self._writeRows(sheetId, rows, "update", max_workers)
+
+    def upsert(self, sheetId: int, records: list, key_column: str, delete_missing: bool = True,
+               dry_run: bool = False, max_workers: int = 4) -> Optional[dict]:
+        """Synchronize a sheet with records by key: new keys are added, rows with changed cells are
+        updated (only the changed cells) and rows with keys not in the records are deleted. Unchanged
+        rows are not sent, so row ids, links and attachments are kept
+
+        Args:
+            sheetId (int): Sheet ID on smartsheet
+            records (list): Row objects or dictionaries {column_title: value}
+            key_column (str): title of the column that identifies a row
+            delete_missing (bool): delete the rows whose key is not in records
+            dry_run (bool): only return the summary of the planned changes
+            max_workers (int): number of batches sent at the same time
+
+        Returns:
+            Optional[dict]: summary of the changes, None if it was not possible to obtain the sheet
+        """
+        frame = self.getSheetFrame(sheetId=sheetId)
+        if frame is None:
+            return None
+        plan = planUpsert(frame, records, key_column, delete_missing=delete_missing)
+        summary = summarizePlan(plan)
+        logger.info("upsert: %s to add, %s to update, %s to delete, %s unchanged",
+                          summary["add"], summary["update"], summary["delete"], summary["unchanged"])
+        if dry_run:
+            return summary
+        if plan["update"]:
+            summary["updateFailed"] = self.update_rows(sheetId, plan["update"], max_workers=max_workers).count(None)
+        if plan["add"]:
+            summary["addFailed"] = self.add_rows(sheetId, plan["add"], max_workers=max_workers).count(None)
+        if plan["delete"]:
+            summary["deleteFailed"] = len(self.deleteRows(sheetId, plan["delete"], max_workers=max_workers)["failed"])
+        return summary
+
+    def deleteRows(self, sheetId: int, deleteIds: list, max_workers: int = 4) -> dict:
+        """
+        Delete rows in a sheet, ids are sent in chunks on the ids= parameter and chunks are sent concurrently
         Args:
             :param sheetId is the sheet ID on smartsheet
             :param deleteIds is the list of IDs to delete
+            :param max_workers is the number of chunks deleted at the same time
+        Return:
+            :return report with the ids deleted, not found on the sheet and failed {"deleted": [], "notFound": [], "failed": []}
         """
-        for rowId in deleteIds:
-            delete_url = f"https://api.smartsheet.com/2.0/sheets/{sheetId}/rows?ids={rowId}"
-            response = requests.delete(url=delete_url, headers=self.header)
-            if response.status_code != 200:
-                print(response.text)
-        return
+        url = f"{self.base_url}/sheets/{sheetId}/rows?{self.queryNotFound}&ids="
+        report = {"deleted": [], "notFound": [], "failed": []}
+        if len(deleteIds) == 0:
+            return report
+        self._invalidate(sheetId)
 
-    def moveFullRows(self, originId: int, targetId: int) -> None:
-        """Move full sheet to another aoivind to move the firs row alwais
+        def send(chunk: list):
+            return chunk, self.transport.delete(url=url + ",".join(str(rowId) for rowId in chunk), headers=self.header)
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            for chunk, response in executor.map(send, chunkIds(deleteIds, base_length=len(url))):
+                if response.status_code != 200:
+                    logger.error("%s %s", response.status_code, response.text)
+                    report["failed"].extend(chunk)
+                    continue
+                deleted = set(response.json().get("result", []))
+                for rowId in chunk:
+                    report["deleted" if int(rowId) in deleted else "notFound"].append(rowId)
+        logger.info("%s rows deleted, %s not found, %s failed", len(report["deleted"]), len(report["notFound"]), len(report["failed"]))
+        return report
+
+    def _sendInLots(self, ids: list, key: str, send, on_lot: Optional[Callable[[list], None]] = None,
+                    max_in_flight: int = 1) -> int:
+        """Send a list of ids in lots using the size learned for the sheet and operation, keeping up to
+        max_in_flight lots in flight (1 sends them one after another), the rate limiter of the token keeps
+        the requests within the budget. A lot rejected because of its size is split with the new size and
+        sent again, if it still fails with the minimum size or it fails for any other reason no new lot is
+        sent and the operation stops without changing the learned size
+
+        Args:
+            ids (list): ids to process
+            key (str): key of the sheet and operation in the batch sizer
+            send (callable): function that receives a lot of ids and returns the response
+            on_lot (callable, optional): function called with every lot processed with success
+            max_in_flight (int): number of lots sent at the same time
+
+        Returns:
+            int: amount of ids processed with success
+        """
+        retries = deque()
+        index = 0
+        processed = 0
+        stopped = False
+        in_flight = {}
+        with ThreadPoolExecutor(max_workers=max(1, max_in_flight)) as executor:
+            while in_flight or (not stopped and (retries or index < len(ids))):
+                while not stopped and len(in_flight) < max_in_flight and (retries or index < len(ids)):
+                    if retries:
+                        ids_lot = retries.popleft()
+                    else:
+                        ids_lot = ids[index:index+self.batch_sizer.size(key)]
+                        index += len(ids_lot)
+                    in_flight[executor.submit(send, ids_lot)] = ids_lot
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    ids_lot = in_flight.pop(future)
+                    response = future.result()
+                    if response.status_code == 200:
+                        self.batch_sizer.success(key, len(ids_lot))
+                        if on_lot:
+                            on_lot(ids_lot)
+                        processed += len(ids_lot)
+                        logger.debug("%s of %s rows processed", processed, len(ids))
+                        continue
+                    # auth, missing sheet, throttling or server errors do not depend on the lot size
+                    if not isSizeRejection(response) or len(ids_lot) <= self.batch_sizer.minimum:
+                        logger.error("failed with a lot of %s rows, stopping: %s %s", len(ids_lot), response.status_code, response.text)
+                        stopped = True
+                        continue
+                    new_size = self.batch_sizer.failure(key, len(ids_lot))
+                    logger.info("new lot of rows is seted in %s", new_size)
+                    retries.extend(ids_lot[start:start+new_size] for start in range(0, len(ids_lot), new_size))
+        return processed
+
+    @staticmethod
+    def _jobName(operation: str, originId: int, targetId: Optional[int] = None, criteria: Optional[dict] = None) -> str:
+        fingerprint = hashlib.blake2b(json.dumps(criteria, sort_keys=True, default=str).encode(), digest_size=6).hexdigest()
+        return f"{operation}_{originId}_{targetId}_{fingerprint}"
+
+    def getRowCount(self, sheetId: int) -> Optional[int]:
+        """Number of rows of a sheet, obtained with a one row page instead of the full sheet"""
+        url = f"{self.base_url}/sheets/{sheetId}?pageSize=1&page=1&exclude=nonexistentCells"
+        response = self.transport.get(url=url, headers=self.header)
+        if response.status_code != 200:
+            logger.error("%s %s", response.status_code, response.text)
+            return None
+        return response.json().get("totalRowCount")
+
+    def _verifyCounts(self, job) -> bool:
+        """Compare the row counts of the sheets of a finished job with the counts before it started"""
+        header = job.header
+        counts = header.get("counts", {})
+        processed = len(job.done)
+        expected = {}
+        if header["operation"] in ("move", "delete") and counts.get("origin") is not None:
+            expected[header["originId"]] = counts["origin"] - processed
+        if header["operation"] in ("move", "copy") and counts.get("target") is not None:
+            expected[header["targetId"]] = counts["target"] + processed
+        verified = True
+        for sheetId, rows in expected.items():
+            current = self.getRowCount(sheetId)
+            if current != rows:
+                logger.warning("sheet %s has %s rows and %s were expected after %s", sheetId, current, rows, header["name"])
+                verified = False
+        if verified:
+            logger.info("%s: row counts verified", header["name"])
+        return verified
+
+    def _journaledLots(self, name: str, operation: str, originId: int, targetId: Optional[int],
+                       collect: Callable[[], list], send, max_in_flight: int = 1) -> bool:
+        """Send in lots the ids returned by collect, keeping a journal of the completed lots. An unfinished
+        job with the same name that did not expire is resumed skipping the completed lots. The ids are always
+        collected again: a resumed job only sends its ids that still match, and the rows that matched after
+        the interruption run as a new job. When every lot is done the row counts of both sheets are verified
+
+        Args:
+            name (str): name of the job in the journal
+            operation (str): move, copy or delete
+            originId (int): sheet origin of the data id
+            targetId (Optional[int]): target sheet for the data id, None for deletes
+            collect (callable): function that returns the ids to process
+            send (callable): function that receives a lot of ids and returns the response
+            max_in_flight (int): number of lots sent at the same time
+
+        Returns:
+            bool: True if every lot was processed
+        """
+        key = self.batch_sizer.key(originId, operation)
+
+        def run(job, ids: list) -> bool:
+            processed = self._sendInLots(ids, key, send, on_lot=job.record, max_in_flight=max_in_flight)
+            if processed < len(ids):
+                logger.warning("%s stopped after %s of %s rows, run it again to resume it", name, len(job.done), len(job.ids))
+                return False
+            self._verifyCounts(job)
+            job.finish()
+            return True
+
+        job = self.journal.load(name)
+        ids = collect()
+        if job is not None:
+            current = set(ids)
+            remaining = job.remaining()
+            matching = [rowId for rowId in remaining if rowId in current]
+            logger.warning("resuming %s from %s: %s of %s rows already processed, %s rows no longer match and are skipped",
+                           name, job.path, len(job.done), len(job.ids), len(remaining) - len(matching))
+            if not run(job, matching):
+                return False
+            # copied rows still match the criteria on the origin
+            ids = [rowId for rowId in ids if rowId not in job.done]
+        if len(ids) == 0:
+            return True
+        counts = {"origin": self.getRowCount(originId), "target": self.getRowCount(targetId) if targetId else None}
+        job = self.journal.start(name, ids=ids, operation=operation, originId=originId, targetId=targetId, counts=counts)
+        return run(job, ids)
+
+    def _moveLots(self, originId: int, targetId: int, collect: Callable[[], list], operation: str = "move",
+                  criteria: Optional[dict] = None, max_in_flight: int = 1) -> bool:
+        """Move or copy rows to another sheet in lots with a journal, an interrupted move of the same
+        sheets and criteria is resumed where it stopped
 
         Args:
             originId (int): sheet origin of the data id
             targetId (int): target sheet for the data id
+            collect (callable): function that returns the ids of rows to move
+            operation (str, optional): move or copy. Defaults to "move".
+            criteria (Optional[dict]): criteria used to collect the ids, it identifies the job
+            max_in_flight (int, optional): number of lots sent at the same time. Defaults to 1.
+
+        Returns:
+            bool: True if every row was moved or copied
         """
-        data, _ = self.getSheet(sheetId=originId)
-        data = list(filter(lambda row: row["rowNumber"] != 1, data))
-        ids_to_move = [row["id"] for row in data]
-        url = f"https://api.smartsheet.com/2.0/sheets/{originId}/rows/move?{self.queryNotFound}"
-        len_movement = self.len_movement
-        control = self.allow_movement
-        for i in range(0, len(ids_to_move), len_movement):
-            while control == False:
-                print("test of amount of rows amount is in progress")
-                ids_lot = ids_to_move[i:i+len_movement]
-                print(f"try to move {len(ids_lot)} rows")
-                payload = {
-                    "rowIds": ids_lot,
-                    "to": {
-                        "sheetId": targetId
-                    }
-                }
-                response = requests.post(
-                    url=url, headers=self.header, data=json.dumps(payload))
-                if response.status_code != 200:
-                    len_movement -= 50
-                    print(f"new lot of rows is seted in {len_movement}")
-                else: 
-                    print(f"row will be moved in lots of {len_movement}")
-                    control = True
-            ids_lot = ids_to_move[i:i+len_movement]
-            print(f"moving {len(ids_lot)} rows")
+        url = f"{self.base_url}/sheets/{originId}/rows/{operation}?{self.queryNotFound}"
+        if operation == "copy":
+            url += "&include=all"
+
+        def send(ids_lot: list):
             payload = {
                 "rowIds": ids_lot,
                 "to": {
                     "sheetId": targetId
                 }
             }
-            response = requests.post(
+            return self.transport.post(
                 url=url, headers=self.header, data=json.dumps(payload))
-            if response.status_code != 200:
-                print(response.text)
-            else:
-                print("Success!")
+        self._invalidate(originId, targetId)
+        name = self._jobName(operation, originId, targetId, criteria)
+        return self._journaledLots(name, operation, originId, targetId, collect, send, max_in_flight=max_in_flight)
+
+    def moveFullRows(self, originId: int, targetId: int, collect: Optional[Callable[[], list]] = None,
+                     max_in_flight: int = 1) -> bool:
+        """Move full sheet to another aoivind to move the firs row alwais
+
+        Args:
+            originId (int): sheet origin of the data id
+            targetId (int): target sheet for the data id
+            collect (callable, optional): function that returns the ids to move, all rows but the first by default
+            max_in_flight (int, optional): number of lots sent at the same time. Defaults to 1.
+
+        Returns:
+            bool: True if every row was moved, an interrupted move is resumed calling it again
+        """
+        if collect is None:
+            collect = lambda: self._idsByCriteria(sheetId=originId, skip_first=True)
+        return self._moveLots(originId=originId, targetId=targetId, collect=collect, max_in_flight=max_in_flight)
 
     def moveRowsByCriteria(self, originId: int, targetId: int, criteria: dict) -> None:
-        """Function to move lines from a sheet to other. it works with exact search and it is not avaliable for
-        multipcik columns. Code is avaliable to do not sent XXX lines that are the lines where formulas are storage
+        """Function to move lines from a sheet to other. criteria can combine several columns with and/or and
+        use exact values, ranges, dates, regex or empty cells (see criteria.compileCriteria). Code is avaliable
+        to do not sent XXX lines that are the lines where formulas are storage
 
         Args:
             originId (int): Id of origin sheet of data
             targetId (int): ID of sheet where info will go
-            criteria (dict): {column: name of the column, values:listo of values to move lines to another sheet}
-        """
-        AVOID_LINES = ["xxx", "XXX"]
-        data, columns = self.getSheet(sheetId=originId)
-        column_name = criteria["column"]
-        column_name_set = set([column_name])
-        use_to_filter = createColumnDict(
-            columns_info=columns, columns_names=column_name_set)
-        data = list(filter(lambda row: (row["cells"][use_to_filter[column_name]["index"]].get("value") in criteria["values"])
-                           and (row["cells"][use_to_filter[column_name]["index"]].get("value") in criteria["values"] not in AVOID_LINES), data))
-        ids_to_move = [row["id"] for row in data]
-        print(f"is necessary to move {len(ids_to_move)} rows")
-        if len(ids_to_move) == 0:
-            print("nothing to move")
-            return 
-        url = f"https://api.smartsheet.com/2.0/sheets/{originId}/rows/move?{self.queryNotFound}"
-        len_movement = self.len_movement
-        control = self.allow_movement
-        for i in range(0, len(ids_to_move), len_movement):
-            while control == False:
-                print("test of amount of rows amount is in progress")
-                ids_lot = ids_to_move[i:i+len_movement]
-                print(f"try to move {len(ids_lot)} rows")
-                payload = {
-                    "rowIds": ids_lot,
-                    "to": {
-                        "sheetId": targetId
-                    }
-                }
-                response = requests.post(
-                    url=url, headers=self.header, data=json.dumps(payload))
-                if response.status_code != 200:
-                    len_movement -= 50
-                    print(f"new lot of rows is seted in {len_movement}")
-                else: 
-                    print(f"row will be moved in lots of {len_movement}")
-                    control = True
-            ids_lot = ids_to_move[i:i+len_movement]
-            payload = {
-                "rowIds": ids_lot,
-                "to": {
-                    "sheetId": targetId
-                }
-            }
-            response = requests.post(
-                url=url, headers=self.header, data=json.dumps(payload))
-            if response.status_code != 200:
-                print(response.text)
-            else:
-                print("Success!")
+            criteria (dict): {column: name of the column, values:listo of values to move lines to another sheet} or any criteria expression
+        """
+        def collect() -> list:
+            ids_to_move = self._idsByCriteria(sheetId=originId, criteria=criteria)
+            logger.info("is necessary to move %s rows", len(ids_to_move))
+            if len(ids_to_move) == 0:
+                logger.info("nothing to move")
+            return ids_to_move
+        self._moveLots(originId=originId, targetId=targetId, collect=collect, criteria=criteria)
 
     def createSheetCopy(self, sheetId: int, destinationId: int, destinationType: str, sheet_name: str, include:list = None) -> Optional[int]:
-        url = f"https://api.smartsheet.com/2.0/sheets/{sheetId}/copy"
+        url = f"{self.base_url}/sheets/{sheetId}/copy"
         if include:
             url += f"?include={','.join(include)}" 
         payload = {
@@ -235,63 +797,174 @@ class Smartsheet:
             "destinationId": destinationId,
             "newName": sheet_name
         }
-        response = requests.post(
+        response = self.transport.post(
             url=url, headers=self.header, data=json.dumps(payload))
         if response.status_code != 200:
-            print(response.text)
+            logger.error("%s %s", response.status_code, response.text)
             return None
-        print("Success creating copy")
+        logger.info("Success creating copy")
         response = response.json()
-        print(response)
         return response["result"]["id"]
 
-    def createteHistoryCopy(self, sheetId: int, destinationId: int, destinationType: str, sheet_name: str) -> None:
-        new_sheet_id = self.createSheetCopy(
-            sheetId=sheetId, destinationId=destinationId, destinationType=destinationType, sheet_name=sheet_name)
-        print("waiting for sheet data consolidations")
-        try:
-            print("start data moving")
-            self.moveFullRows(originId=sheetId, targetId=new_sheet_id)
-        except Exception as e:
-            print("failed historic copy")
-            print(e)
-
-    def create_columns(self, sheetIds: list, payload: list, reference_column: Optional[str] = None) -> None:
+    def createteHistoryCopy(self, sheetId: int, destinationId: int, destinationType: str, sheet_name: str,
+                            archive: bool = False, max_in_flight: int = 4) -> Optional[int]:
+        """Copy a sheet and move its rows to the copy. The copy and the moved lots are kept in a journal,
+        so calling it again after a failure reuses the copy and moves only the rows left.
+        In archive mode the row ids are collected while the copy is created (from the cached snapshot
+        when it is fresh) and max_in_flight move lots are sent at the same time within the rate budget.
+        Lots can finish in any order, so in archive mode the rows of the copy are not in the order of
+        the origin sheet, use archive=False when the order of the history matters
+
+        Args:
+            sheetId (int): sheet to archive
+            destinationId (int): folder or workspace of the copy
+            destinationType (str): folder or workspace
+            sheet_name (str): name of the copy
+            archive (bool): overlap the steps and send the lots concurrently
+            max_in_flight (int): number of move lots sent at the same time in archive mode
+
+        Returns:
+            Optional[int]: id of the copy, None if it was not created
+        """
+        name = f"history_{sheetId}_{destinationId}_{sheet_name}"
+        job = self.journal.load(name)
+        collect = None
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            if job is not None and job.header.get("newSheetId"):
+                new_sheet_id = job.header["newSheetId"]
+                logger.info("resuming historic copy on sheet %s", new_sheet_id)
+            else:
+                job = self.journal.start(name)
+                if archive:
+                    # the ids of the origin do not depend on the copy, they are collected meanwhile
+                    ids_future = executor.submit(self._idsByCriteria, sheetId=sheetId, skip_first=True)
+                    collect = ids_future.result
+                new_sheet_id = self.createSheetCopy(
+                    sheetId=sheetId, destinationId=destinationId, destinationType=destinationType, sheet_name=sheet_name)
+                if new_sheet_id is None:
+                    logger.error("failed historic copy")
+                    job.finish()
+                    return None
+                job.update(newSheetId=new_sheet_id)
+            logger.info("start data moving")
+            moved = self.moveFullRows(originId=sheetId, targetId=new_sheet_id, collect=collect,
+                                      max_in_flight=max_in_flight if archive else 1)
+        if moved:
+            job.finish()
+        else:
+            logger.warning("historic copy interrupted, run it again to resume the move to sheet %s", new_sheet_id)
+        return new_sheet_id
+
+    def getColumns(self, sheetId: int) -> Optional[List[dict]]:
+        """Obtain only the columns of a sheet, with their type, without downloading the rows
+
+        Args:
+            sheetId (int): Sheet ID on smartsheet
+
+        Returns:
+            Optional[List[dict]]: columns info
+        """
+        url = f"{self.base_url}/sheets/{sheetId}/columns?includeAll=true"
+        response = self.transport.get(url=url, headers=self.header)
+        if response.status_code != 200:
+            logger.error("%s %s", response.status_code, response.text)
+            return None
+        return response.json()["data"]
+
+    def getSchema(self, sheetId: int) -> Optional[dict]:
+        """Obtain the cached schema of a sheet: {version, columns, byTitle: {title: {id, index, type}}}.
+        The schema is reused without requests during schema_ttl seconds, then the version of the sheet is
+        checked and the columns are downloaded again only if it changed
+
+        Args:
+            sheetId (int): Sheet ID on smartsheet
+
+        Returns:
+            Optional[dict]: schema of the sheet
+        """
+        entry = self.schema.get(sheetId)
+        if entry and self.schema.isFresh(entry):
+            return entry
+        version = self.getSheetVersion(sheetId)
+        if entry and version is not None and version == entry["version"]:
+            self.schema.touch(sheetId)
+            return entry
+        # the version is read before the columns, a change in between is detected on the next check
+        columns = self.getColumns(sheetId=sheetId)
+        if columns is None:
+            return None
+        return self.schema.put(sheetId, version, columns)
+
+    def getColumnDict(self, sheetId: int, columns_names: Optional[set] = None) -> Optional[dict]:
+        """Same as createColumnDict but resolved from the schema cache, values also have the column type
+        {column_name: {id: column_id, index: column_index, type: column_type}}
+
+        Args:
+            sheetId (int): Sheet ID on smartsheet
+            columns_names (Optional[set]): columns to include, all by default
+
+        Returns:
+            Optional[dict]: columns by title
+        """
+        entry = self.getSchema(sheetId)
+        if entry is None:
+            return None
+        if not columns_names:
+            return dict(entry["byTitle"])
+        return {title: info for title, info in entry["byTitle"].items() if title in columns_names}
+
+    def _forEachSheet(self, sheetIds: list, function, max_workers: int) -> None:
+        """Run function(sheetId) for every sheet concurrently, one failed sheet does not stop the others.
+        A single sheet or max_workers=1 runs on the calling thread without a pool"""
+        if max_workers <= 1 or len(sheetIds) <= 1:
+            for sheetId in sheetIds:
+                try:
+                    function(sheetId)
+                except Exception:
+                    logger.exception("failed on sheet %s", sheetId)
+            return
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = {executor.submit(function, sheetId): sheetId for sheetId in sheetIds}
+            for future in as_completed(futures):
+                try:
+                    future.result()
+                except Exception:
+                    logger.exception("failed on sheet %s", futures[future])
+
+    def create_columns(self, sheetIds: list, payload: list, reference_column: Optional[str] = None, max_workers: int = 4) -> None:
         """Update groups of sheets with new columns, it allow to create columns on groups of sheets or
-        an unique sheet, always use a list to add the sheets.
+        an unique sheet, always use a list to add the sheets. New columns are contiguous so they are
+        created with a single request for each sheet and sheets are updated concurrently.
 
         Args:
             sheetIds (list): List of sheets to be affected -> [1234,4324323,34535443],[1234]
             payload (list): list of columns to be created
             reference_column (Optional[str], optional): This value is optional and refers the column where the columns will be added on the rigth
+            max_workers (int, optional): number of sheets updated at the same time. Defaults to 4.
         """
-        for id in sheetIds:
-            url = f"https://api.smartsheet.com/2.0/sheets/{id}/columns"
-            _, columns = self.getSheet(sheetId=id)
-            count = 1
+        def create(sheetId: int) -> None:
+            url = f"{self.base_url}/sheets/{sheetId}/columns"
+            columns = self.getColumnDict(sheetId=sheetId)
+            if columns is None:
+                return
             if reference_column:
-                temporal = set([reference_column])
-                columns = createColumnDict(
-                    columns_info=columns, columns_names=temporal)
                 base_index = columns[reference_column]["index"]
             else:
-                base_index = columns[-1]["index"]
-
-            for data_col in payload:
-                new_index = base_index+count
-                temporal_dict = {"index": new_index}
-                new_col = {**data_col, **temporal_dict}
-                count += 1
-                response = requests.post(
-                    url=url, headers=self.header, data=json.dumps([new_col]))
-                if response.status_code != 200:
-                    print(f"failed on {new_col['title']}")
-                    print(f"fialied to create columns {response.text}")
-                else:
-                    print(f"success creating {new_col['title']}")
+                base_index = max(info["index"] for info in columns.values())
+            new_columns = [{**data_col, "index": base_index + count} for count, data_col in enumerate(payload, start=1)]
+            self._invalidate(sheetId)
+            response = self.transport.post(
+                url=url, headers=self.header, data=json.dumps(new_columns))
+            self.schema.invalidate(sheetId)
+            if response.status_code != 200:
+                logger.error("failed to create columns on %s: %s %s", sheetId, response.status_code, response.text)
+            else:
+                logger.info("success creating %s columns on %s", len(new_columns), sheetId)
+        self._forEachSheet(sheetIds, create, max_workers=max_workers)
 
-    def update_columns(self, sheetIds: list, row_data: dict) -> None:
-        """provide a solution to modify on programatic way columns in a sheet or in a group of sheets
+    def update_columns(self, sheetIds: list, row_data: dict, max_workers: int = 4) -> None:
+        """provide a solution to modify on programatic way columns in a sheet or in a group of sheets,
+        sheets are updated concurrently
 
         Args:
             sheetIds (list): list of sheet ids that will be affected [1234,543453423,1234324312] or [1234] if it is an unique sheet
@@ -309,237 +982,274 @@ class Smartsheet:
                     "description": new description for the column 
                 }
             }
+            max_workers (int, optional): number of sheets updated at the same time. Defaults to 4.
         """
-        for sheetId in sheetIds:
-            _, columns = self.getSheet(sheetId=sheetId)
-            columns = createColumnDict(
-                columns_info=columns, columns_names=set(row_data.keys()))
+        def update(sheetId: int) -> None:
+            columns = self.getColumnDict(sheetId=sheetId, columns_names=set(row_data.keys()))
+            if columns is None:
+                return
+            self._invalidate(sheetId)
             for current_name, partial_payload in row_data.items():
                 try:
                     columnId = columns[current_name]["id"]
-                    url = f"https://api.smartsheet.com/2.0/sheets/{sheetId}/columns/{columnId}"
-                    response = requests.put(
+                    url = f"{self.base_url}/sheets/{sheetId}/columns/{columnId}"
+                    response = self.transport.put(
                         url=url, headers=self.header, data=json.dumps(partial_payload))
                     if response.status_code != 200:
-                        print(response.text)
+                        logger.error("%s %s", response.status_code, response.text)
                     else:
-                        print("success")
+                        logger.info("column %s updated on %s", current_name, sheetId)
                 except ValueError as e:
-                    print(f"fail with {current_name}")
-                    print(e)
+                    logger.error("fail with %s: %s", current_name, e)
+            self.schema.invalidate(sheetId)
+        self._forEachSheet(sheetIds, update, max_workers=max_workers)
 
-    def delete_columns(self, sheetIds: list, list_columns: set) -> None:
-        for sheetId in sheetIds:
-            _, columns = self.getSheet(sheetId=sheetId)
-            columns = createColumnDict(
-                columns_info=columns, columns_names=list_columns)
+    def delete_columns(self, sheetIds: list, list_columns: set, max_workers: int = 4) -> None:
+        def delete(sheetId: int) -> None:
+            columns = self.getColumnDict(sheetId=sheetId, columns_names=list_columns)
+            if columns is None:
+                return
+            self._invalidate(sheetId)
             for col_name, data in columns.items():
-                print(col_name)
                 columnId = data["id"]
-                url = f"https://api.smartsheet.com/2.0/sheets/{sheetId}/columns/{columnId}"
-                print(f" deleting {col_name}")
-                response = requests.delete(url=url, headers=self.header)
+                url = f"{self.base_url}/sheets/{sheetId}/columns/{columnId}"
+                logger.info("deleting %s", col_name)
+                response = self.transport.delete(url=url, headers=self.header)
                 if response.status_code != 200:
-                    print("failed")
-                    print(response.text)
+                    logger.error("%s %s", response.status_code, response.text)
                 else:
-                    print("success")
+                    logger.debug("success")
+            self.schema.invalidate(sheetId)
+        self._forEachSheet(sheetIds, delete, max_workers=max_workers)
 
     def changeSheetPlace(self, sheetIds: list, destinationId: int, destinationType: str = "folder") -> None:
         for sheetId in sheetIds:
-            url = f"https://api.smartsheet.com/2.0/sheets/{sheetId}/move"
+            url = f"{self.base_url}/sheets/{sheetId}/move"
             payload = {
                 "destinationType": destinationType,
                 "destinationId": destinationId
             }
-            response = requests.post(
+            response = self.transport.post(
                 url=url, headers=self.header, data=json.dumps(payload))
             if response.status_code != 200:
-                print(response.text())
+                logger.error("%s %s", response.status_code, response.text)
             else:
-                print("success")
+                logger.info("sheet %s moved", sheetId)
 
     def getRowAttachmentsList(self, sheetId: int, rowId: int) -> Optional[list]:
-        print("obtaining Attachments list")
-        url = f"https://api.smartsheet.com/2.0/sheets/{sheetId}/rows/{rowId}/attachments?includeAll=true"
-        response = requests.get(url=url, headers=self.header)
+        logger.debug("obtaining Attachments list")
+        url = f"{self.base_url}/sheets/{sheetId}/rows/{rowId}/attachments?includeAll=true"
+        response = self.transport.get(url=url, headers=self.header)
         if response.status_code == 200:
             response = response.json()
-            print(response["data"])
             return response["data"]
         else:
-            print("failed to obtain attacments")
+            logger.error("failed to obtain attacments: %s %s", response.status_code, response.text)
             return None
 
     def getSheetAttachmentsList(self,sheetId: int) -> Optional[list]:
-        print("Obtaining sheet attachments list")
-        url = f"https://api.smartsheet.com/2.0/sheets/{sheetId}/attachments?includeAll=true"
-        response = requests.get(url = url, headers=self.header)
+        logger.debug("Obtaining sheet attachments list")
+        url = f"{self.base_url}/sheets/{sheetId}/attachments?includeAll=true"
+        response = self.transport.get(url = url, headers=self.header)
         if response.status_code == 200:
             response = response.json()
             return response["data"]
         else:
-            print("failed obtaing attachments lsit of the sheet")
+            logger.error("failed obtaing attachments lsit of the sheet: %s %s", response.status_code, response.text)
             return None
         
     def getAttachmentUrl(self, sheetId: int, attachmentId: int) -> Optional[dict]:
-        print("Obtaining url to download document")
-        url = f"https://api.smartsheet.com/2.0/sheets/{sheetId}/attachments/{attachmentId}"
-        response = requests.get(url=url, headers=self.header)
+        logger.debug("Obtaining url to download document")
+        url = f"{self.base_url}/sheets/{sheetId}/attachments/{attachmentId}"
+        response = self.transport.get(url=url, headers=self.header)
         if response.status_code != 200:
-            print("failed to obtain document url")
+            logger.error("failed to obtain document url: %s %s", response.status_code, response.text)
             return None
         response = response.json()
         return response
 
+    def _listAttachments(self, sheetId: int, rowIds: Optional[list] = None, max_workers: int = 4) -> Optional[list]:
+        if rowIds is None:
+            return self.getSheetAttachmentsList(sheetId=sheetId)
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            lists = executor.map(lambda rowId: self.getRowAttachmentsList(sheetId=sheetId, rowId=rowId), rowIds)
+            return [attachment for attachments in lists for attachment in (attachments or [])]
+
+    def download_attachments(self, sheet_id: int, dest: str, row_ids: Optional[list] = None, max_workers: int = 4) -> Optional[dict]:
+        """Download the file attachments of a sheet or of some rows. Every worker resolves the url of an
+        attachment and streams its body to disk, files already present with the same size are skipped and
+        interrupted downloads are resumed
+
+        Args:
+            sheet_id (int): Sheet ID on smartsheet
+            dest (str): folder where files are stored as <attachmentId>_<name>
+            row_ids (Optional[list]): rows to download, all the attachments of the sheet by default
+            max_workers (int, optional): number of files downloaded at the same time. Defaults to 4.
+
+        Returns:
+            Optional[dict]: {"downloaded": [paths], "skipped": [paths], "failed": [attachment ids]}
+        """
+        attachments = self._listAttachments(sheetId=sheet_id, rowIds=row_ids, max_workers=max_workers)
+        if attachments is None:
+            return None
+        os.makedirs(dest, exist_ok=True)
+        report = {"downloaded": [], "skipped": [], "failed": []}
+        pending = []
+        for attachment in attachments:
+            if attachment.get("attachmentType") != "FILE":
+                continue
+            path = attachmentPath(dest, attachment)
+            if isDownloaded(path, attachment):
+                report["skipped"].append(path)
+            else:
+                pending.append((attachment, path))
+
+        def download(item: tuple) -> Optional[str]:
+            attachment, path = item
+            try:
+                info = self.getAttachmentUrl(sheetId=sheet_id, attachmentId=attachment["id"])
+            except requests.RequestException as e:
+                logger.error("failed to obtain document url of %s: %s", attachment["id"], e)
+                return None
+            if not info or "url" not in info:
+                return None
+            return path if downloadFile(self.transport, info["url"], path) is not None else None
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            for (attachment, _), path in zip(pending, executor.map(download, pending)):
+                if path:
+                    report["downloaded"].append(path)
+                else:
+                    report["failed"].append(attachment["id"])
+        logger.info("%s downloaded, %s skipped, %s failed", len(report["downloaded"]), len(report["skipped"]), len(report["failed"]))
+        return report
+
     def webhookCreation(self, payload: dict) -> Optional[dict]:
-        url = "https://api.smartsheet.com/2.0/webhooks"
-        response = requests.post(
+        url = f"{self.base_url}/webhooks"
+        response = self.transport.post(
             url=url, headers=self.header, data=json.dumps(payload))
         if response.status_code != 200:
-            print("failed webhook creation")
-            print(response.text)
+            logger.error("failed webhook creation: %s %s", response.status_code, response.text)
             return None
         return response.json()
 
     def enableWebHook(self, webhookId: int, update_payload: dict = {"enabled": True}) -> None:
-        url = f"https://api.smartsheet.com/2.0/webhooks/{webhookId}"
-        response = requests.put(
+        url = f"{self.base_url}/webhooks/{webhookId}"
+        response = self.transport.put(
             url=url, headers=self.header, data=json.dumps(update_payload))
         response = response.json()
         if response["result"]["enabled"] != True:
-            print("webhook not enabled")
+            logger.warning("webhook not enabled")
             return
-        print("webhook enabled")
+        logger.info("webhook enabled")
         return
 
     def copyRowsByCriteria(self, originId: int, targetId: int, criteria: dict) -> None:
-        """Function to copy lines from a sheet to other. it works with exact search and it is not avaliable for
-        multipcik columns. Code is avaliable to do not sent XXX lines that are the lines where formulas are storage
+        """Function to copy lines from a sheet to other. criteria can combine several columns with and/or and
+        use exact values, ranges, dates, regex or empty cells (see criteria.compileCriteria). Code is avaliable
+        to do not sent XXX lines that are the lines where formulas are storage
 
         Args:
             originId (int): Id of origin sheet of data
             targetId (int): ID of sheet where info will go
-            criteria (dict): {column: name of the column, values:listo of values to copy lines to another sheet}
-        """
-        AVOID_LINES = ["xxx", "XXX"]
-        data, columns = self.getSheet(sheetId=originId)
-        column_name = criteria["column"]
-        column_name_set = set([column_name])
-        use_to_filter = createColumnDict(
-            columns_info=columns, columns_names=column_name_set)
-        data = list(filter(lambda row: (row["cells"][use_to_filter[column_name]["index"]].get("value") in criteria["values"])
-                           and (row["cells"][use_to_filter[column_name]["index"]].get("value") in criteria["values"] not in AVOID_LINES), data))
-        ids_to_move = [row["id"] for row in data]
-        url = f"https://api.smartsheet.com/2.0/sheets/{originId}/rows/copy?{self.queryNotFound}&include=all"
-        len_movement = self.len_movement
-        for i in range(0, len(ids_to_move), len_movement):
-            while control == False:
-                print("test of amount of rows amount is in progress")
-                ids_lot = ids_to_move[i:i+len_movement]
-                print(f"try to move {len(ids_lot)} rows")
-                payload = {
-                    "rowIds": ids_lot,
-                    "to": {
-                        "sheetId": targetId
-                    }
-                }
-                response = requests.post(
-                    url=url, headers=self.header, data=json.dumps(payload))
-                if response.status_code != 200:
-                    len_movement -= 50
-                    print(f"new lot of rows is seted in {len_movement}")
-                else: 
-                    print(f"row will be moved in lots of {len_movement}")
-                    control = True
-            ids_lot = ids_to_move[i:i+len_movement]
-            payload = {
-                "rowIds": ids_lot,
-                "to": {
-                    "sheetId": targetId
-                }
-            }
-            response = requests.post(
-                url=url, headers=self.header, data=json.dumps(payload))
-            if response.status_code != 200:
-                print(response.text)
-            else:
-                print("Success!")
-            time.sleep(5)
+            criteria (dict): {column: name of the column, values:listo of values to copy lines to another sheet} or any criteria expression
+        """
+        def collect() -> list:
+            ids_to_move = self._idsByCriteria(sheetId=originId, criteria=criteria)
+            if len(ids_to_move) == 0:
+                logger.info("nothing to copy")
+            return ids_to_move
+        self._moveLots(originId=originId, targetId=targetId, collect=collect, operation="copy", criteria=criteria)
+
+    def attachFile(self, body: Union[bytes, memoryview, str, os.PathLike, BinaryIO], mime_type: str, rowId: int, sheetId: int, name_file: str) -> Optional[dict]:
+        """Attach a file to a row. The body is streamed from disk or from the buffer, it is never copied
+        fully in memory
+
+        Args:
+            body (Union[bytes, memoryview, str, os.PathLike, BinaryIO]): content as bytes, str or memoryview, path
+            of the file as os.PathLike (e.g. pathlib.Path), or an opened binary file object or mmap.mmap. A str is
+            always sent as the content, as before
+            mime_type (str): mime type of the file
+            rowId (int): row ID on smartsheet
+            sheetId (int): sheet ID on smartsheet
+            name_file (str): name of the attachment
 
-    def attachFile(self, body: bytes, mime_type: str, rowId: int, sheetId: int, name_file: str) -> None:
+        Returns:
+            Optional[dict]: the attachment created
+        """
         headers = {
-            'Authorization': f'Bearer {self.token}',
+            **self.attach_header,
             "Content-Type": mime_type,
             'Content-Disposition': f'attachment; filename="{name_file}"'
         }
-        url = f"https://api.smartsheet.com/2.0/sheets/{sheetId}/rows/{rowId}/attachments"
-        response = requests.post(url=url, headers=headers, data=body)
-        print(response)
+        url = f"{self.base_url}/sheets/{sheetId}/rows/{rowId}/attachments"
+        if isinstance(body, os.PathLike):
+            with open(body, "rb") as f:
+                response = self.transport.post(url=url, headers=headers, data=f)
+        else:
+            if hasattr(body, "seek"):
+                body.seek(0)
+            response = self.transport.post(url=url, headers=headers, data=body)
+        if response.status_code != 200:
+            logger.error("failed attaching %s: %s %s", name_file, response.status_code, response.text)
+            return None
+        logger.info("success attaching %s", name_file)
+        return response.json().get("result")
+
+    def attach_files(self, files: List[dict], max_workers: int = 4) -> list:
+        """Upload many files to many rows concurrently through the pooled transport
+
+        Args:
+            files (List[dict]): {sheetId, rowId, body, name_file (optional if body is an os.PathLike), mime_type (optional)}
+            max_workers (int, optional): number of files uploaded at the same time. Defaults to 4.
+
+        Returns:
+            list: attachment created for every file in the same order, None for the failed ones
+        """
+        def upload(item: dict) -> Optional[dict]:
+            body = item["body"]
+            name_file = item.get("name_file")
+            if not name_file:
+                if not isinstance(body, os.PathLike):
+                    logger.error("failed attaching to row %s: name_file is needed when body is not a path", item["rowId"])
+                    return None
+                name_file = os.path.basename(os.fspath(body))
+            mime_type = item.get("mime_type") or mimetypes.guess_type(name_file)[0] or "application/octet-stream"
+            try:
+                return self.attachFile(body=body, mime_type=mime_type, rowId=item["rowId"], sheetId=item["sheetId"], name_file=name_file)
+            except (OSError, requests.RequestException) as e:
+                logger.error("failed attaching %s: %s", name_file, e)
+                return None
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            return list(executor.map(upload, files))
 
     def deleteRowsByCriteria(self, sheetId: int, criteria: Optional[dict] = None) -> None:
-        """Function to delete lines from a sheet. it works with exact search and it is not avaliable for
-        multipcik columns. Code is avaliable to do not delete XXX and the first lines that are the lines where formulas are storaged
+        """Function to delete lines from a sheet. criteria can combine several columns with and/or and
+        use exact values, ranges, dates, regex or empty cells (see criteria.compileCriteria). Code is avaliable
+        to do not delete XXX and the first lines that are the lines where formulas are storaged
 
         Args:
             sheetId (int): Id of origin sheet of data
             targetId (int): ID of sheet where info will go
-            Optional criteria (dict): {column: name of the column, values:listo of values to move lines to another sheet} if not criteria all sheet will be deleted
+            Optional criteria (dict): {column: name of the column, values:listo of values to move lines to another sheet} or any criteria expression, if not criteria all sheet will be deleted
         """
-        url = f"https://api.smartsheet.com/2.0/sheets/{sheetId}/rows?ids="
-        deleteSteps = self.len_movement
-        data, columns = self.getSheet(sheetId=sheetId)
-        AVOID_LINES = ["xxx", "XXX"]
-        control = self.allow_movement
+        url = f"{self.base_url}/sheets/{sheetId}/rows?ids="
         if not criteria:
-            print("deleting full sheet")
-            idsLot = [str(row["id"]) for row in data]
+            logger.info("deleting full sheet")
         else:
-            print("preparing lines to be deleted")
-            column_name = criteria["column"]
-            column_name_set = set([column_name])
-            use_to_filter = createColumnDict(
-                columns_info=columns, columns_names=column_name_set)
-            data = list(filter(lambda row: (row["cells"][use_to_filter[column_name]["index"]].get("value") in criteria["values"])
-                               and (row["cells"][use_to_filter[column_name]["index"]].get("value") in criteria["values"] not in AVOID_LINES), data))
-            idsLot = [str(row["id"]) for row in data if row["rowNumber"] != 1]
-        index = 0
-        while control == False:
-            lotToDelete = idsLot[index:index+deleteSteps]
-            print(f"try with {deleteSteps} rows")
-            
-            if len(lotToDelete) > 0:
-                text_format = ",".join(lotToDelete)
-            else:
-                print("no ids to delete")
-                continue
-            temp_url = url + text_format
-            temp_url += f"&{self.queryNotFound}"
-            response = requests.delete(url=temp_url, headers=self.header)
-            if response.status_code != 200:
-                deleteSteps-=50
-                lotToDelete = idsLot[index:index+deleteSteps]
-                control = False
-            else:
-                print(f"rows will be deleted on lots of {deleteSteps}")
-                control = True
-                break
-        
-        for index in range(0, len(idsLot), deleteSteps):
-            lotToDelete = idsLot[index:index+deleteSteps]
-                
-            if len(lotToDelete) > 0:
-                    text_format = ",".join(lotToDelete)
-            else:
-                print("no ids to delete")
-                continue
-            temp_url = url + text_format
+            logger.info("preparing lines to be deleted")
+
+        def collect() -> list:
+            idsLot = [str(rowId) for rowId in self._idsByCriteria(sheetId=sheetId, criteria=criteria, skip_first=bool(criteria))]
+            if len(idsLot) == 0:
+                logger.info("no ids to delete")
+            return idsLot
+
+        def send(lotToDelete: list):
+            temp_url = url + ",".join(lotToDelete)
             temp_url += f"&{self.queryNotFound}"
-            response = requests.delete(url=temp_url, headers=self.header)
-            if response.status_code == 200:
-                print("success deleting rows")
-            else:
-                print(response.text)
+            return self.transport.delete(url=temp_url, headers=self.header)
+        self._invalidate(sheetId)
+        self._journaledLots(self._jobName("delete", sheetId, criteria=criteria), "delete", sheetId, None, collect, send)
 
     def createUsersGroup(self, name: str, emails: list, description: str = None) -> None:
         """Use it to create groups in smartsheet to share workspaces, sheets and others
@@ -555,35 +1265,57 @@ class Smartsheet:
         }
         if description:
             payload["description"] = description
-        url = f"https://api.smartsheet.com/2.0/groups"
-        response = requests.post(
+        url = f"{self.base_url}/groups"
+        response = self.transport.post(
             url=url, headers=self.header, data=json.dumps(payload))
+        self.groups.expire()
         if response.status_code != 200:
-            print(response.text)
+            logger.error("%s %s", response.status_code, response.text)
         else:
-            print("success")
+            logger.info("group %s created", name)
 
     def obtainGroupId(self, name: str) -> Optional[int]:
-        """Obtain Group ID based on Groups names
+        """Obtain Group ID based on Groups names, the groups directory is used so the groups are downloaded
+        only when the directory expired
         Args:
             name (str): Group to search Id
         Returns:
             Optional[int]: If Group exist you will receive the Id of the group 
         """
-        url = f"https://api.smartsheet.com/2.0/groups?includeAll=true"
-        response = requests.get(url=url, headers=self.header)
-        if response.status_code != 200:
-            print("not conected to groups")
-            print(response.text)
-            return
-        response = response.json()
-        groupsInfo = response["data"]
-        for group in groupsInfo:
-            if group["name"] == name:
-                return group["id"]
-        else:
-            print(f"group {name} not found")
+        groupId = self.groups.groupId(name)
+        if groupId is None:
+            logger.warning("group %s not found", name)
+        return groupId
+
+    def _addGroupMembers(self, groupId: int, emails: list) -> list:
+        """Add members to a group in batches, returns the emails that failed"""
+        url = f"{self.base_url}/groups/{groupId}/members"
+        failed = []
+        for index in range(0, len(emails), GROUP_MEMBERS_BATCH):
+            batch = emails[index:index+GROUP_MEMBERS_BATCH]
+            response = self.transport.post(
+                url=url, headers=self.header, data=json.dumps([{"email": email} for email in batch]))
+            if response.status_code != 200:
+                logger.error("%s %s", response.status_code, response.text)
+                failed.extend(batch)
+                continue
+            added = {member["email"]: member["id"] for member in response.json().get("result", [])}
+            self.groups.addMembers(groupId, added)
+        return failed
+
+    def _removeGroupMembers(self, groupId: int, members: dict, max_workers: int = 4) -> list:
+        """Remove members {email: userId} from a group concurrently, returns the emails that failed"""
+        def remove(email: str):
+            url = f"{self.base_url}/groups/{groupId}/members/{members[email]}"
+            response = self.transport.delete(url=url, headers=self.header)
+            if response.status_code != 200:
+                logger.error("fail deleting %s: %s %s", email, response.status_code, response.text)
+                return email
             return None
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            failed = [email for email in executor.map(remove, list(members)) if email]
+        self.groups.removeMembers(groupId, set(members) - set(failed))
+        return failed
 
     def UpdateGroupMembersByName(self, groupName: str, emails: list, action: str = "add") -> None:
         """Add or delete members from a group based on email
@@ -592,58 +1324,75 @@ class Smartsheet:
             groupName (str): Provide the name of the group to be modified
             emails (list): list of emails to add or delete
             action (str, optional): Define the action to do, only avalible add and remove. Defaults to "add".
-
-        Returns:
-            _type_: _description_
         """
         groupId = self.obtainGroupId(name=groupName)
         if not groupId:
-            print("not possible to continue")
+            logger.warning("not possible to continue")
             return
-        url = f"https://api.smartsheet.com/2.0/groups/{groupId}/members"
         if action == "add":
-            new_emails = [{"email": email} for email in emails if "@" in email]
-            response = requests.post(
-                url=url, headers=self.header, data=json.dumps(new_emails))
-            if response.status_code != 200:
-                print(response.status_code)
-            else:
-                print("success")
-                return
+            new_emails = [email for email in emails if "@" in email]
+            if not self._addGroupMembers(groupId, new_emails):
+                logger.info("members added to %s", groupName)
         elif action == "remove":
-            url = f"https://api.smartsheet.com/2.0/groups/{groupId}"
-            response = requests.get(url=url, headers=self.header)
-            response = response.json()
-            members = response["members"]
-            for member_info in members:
-                if member_info["email"] in emails:
-                    userId = member_info["id"]
-                    url = f"https://api.smartsheet.com/2.0/groups/{groupId}/members/{userId}"
-                    response = requests.delete(url=url, headers=self.header)
-                    if response.status_code != 200:
-                        print(f"fail deleting {member_info['email']}")
-                    else:
-                        print("success")
-                else:
-                    continue
+            members = self.groups.membersOf(groupName)
+            if members is None:
+                return
+            emails = {email.lower() for email in emails}
+            to_remove = {email: userId for email, userId in members.items() if email in emails}
+            if not self._removeGroupMembers(groupId, to_remove):
+                logger.info("members removed from %s", groupName)
         else:
-            print("not valid action")
+            logger.warning("not valid action %s", action)
+            return None
+
+    def sync_group_members(self, name: str, desired_emails: list, max_workers: int = 4) -> Optional[dict]:
+        """Make the members of a group exactly desired_emails, only the missing members are added and only
+        the members not desired are removed
+
+        Args:
+            name (str): name of the group
+            desired_emails (list): emails that must be members of the group
+            max_workers (int, optional): number of members removed at the same time. Defaults to 4.
+
+        Returns:
+            Optional[dict]: {"added": [], "removed": [], "failed": []} or None if the group does not exist
+        """
+        groupId = self.obtainGroupId(name=name)
+        if not groupId:
+            return None
+        members = self.groups.membersOf(name)
+        if members is None:
             return None
-    
+        desired = {email.lower() for email in desired_emails if "@" in email}
+        to_add = sorted(desired - set(members))
+        to_remove = {email: userId for email, userId in members.items() if email not in desired}
+        failed = []
+        if to_add:
+            failed.extend(self._addGroupMembers(groupId, to_add))
+        if to_remove:
+            failed.extend(self._removeGroupMembers(groupId, to_remove, max_workers=max_workers))
+        report = {
+            "added": [email for email in to_add if email not in failed],
+            "removed": [email for email in to_remove if email not in failed],
+            "failed": failed
+        }
+        logger.info("%s: %s added, %s removed, %s failed", name, len(report["added"]), len(report["removed"]), len(failed))
+        return report
+
     def crateNewSheet(self,sheetName:str, columns:dict, folderId:int,returnId = False) -> Optional[int]:
-        url = f"https://api.smartsheet.com/2.0/folders/{folderId}/sheets"
+        url = f"{self.base_url}/folders/{folderId}/sheets"
         payload = {
             "name": sheetName,
             "columns": columns
         }
         json_payload = json.dumps(payload)
-        response =  requests.post(url=url,headers=self.header,data = json_payload)
+        response =  self.transport.post(url=url,headers=self.header,data = json_payload)
 
         if response.status_code != 200:
-            print(response.text)
+            logger.error("%s %s", response.status_code, response.text)
             return None
         else:
-            print("Success!")
+            logger.info("Success!")
         if returnId:
             response = response.json()
             newId = response["result"]["id"]
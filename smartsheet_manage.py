@@ -1,16 +1,32 @@
-import requests
-from typing import Tuple, List
+from typing import Tuple, List, Optional, Iterator
 import json
+import logging
+import math
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import requests
+from smartsheet_transport import SmartsheetTransport, API_URL
+from common_functions_ss import chunkIds
+from arrow_export import exportRows, ROW_GROUP_SIZE
+
+logger = logging.getLogger(__name__)
 
+PAGE_SIZE = 2500
 
 
 class Smartsheet:
-    def __init__(self, token: str):
+    def __init__(self, token: str, pool_size: int = 10, transport: Optional[SmartsheetTransport] = None,
+                 base_url: str = API_URL):
         """
         Constructor de la Clase
         Args:
             :param  token is the token to connect to smartsheet
+            :param pool_size is the number of keep-alive connections used by the client
+            :param transport is an optional transport to share one connection pool between clients
+            :param base_url is the base url of the API, e.g. the url of the mock server in benchmarks
         """
+        self.base_url = base_url.rstrip("/")
+        self.transport = transport if transport else SmartsheetTransport(pool_size=pool_size)
         self.headers = {
             'Authorization': f'Bearer {token}',
             'Content-Type': 'application/json'
@@ -18,54 +34,128 @@ class Smartsheet:
 
     def get_sheet(self, sheet_id: int) -> Tuple[List[dict], List[dict]]:
         """
-        Obtain a sheet on Smartsheet using requests library
+        Obtain a sheet on Smartsheet using the pooled transport
         Args:
             :param sheet_id Is smartsheet id to obtain
         Return:
             :return data is the data for any row in the sheet
             :columns:info is all information about existing columns on sheet
         """
-        url = f"https://api.smartsheet.com/2.0/sheets/{sheet_id}"
-        response = requests.get(url=url, headers=self.headers)
+        url = f"{self.base_url}/sheets/{sheet_id}"
+        response = self.transport.get(url=url, headers=self.headers)
         if response.status_code != 200:
-            print(response.text)
+            logger.error("%s %s", response.status_code, response.text)
             return [], []
         response = response.json()
         data = response['rows']
         columns_info = response['columns']
-        print("sheet obtained")
+        logger.info("sheet obtained")
         return data, columns_info
 
-    def getReports(self, reportID: int) -> Tuple[List[dict], List[dict]]:
+    def _reportPage(self, reportID: int, numPage: int) -> dict:
+        url = f"{self.base_url}/reports/{reportID}?pageSize={PAGE_SIZE}&page={numPage}"
+        response = self.transport.get(url=url, headers=self.headers)
+        response.raise_for_status()
+        return response.json()
+
+    def _iterReportPages(self, reportID: int, max_workers: int = 4) -> Iterator[dict]:
+        """
+        Yield the pages of a report in order. Page 1 gives the total of rows, the other pages are
+        fetched concurrently keeping at most max_workers pages in flight, so memory is bounded
+        Args:
+            :param reportID is the reprot ID on smartsheet
+            :param max_workers is the number of pages requested at the same time
+        """
+        first_page = self._reportPage(reportID, 1)
+        yield first_page
+        total_pages = math.ceil(first_page['totalRowCount'] / PAGE_SIZE)
+        if total_pages <= 1:
+            return
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            pending = deque()
+            next_page = 2
+            while pending or next_page <= total_pages:
+                while next_page <= total_pages and len(pending) < max_workers:
+                    pending.append(executor.submit(self._reportPage, reportID, next_page))
+                    next_page += 1
+                yield pending.popleft().result()
+
+    def iter_report_rows(self, reportID: int, max_workers: int = 4) -> Iterator[dict]:
+        """
+        Yield the rows of a report as the pages arrive, without keeping the full report in memory
+        Args:
+            :param reportID is the reprot ID on smartsheet
+            :param max_workers is the number of pages requested at the same time
+        """
+        for page in self._iterReportPages(reportID, max_workers=max_workers):
+            yield from page['rows']
+
+    def streamReport(self, reportID: int, max_workers: int = 4) -> Tuple[List[dict], Iterator[dict]]:
+        """
+        Obtain the columns of a report and an iterator over its rows, the pages are requested while
+        the rows are consumed so the full report is never held in memory
+        Args:
+            :param reportID is the reprot ID on smartsheet
+            :param max_workers is the number of pages requested at the same time
+        Returns:
+            :return columns_info is all information about existing columns on report
+            :return rows is an iterator over the rows of the report
+        """
+        pages = self._iterReportPages(reportID, max_workers=max_workers)
+        try:
+            first_page = next(pages)
+        except requests.HTTPError as e:
+            logger.error("%s %s", e.response.status_code, e.response.text)
+            return [], iter([])
+
+        def rows() -> Iterator[dict]:
+            yield from first_page.pop('rows')
+            for page in pages:
+                yield from page['rows']
+        return first_page['columns'], rows()
+
+    def getReports(self, reportID: int, max_workers: int = 4) -> Tuple[List[dict], List[dict]]:
         """
-        Obtain a Smartsheer report with pagination
+        Obtain a Smartsheer report with pagination, the pages after the first one are fetched concurrently
         Args:
             :param reportID is the reprot ID on smartsheet
+            :param max_workers is the number of pages requested at the same time
         Returns:
             :return data is the data for any row in the report
             :columns:info is all information about existing columns on report
         """
-        numPage = 1
-        PAGE_SIZE = 2500
-        url = f"https://api.smartsheet.com/2.0/reports/{reportID}?pageSize={PAGE_SIZE}&page={numPage}"
-        response = requests.get(url=url, headers=self.headers)
-        if response.status_code != 200:
-            print(response.text)
+        pages = self._iterReportPages(reportID, max_workers=max_workers)
+        try:
+            first_page = next(pages)
+        except requests.HTTPError as e:
+            logger.error("%s %s", e.response.status_code, e.response.text)
             return [], []
-        response = response.json()
-        data = response['rows']
-        totalRows = response['totalRowCount']
-        columns_info = response['columns']
-        numPage += 1
-        while len(data) < totalRows:
-            url = f"https://api.smartsheet.com/2.0/reports/{reportID}?pageSize={PAGE_SIZE}&page={numPage}"
-            response = requests.get(url=url, headers=self.headers)
-            response = response.json()
-            partData = response['rows']
-            data.extend(partData)
-            numPage += 1
+        data = first_page['rows']
+        columns_info = first_page['columns']
+        for page in pages:
+            data.extend(page['rows'])
         return data, columns_info
 
+    def export_report(self, reportID: int, path: str, file_format: str = "parquet", row_group_size: int = ROW_GROUP_SIZE,
+                      types: Optional[dict] = None, max_workers: int = 4) -> int:
+        """
+        Export a report to a typed parquet or arrow file, the pages are written as row groups while
+        they arrive so memory is bounded whatever the size of the report. Needs pyarrow
+        Args:
+            :param reportID is the reprot ID on smartsheet
+            :param path is the file to write
+            :param file_format is "parquet" or "arrow"
+            :param row_group_size is the number of rows of each row group
+            :param types is a dictionary {column_title: type} to override the type of some columns
+            :param max_workers is the number of pages requested at the same time
+        Returns:
+            :return rows is the number of rows exported
+        """
+        columns_info, rows = self.streamReport(reportID, max_workers=max_workers)
+        if not columns_info:
+            return 0
+        return exportRows(path, columns_info, rows, file_format=file_format, row_group_size=row_group_size, types=types)
+
     def createNewRow(self, sheet_id: int, payload: dict) -> None:
         """
         Create new rows in a sheet
@@ -73,13 +163,12 @@ class Smartsheet:
             :param sheet_id is the sheet ID on smartsheet
             :param payload contains a dictionary with all the information for new rows
         """
-        url = f"https://api.smartsheet.com/2.0/sheets/{sheet_id}/rows"
+        url = f"{self.base_url}/sheets/{sheet_id}/rows"
         json_payload = json.dumps(payload)
-        response = requests.post(
+        response = self.transport.post(
             url=url, headers=self.headers, data=json_payload)
-        print(response.status_code)
         if response.status_code != 200:
-            print(response.text)
+            logger.error("%s %s", response.status_code, response.text)
         return
 
     def updateRows(self, sheet_id: int, payload: dict) -> None:
@@ -89,22 +178,35 @@ class Smartsheet:
             :param shee_id is the sheet ID on smartsheet
             :param payload contains a dictionary with all the information for update rows
         """
-        url = f"https://api.smartsheet.com/2.0/sheets/{sheet_id}/rows"
+        url = f"{self.base_url}/sheets/{sheet_id}/rows"
         json_payload = json.dumps(payload)
-        response = requests.put(
+        response = self.transport.put(
             url=url, headers=self.headers, data=json_payload)
-        print(response.status_code)
         if response.status_code != 200:
-            print(response.text)
+            logger.error("%s %s", response.status_code, response.text)
 
-    def deleteRows(self, sheet_id: int, delete_ids: list) -> None:
+    def deleteRows(self, sheet_id: int, delete_ids: list, max_workers: int = 4) -> dict:
         """
-        Delete rows in a sheet
+        Delete rows in a sheet, ids are sent in chunks on the ids= parameter and chunks are sent concurrently
         Args:
             :param sheet_id is the sheet ID on smartsheet
             :param delete_ids is the list of IDs to delete
+            :param max_workers is the number of chunks deleted at the same time
+        Return:
+            :return report with the ids deleted, not found on the sheet and failed {"deleted": [], "notFound": [], "failed": []}
         """
-        for row_id in delete_ids:
-            delete_url = f"https://api.smartsheet.com/2.0/sheets/{sheet_id}/rows/{row_id}"
-            response = requests.delete(url=delete_url, headers=self.headers)
-        return
+        url = f"{self.base_url}/sheets/{sheet_id}/rows?ignoreRowsNotFound=true&ids="
+        report = {"deleted": [], "notFound": [], "failed": []}
+
+        def send(chunk: list):
+            return chunk, self.transport.delete(url=url + ",".join(str(row_id) for row_id in chunk), headers=self.headers)
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            for chunk, response in executor.map(send, chunkIds(delete_ids, base_length=len(url))):
+                if response.status_code != 200:
+                    logger.error("%s %s", response.status_code, response.text)
+                    report["failed"].extend(chunk)
+                    continue
+                deleted = set(response.json().get("result", []))
+                for row_id in chunk:
+                    report["deleted" if int(row_id) in deleted else "notFound"].append(row_id)
+        return report
@@ -0,0 +1,182 @@
+import logging
+import mmap
+import os
+import random
+import threading
+import time
+from typing import Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from instrumentation import emit, endpointOf
+from rate_limit import limiter_for
+
+logger = logging.getLogger(__name__)
+
+# base url of the API, SMARTSHEET_API_URL points the clients to another server, e.g. the mock server
+API_URL = os.environ.get("SMARTSHEET_API_URL", "https://api.smartsheet.com/2.0")
+RETRY_STATUS = {429, 500, 502, 503, 504}
+# statuses where smartsheet did not process the request, so even a POST can be sent again
+SAFE_RETRY_STATUS = {429, 503}
+IDEMPOTENT_METHODS = {"GET", "PUT", "DELETE"}
+# error codes of requests smartsheet refused without processing them, e.g. 4004 when the sheet is being
+# updated by another request (answered with 409), they can be sent again whatever the method
+SAFE_RETRY_ERROR_CODES = {4004}
+
+
+class SmartsheetTransport:
+
+    def __init__(self, pool_size: int = 10, pool_block: bool = True, max_retries: int = 0,
+                 rate_limited: bool = True, retry_attempts: int = 5, backoff_base: float = 1.0, backoff_max: float = 60.0):
+        """
+        Pooled HTTP layer shared by every method of a Smartsheet client. All the threads
+        that use the same transport share one connection pool, so keep-alive connections
+        and TLS sessions are reused instead of opening a new socket per call.
+        Requests with an Authorization header go through the rate limiter of that token and 429/5xx
+        answers, and requests refused because the sheet is being updated by another request (errorCode 4004),
+        are retried honouring Retry-After or with jittered exponential backoff.
+        Args:
+            :param pool_size is the number of keep-alive connections kept open against each host
+            :param pool_block if True, threads wait for a free connection instead of opening extra ones
+            :param max_retries is the number of low level connection retries done by urllib3
+            :param rate_limited if False requests are sent without waiting for the token budget
+            :param retry_attempts is the number of times a throttled or failed request is sent again
+            :param backoff_base is the first backoff in seconds, it doubles on every attempt
+            :param backoff_max is the biggest backoff in seconds
+        """
+        self.pool_size = pool_size
+        self.adapter = HTTPAdapter(
+            pool_connections=pool_size, pool_maxsize=pool_size,
+            pool_block=pool_block, max_retries=max_retries)
+        self.base_headers = {
+            'Accept-Encoding': 'gzip, deflate',
+            'Connection': 'keep-alive'
+        }
+        self.rate_limited = rate_limited
+        self.retry_attempts = retry_attempts
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self._local = threading.local()
+
+    @property
+    def session(self) -> requests.Session:
+        """Session of the current thread, every session is mounted on the shared adapter
+        so the connection pool is the same for all of them"""
+        session = getattr(self._local, "session", None)
+        if session is None:
+            session = requests.Session()
+            session.mount("https://", self.adapter)
+            session.mount("http://", self.adapter)
+            session.headers.update(self.base_headers)
+            self._local.session = session
+        return session
+
+    def _retryAfter(self, response: requests.Response, attempt: int) -> float:
+        retry_after = response.headers.get("Retry-After")
+        if retry_after:
+            try:
+                return max(0.0, float(retry_after))
+            except ValueError:
+                pass
+        # full jitter keeps the clients that were throttled together from retrying together
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+
+    @staticmethod
+    def _errorCode(response: requests.Response) -> Optional[int]:
+        if response.status_code < 400 or "json" not in response.headers.get("Content-Type", ""):
+            return None
+        try:
+            body = response.json()
+        except ValueError:
+            return None
+        return body.get("errorCode") if isinstance(body, dict) else None
+
+    def _canRetry(self, method: str, response: requests.Response) -> bool:
+        if self._errorCode(response) in SAFE_RETRY_ERROR_CODES:
+            return True
+        if response.status_code not in RETRY_STATUS:
+            return False
+        return method.upper() in IDEMPOTENT_METHODS or response.status_code in SAFE_RETRY_STATUS
+
+    @staticmethod
+    def _bodySize(body) -> Optional[int]:
+        if body is None:
+            return 0
+        if isinstance(body, (bytes, bytearray, memoryview, mmap.mmap, str)):
+            return len(body)
+        if hasattr(body, "fileno"):
+            try:
+                return os.fstat(body.fileno()).st_size
+            except (OSError, ValueError):
+                return None
+        # generators, form dictionaries and other bodies of unknown size
+        return None
+
+    @staticmethod
+    def _responseSize(response: requests.Response, stream: bool) -> Optional[int]:
+        length = response.headers.get("Content-Length")
+        if length and length.isdigit():
+            return int(length)
+        if stream:
+            # reading the content here would load the whole download in memory
+            return None
+        return len(response.content)
+
+    def request(self, method: str, url: str, headers: Optional[dict] = None, **kwargs) -> requests.Response:
+        auth = headers.get("Authorization") if headers else None
+        limiter = limiter_for(auth) if auth and self.rate_limited else None
+        # streamed bodies (files, memory maps) are rewound before sending them again
+        body = kwargs.get("data")
+        start = body.tell() if hasattr(body, "seek") and hasattr(body, "tell") else None
+        endpoint = endpointOf(method, url)
+        sent = self._bodySize(body)
+        attempt = 0
+        while True:
+            if limiter:
+                limiter.acquire()
+            began = time.perf_counter()
+            response = self.session.request(method=method, url=url, headers=headers, **kwargs)
+            seconds = time.perf_counter() - began
+            received = self._responseSize(response, kwargs.get("stream", False))
+            logger.debug("%s %s -> %s in %.3fs (attempt %s)", method.upper(), url, response.status_code, seconds, attempt)
+            emit("request", endpoint=endpoint, method=method.upper(), status=response.status_code, seconds=seconds,
+                 bytesSent=sent, bytesReceived=received, attempt=attempt)
+            if attempt >= self.retry_attempts or not self._canRetry(method, response):
+                return response
+            if hasattr(body, "read") and start is None:
+                # a body that was consumed and can not be rewound can not be sent again
+                return response
+            wait = self._retryAfter(response, attempt)
+            logger.info("%s answered %s, retrying in %.1fs", endpoint, response.status_code, wait)
+            emit("retry", endpoint=endpoint, status=response.status_code, wait=wait)
+            response.close()
+            if limiter:
+                if response.status_code == 429:
+                    limiter.pause(wait)
+                limiter.record_retry(wait)
+            # with a limiter the 429 pause is already applied to every thread on acquire
+            if not (limiter and response.status_code == 429):
+                time.sleep(wait)
+            if start is not None:
+                body.seek(start)
+            attempt += 1
+
+    def get(self, url: str, headers: Optional[dict] = None, **kwargs) -> requests.Response:
+        return self.request("GET", url=url, headers=headers, **kwargs)
+
+    def post(self, url: str, headers: Optional[dict] = None, **kwargs) -> requests.Response:
+        return self.request("POST", url=url, headers=headers, **kwargs)
+
+    def put(self, url: str, headers: Optional[dict] = None, **kwargs) -> requests.Response:
+        return self.request("PUT", url=url, headers=headers, **kwargs)
+
+    def delete(self, url: str, headers: Optional[dict] = None, **kwargs) -> requests.Response:
+        return self.request("DELETE", url=url, headers=headers, **kwargs)
+
+    def close(self) -> None:
+        session = getattr(self._local, "session", None)
+        if session is not None:
+            session.close()
+            self._local.session = None
+        self.adapter.close()
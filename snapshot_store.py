@@ -0,0 +1,89 @@
+import json
+import os
+import threading
+from typing import Iterable, List, Optional
+
+from common_functions_ss import writeAtomically
+from sheet_frame import SheetFrame
+
+
+class SnapshotStore:
+
+    def __init__(self, directory: str, compact_ratio: float = 0.2):
+        """
+        Local store of columnar sheet snapshots. Every sheet has a base snapshot ({sheetId}.json) and a
+        log of changes ({sheetId}.log) where each change appends the modified rows and the deleted ids,
+        so applying a change costs the size of the change. When the log has more rows than
+        compact_ratio of the base, it is merged into a new base.
+        Args:
+            :param directory is the folder where snapshots are stored
+            :param compact_ratio is the size of the log, relative to the base, that triggers a compaction
+        """
+        self.directory = directory
+        self.compact_ratio = compact_ratio
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def _basePath(self, sheetId: int) -> str:
+        return os.path.join(self.directory, f"{sheetId}.json")
+
+    def _logPath(self, sheetId: int) -> str:
+        return os.path.join(self.directory, f"{sheetId}.log")
+
+    def exists(self, sheetId: int) -> bool:
+        return os.path.exists(self._basePath(sheetId))
+
+    def saveFrame(self, sheetId: int, frame: SheetFrame) -> None:
+        """Store a frame as the new base of the sheet and drop its log"""
+        path = self._basePath(sheetId)
+        with self._lock:
+            # the log is only dropped once the new base is on disk
+            if not writeAtomically(path, lambda f: json.dump(frame.toColumnar(), f, separators=(",", ":"))):
+                return
+            if os.path.exists(self._logPath(sheetId)):
+                os.remove(self._logPath(sheetId))
+
+    def appendChanges(self, sheetId: int, rows: List[dict], deleted: Iterable[int] = ()) -> None:
+        """Append modified or created rows (getSheet format) and deleted row ids to the log of the sheet"""
+        record = {"rows": rows, "deleted": list(deleted)}
+        with self._lock:
+            with open(self._logPath(sheetId), "a") as f:
+                f.write(json.dumps(record, separators=(",", ":")) + "\n")
+        if self._needsCompaction(sheetId):
+            self.compact(sheetId)
+
+    def _needsCompaction(self, sheetId: int) -> bool:
+        try:
+            log_size = os.path.getsize(self._logPath(sheetId))
+            base_size = os.path.getsize(self._basePath(sheetId))
+        except OSError:
+            return False
+        return log_size > base_size * self.compact_ratio
+
+    def compact(self, sheetId: int) -> None:
+        frame = self.loadFrame(sheetId)
+        if frame is not None:
+            self.saveFrame(sheetId, frame)
+
+    def loadFrame(self, sheetId: int) -> Optional[SheetFrame]:
+        """Build the current frame of the sheet: the base with the log applied in order"""
+        with self._lock:
+            if not self.exists(sheetId):
+                return None
+            with open(self._basePath(sheetId), "r") as f:
+                base = json.load(f)
+            changes = []
+            if os.path.exists(self._logPath(sheetId)):
+                with open(self._logPath(sheetId), "r") as f:
+                    changes = [json.loads(line) for line in f if line.strip()]
+        if not changes:
+            return SheetFrame.fromColumnar(base)
+        rows = {row["id"]: row for row in SheetFrame.fromColumnar(base).iterRows()}
+        for change in changes:
+            for row in change["rows"]:
+                rows[row["id"]] = row
+            for rowId in change["deleted"]:
+                rows.pop(rowId, None)
+        # row numbers are the ones of the last download of every row
+        ordered = sorted(rows.values(), key=lambda row: row["rowNumber"])
+        return SheetFrame.fromRows(columns=base["columns"], rows=ordered)
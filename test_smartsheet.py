@@ -0,0 +1,451 @@
+import asyncio
+import json
+import os
+import pathlib
+import random
+import time
+import uuid
+from typing import Optional
+
+import pytest
+import requests
+
+from async_smartsheet import AsyncSmartsheet
+from batch_sizing import BatchSizer, isSizeRejection
+from common_functions_ss import chunkIds
+from criteria import compileCriteria
+from json_stream import iterObject
+from mock_smartsheet import MockConfig, MockSmartsheet
+from operation_journal import OperationJournal
+from rate_limit import limiter_for
+from row_diff import planUpsert
+from sheet_frame import Column, SheetFrame
+from smartsheetControler import Smartsheet
+from smartsheet_transport import SmartsheetTransport
+
+COLUMNS = [{"title": "Key"}, {"title": "Status"}, {"title": "Amount"}]
+OLD_STAMP = "2020-01-01T00:00:00Z"
+
+
+@pytest.fixture
+def server():
+    with MockSmartsheet() as mock:
+        yield mock
+
+
+def newClient(server: MockSmartsheet, **options) -> Smartsheet:
+    # a token per client so every test has its own rate limiter
+    options = {"batch_state_path": None, "journal_dir": None, "requests_per_minute": 100000, **options}
+    return Smartsheet(f"test-{uuid.uuid4()}", base_url=server.url, **options)
+
+
+def answer(status: int, body: bytes = b"{}", headers: Optional[dict] = None) -> requests.Response:
+    response = requests.Response()
+    response.status_code = status
+    response._content = body
+    response.headers.update(headers or {})
+    return response
+
+
+class FakeSession:
+    """Session of a transport that answers the given responses in order and records the methods"""
+
+    def __init__(self, *responses: requests.Response):
+        self.responses = list(responses)
+        self.methods = []
+
+    def request(self, method: str, url: str, **kwargs) -> requests.Response:
+        self.methods.append(method)
+        return self.responses.pop(0)
+
+    def close(self) -> None:
+        pass
+
+
+def fakeTransport(*responses: requests.Response, **options) -> SmartsheetTransport:
+    transport = SmartsheetTransport(rate_limited=False, **{"backoff_base": 0.0, **options})
+    transport._local.session = FakeSession(*responses)
+    return transport
+
+
+def addRows(server: MockSmartsheet, sheetId: int, rows: list, stamp: str = OLD_STAMP) -> None:
+    sheet = server.state.sheets[sheetId]
+    ids = [col["id"] for col in sheet["columns"]]
+    with server.state.lock:
+        for values in rows:
+            sheet["rows"].append({"id": server.state.newId(), "modifiedAt": stamp,
+                                  "cells": {columnId: value for columnId, value in zip(ids, values) if value is not None}})
+        server.state._touch(sheet)
+
+
+def frameOf(rows: list) -> SheetFrame:
+    columns = [{"id": index + 1, "index": index, "title": col["title"], "type": "TEXT_NUMBER"} for index, col in enumerate(COLUMNS)]
+    return SheetFrame.fromRows(columns, ({
+        "id": 100 + position, "rowNumber": position + 1,
+        "cells": [{"columnId": index + 1, "value": value} for index, value in enumerate(values)]
+    } for position, values in enumerate(rows)))
+
+
+# parsing and encoding
+
+def test_iter_object_any_chunk_size():
+    doc = {"id": 7, "name": "sheet \"a\" \\ é中", "version": -3, "ratio": 1.5e-3, "columns": [{"id": 1}],
+           "rows": [{"id": n, "cells": [{"value": None}, {"value": True}, {"value": f"r{n},]}}"}]} for n in range(5)],
+           "empty": [], "flag": False}
+    body = json.dumps(doc, ensure_ascii=False).encode()
+    for size in (1, 2, 3, 7, 64, len(body)):
+        chunks = (body[start:start+size] for start in range(0, len(body), size))
+        events = list(iterObject(chunks, stream_key="rows"))
+        assert [value for kind, _, value in events if kind == "element"] == doc["rows"]
+        assert {key: value for kind, key, value in events if kind == "item"} == {key: value for key, value in doc.items() if key != "rows"}
+
+
+def test_column_keeps_types_and_big_integers():
+    column = Column()
+    for value in [True, 1, 0, False, 1]:
+        column.append(value)
+    column.finish()
+    assert [(type(value), value) for value in column.values()] == [(bool, True), (int, 1), (int, 0), (bool, False), (int, 1)]
+
+    column = Column()
+    for value in [9007199254740993, 5, None, 7]:
+        column.append(value)
+    column.finish()
+    assert column.values() == [9007199254740993, 5, None, 7]
+
+
+def test_chunk_ids_limits():
+    ids = [10 ** (n % 12) + n for n in range(2000)]
+    chunks = chunkIds(ids, base_length=50, max_ids=300, max_url_length=2000)
+    assert [rowId for chunk in chunks for rowId in chunk] == ids
+    for chunk in chunks:
+        assert len(chunk) <= 300
+        assert 50 + len(",".join(str(rowId) for rowId in chunk)) <= 2000
+
+
+def test_compile_criteria_matches_python_filter():
+    rows = [[f"K{n}", ["Open", "Closed", "Late", None][n % 4], n * 10] for n in range(200)]
+    frame = frameOf(rows)
+    expression = {"or": [
+        {"and": [{"column": "Status", "values": ["Open", "Late"]}, {"column": "Amount", "range": [100, 1000]}]},
+        {"column": "Key", "regex": "^K1[0-9]$"},
+        {"and": [{"column": "Status", "isNull": True}, {"column": "Key", "values": ["K3", "K7", "K8"], "not": True}]},
+    ]}
+    expected = {position for position, (key, status, amount) in enumerate(rows)
+                if (status in ("Open", "Late") and 100 <= amount <= 1000)
+                or (len(key) == 3 and key.startswith("K1"))
+                or (status is None and key not in ("K3", "K7", "K8"))}
+    assert compileCriteria(expression).positions(frame) == expected
+
+
+def test_range_bounds_follow_the_column_type():
+    numbers = frameOf([[f"K{n}", "Open", n * 10] for n in range(20)])
+    repeated = frameOf([[f"K{n}", "Open", n % 3] for n in range(20)])
+    assert numbers.column("Amount").numbers is not None and repeated.column("Amount").numbers is None
+    assert compileCriteria({"column": "Amount", "range": ["150", None]}).positions(numbers) == set(range(15, 20))
+    assert compileCriteria({"column": "Amount", "range": ["1", 1.5]}).positions(repeated) == {n for n in range(20) if n % 3 == 1}
+    with pytest.raises(ValueError, match="Amount"):
+        compileCriteria({"column": "Amount", "range": ["ten", None]}).positions(numbers)
+    with pytest.raises(ValueError, match="Key"):
+        compileCriteria({"column": "Key", "range": [1, None]}).positions(numbers)
+
+
+def test_plan_upsert():
+    frame = frameOf([["A", "Open", 1], ["B", "Open", 2], ["C", "Late", 3], ["xxx", None, None], [None, "Open", 5]])
+    plan = planUpsert(frame, [{"Key": "A", "Status": "Open", "Amount": "1"}, {"Key": "B", "Status": "Closed"},
+                              {"Key": "D", "Status": "Open"}], key_column="Key")
+    assert plan["unchanged"] == 1
+    assert [(row.rowId, row.values) for row in plan["update"]] == [(101, {"Status": "Closed"})]
+    assert [row.values for row in plan["add"]] == [{"Key": "D", "Status": "Open"}]
+    # rows with xxx or an empty key are never deleted
+    assert plan["delete"] == [102]
+
+
+def test_plan_upsert_never_deletes_the_first_row():
+    frame = frameOf([["Header", "=SUM()", None], ["A", "Open", 1], ["B", "Open", 2]])
+    plan = planUpsert(frame, [{"Key": "A", "Status": "Open"}], key_column="Key")
+    assert plan["delete"] == [102]
+
+
+# lot sizes
+
+def test_batch_sizer_learns_from_size_rejections():
+    sizer = BatchSizer(path=None, maximum=500)
+    key = sizer.key(1, "move")
+    assert sizer.failure(key, 500) == 250
+    sizer.success(key, 250)
+    assert sizer.size(key) == 375
+    assert sizer.failure(key, 375) == 312
+
+
+def test_batch_sizer_keeps_sizes_when_the_file_can_not_be_written(tmp_path):
+    sizer = BatchSizer(path=str(tmp_path / "missing" / "sizes.json"), maximum=500)
+    key = sizer.key(1, "move")
+    assert sizer.failure(key, 500) == 250
+    sizer.success(key, 250)
+    assert sizer.size(key) == 375
+    assert os.listdir(tmp_path) == []
+
+
+def test_is_size_rejection():
+    assert isSizeRejection(answer(413))
+    assert isSizeRejection(answer(414))
+    assert isSizeRejection(answer(400, b'{"errorCode": 1018, "message": "too many rows"}'))
+    assert not isSizeRejection(answer(400, b'{"errorCode": 1036}'))
+    assert not isSizeRejection(answer(429))
+    assert not isSizeRejection(answer(502, b"bad gateway"))
+
+
+def test_move_shrinks_lots_on_row_limit():
+    with MockSmartsheet(MockConfig(max_rows_per_request=120)) as server:
+        origin = server.state.addSheet("origin", COLUMNS, [[f"K{n}", "Closed", n] for n in range(1000)])
+        target = server.state.addSheet("target", COLUMNS)
+        client = newClient(server)
+        client.moveRowsByCriteria(origin, target, {"column": "Status", "values": ["Closed"]})
+        assert len(server.state.sheets[target]["rows"]) == 1000
+        assert client.batch_sizer.size(client.batch_sizer.key(origin, "move")) <= 120
+
+
+def test_outage_does_not_split_nor_shrink(server):
+    origin = server.state.addSheet("origin", COLUMNS, [[f"K{n}", "Closed", n] for n in range(1000)])
+    target = server.state.addSheet("target", COLUMNS)
+    client = newClient(server)
+    posts = []
+
+    def outage(url, headers=None, **kwargs):
+        posts.append(url)
+        return answer(502, b"bad gateway")
+    client.transport.post = outage
+    client.moveRowsByCriteria(origin, target, {"column": "Status", "values": ["Closed"]})
+    assert len(posts) == 1
+    ids = client.add_rows(target, [{"Key": f"N{n}"} for n in range(500)])
+    assert ids == [None] * 500
+    assert len(posts) == 2
+    assert client.batch_sizer.state == {}
+
+
+# transport
+
+def test_shared_limiter_uses_the_smallest_budget(caplog):
+    key = f"Bearer {uuid.uuid4()}"
+    limiter = limiter_for(key, requests_per_minute=600, burst=20)
+    assert limiter_for(key) is limiter and limiter.requests_per_minute == 600
+    assert limiter_for(key, requests_per_minute=120) is limiter
+    assert (limiter.requests_per_minute, limiter.capacity, limiter.rate) == (120, 20, 2)
+    limiter_for(key, requests_per_minute=900, burst=5)
+    assert (limiter.requests_per_minute, limiter.capacity) == (120, 5)
+    assert len(caplog.records) == 2 and key not in caplog.text
+
+
+def test_throttled_request_waits_retry_after():
+    with MockSmartsheet(MockConfig(requests_per_minute=1, retry_after=1)) as server:
+        sheetId = server.state.addSheet("sheet", COLUMNS, [["a"]])
+        client = newClient(server)
+        client.transport.retry_attempts = 1
+        assert client.getRowCount(sheetId) == 1
+        began = time.monotonic()
+        assert client.getRowCount(sheetId) is None
+        assert time.monotonic() - began >= 1
+        stats = client.throttleStats()
+        assert (stats["rate_limited_responses"], stats["retries"], stats["backoff_seconds"]) == (1, 1, 1.0)
+
+
+def test_backoff_is_jittered_and_capped():
+    transport = SmartsheetTransport(backoff_base=1.0, backoff_max=4.0)
+    random.seed(7)
+    for attempt in range(6):
+        waits = [transport._retryAfter(answer(502), attempt) for _ in range(50)]
+        assert all(0 <= wait <= min(4.0, 2 ** attempt) for wait in waits)
+        assert len(set(waits)) > 1
+    assert transport._retryAfter(answer(429, headers={"Retry-After": "3"}), 5) == 3.0
+
+
+def test_post_is_not_retried_on_server_errors():
+    transport = fakeTransport(answer(502), answer(200))
+    assert transport.post("http://mock/sheets/1/rows").status_code == 502
+    assert transport.session.methods == ["POST"]
+    transport = fakeTransport(answer(502), answer(200))
+    assert transport.get("http://mock/sheets/1").status_code == 200
+    transport = fakeTransport(answer(503), answer(200))
+    assert transport.post("http://mock/sheets/1/rows").status_code == 200
+    assert transport.session.methods == ["POST", "POST"]
+
+
+def test_sheet_being_updated_is_retried_even_for_post():
+    busy = answer(409, b'{"errorCode": 4004, "message": "sheet is being updated"}', {"Content-Type": "application/json"})
+    transport = fakeTransport(busy, answer(200))
+    assert transport.post("http://mock/sheets/1/rows").status_code == 200
+    assert transport.session.methods == ["POST", "POST"]
+    conflict = answer(409, b'{"errorCode": 1020, "message": "already exists"}', {"Content-Type": "application/json"})
+    transport = fakeTransport(conflict, answer(200))
+    assert transport.post("http://mock/groups").status_code == 409
+
+
+def test_short_write_answer_leaves_missing_rows_empty(server):
+    sheetId = server.state.addSheet("sheet", COLUMNS)
+    client = newClient(server)
+    partial = {"message": "PARTIAL_SUCCESS", "result": [{"id": 11}],
+               "failedItems": [{"index": 1, "error": {"message": "invalid"}}]}
+    client.transport.post = lambda url, headers=None, **kwargs: answer(200, json.dumps(partial).encode())
+    assert client.add_rows(sheetId, [{"Key": f"K{n}"} for n in range(4)]) == [11, None, None, None]
+
+
+# cache and journal
+
+def test_delta_sync_with_moved_row(server, tmp_path):
+    sheetId = server.state.addSheet("sheet", COLUMNS)
+    addRows(server, sheetId, [["10", "Open", 1], ["11", "Open", 2], ["12", "Open", 3]])
+    client = newClient(server, cache_dir=str(tmp_path))
+    client.getSheet(sheetId)
+    sheet = server.state.sheets[sheetId]
+    with server.state.lock:
+        moved = sheet["rows"].pop()
+        moved["cells"][sheet["columns"][1]["id"]] = "Closed"
+        moved["modifiedAt"] = "2100-01-01T00:00:00Z"
+        sheet["rows"].insert(0, moved)
+        server.state._touch(sheet)
+    rows, _ = client.getSheet(sheetId)
+    assert [(row["cells"][0]["value"], row["cells"][1]["value"]) for row in rows] == [("12", "Closed"), ("10", "Open"), ("11", "Open")]
+    assert [row["rowNumber"] for row in rows] == [1, 2, 3]
+
+
+def test_resumed_move_collects_new_rows(server, tmp_path):
+    origin = server.state.addSheet("origin", COLUMNS)
+    addRows(server, origin, [[f"K{n}", "Closed", n] for n in range(1200)])
+    target = server.state.addSheet("target", COLUMNS)
+    client = newClient(server, journal_dir=str(tmp_path))
+    post = client.transport.post
+    moves = []
+
+    def failSecondLot(url, headers=None, **kwargs):
+        if "/rows/move" in url:
+            moves.append(url)
+            if len(moves) == 2:
+                return answer(404)
+        return post(url, headers=headers, **kwargs)
+    client.transport.post = failSecondLot
+    criteria = {"column": "Status", "values": ["Closed"]}
+    client.moveRowsByCriteria(origin, target, criteria)
+    assert len(server.state.sheets[target]["rows"]) == 500
+    assert os.listdir(tmp_path)
+
+    addRows(server, origin, [[f"N{n}", "Closed", n] for n in range(30)])
+    client.moveRowsByCriteria(origin, target, criteria)
+    assert len(server.state.sheets[origin]["rows"]) == 0
+    assert len(server.state.sheets[target]["rows"]) == 1230
+    assert os.listdir(tmp_path) == []
+
+
+def test_resumed_delete_skips_rows_that_no_longer_match(server, tmp_path):
+    sheetId = server.state.addSheet("sheet", COLUMNS)
+    addRows(server, sheetId, [[f"K{n}", "Closed", n] for n in range(1200)])
+    client = newClient(server, journal_dir=str(tmp_path))
+    delete = client.transport.delete
+    deletes = []
+
+    def failSecondLot(url, headers=None, **kwargs):
+        deletes.append(url)
+        if len(deletes) == 2:
+            return answer(404)
+        return delete(url, headers=headers, **kwargs)
+    client.transport.delete = failSecondLot
+    criteria = {"column": "Status", "values": ["Closed"]}
+    client.deleteRowsByCriteria(sheetId, criteria)
+    assert os.listdir(tmp_path)
+
+    sheet = server.state.sheets[sheetId]
+    with server.state.lock:
+        for row in sheet["rows"][-20:]:
+            row["cells"][sheet["columns"][1]["id"]] = "Open"
+        server.state._touch(sheet)
+    client.deleteRowsByCriteria(sheetId, criteria)
+    # the first row and the rows edited after the interruption are kept
+    assert len(sheet["rows"]) == 21
+    assert os.listdir(tmp_path) == []
+
+
+def test_old_journals_are_not_resumed(tmp_path):
+    journal = OperationJournal(directory=str(tmp_path), max_age=3600)
+    job = journal.start("move_1_2", ids=[1, 2, 3], operation="move")
+    job.record([1])
+    assert journal.load("move_1_2").remaining() == [2, 3]
+    job.update(startedAt=0)
+    assert journal.load("move_1_2") is None
+    assert os.listdir(tmp_path) == []
+
+
+# export
+
+def test_export_types_text_number_columns_from_the_frame(server, tmp_path):
+    pq = pytest.importorskip("pyarrow.parquet")
+    sheetId = server.state.addSheet("sheet", COLUMNS, [[f"K{n}", "Open" if n else 7, n * 1.5 if n != 2 else None] for n in range(5)])
+    client = newClient(server)
+    path = str(tmp_path / "sheet.parquet")
+    assert client.export_sheet(sheetId, path) == 5
+    table = pq.read_table(path)
+    assert [str(table.schema.field(title).type) for title in ("Key", "Status", "Amount")] == ["string", "string", "double"]
+    assert table.column("Amount").to_pylist() == [0.0, 1.5, None, 4.5, 6.0]
+    assert table.column("Status").to_pylist()[:2] == ["7", "Open"]
+    assert client.export_sheet(sheetId, path, infer_numbers=False) == 5
+    assert str(pq.read_table(path).schema.field("Amount").type) == "string"
+
+
+# attachments
+
+def test_download_attachments_survives_connection_errors(server, tmp_path):
+    sheetId = server.state.addSheet("sheet", COLUMNS, [["a"], ["b"]])
+    for number, row in enumerate(server.state.sheets[sheetId]["rows"]):
+        server.state.addAttachment(sheetId, row["id"], f"file{number}.bin", os.urandom(300000))
+    client = newClient(server)
+    get = client.transport.get
+    broken = []
+
+    def resetOnce(url, headers=None, **kwargs):
+        response = get(url, headers=headers, **kwargs)
+        if kwargs.get("stream") and not broken:
+            broken.append(url)
+            chunks = response.iter_content
+
+            def iter_content(chunk_size=1):
+                iterator = chunks(chunk_size=65536)
+                yield next(iterator)
+                raise requests.ConnectionError("connection reset")
+            response.iter_content = iter_content
+        return response
+    client.transport.get = resetOnce
+    report = client.download_attachments(sheetId, str(tmp_path))
+    assert (len(report["downloaded"]), len(report["failed"])) == (1, 1)
+    assert any(name.endswith(".part") for name in os.listdir(tmp_path))
+    report = client.download_attachments(sheetId, str(tmp_path))
+    assert (len(report["downloaded"]), len(report["skipped"]), len(report["failed"])) == (1, 1, 0)
+    assert not any(name.endswith(".part") for name in os.listdir(tmp_path))
+
+
+def test_attach_files_per_item_errors(server, tmp_path):
+    sheetId = server.state.addSheet("sheet", COLUMNS, [["a"]])
+    rowId = server.state.sheets[sheetId]["rows"][0]["id"]
+    path = pathlib.Path(tmp_path) / "notes.txt"
+    path.write_bytes(b"notes")
+    client = newClient(server)
+    result = client.attach_files([
+        {"sheetId": sheetId, "rowId": rowId, "body": b"no name"},
+        {"sheetId": sheetId, "rowId": rowId, "body": path},
+        {"sheetId": sheetId, "rowId": rowId, "body": "text content", "name_file": "text.txt"},
+    ])
+    assert result[0] is None
+    assert [attachment["name"] for attachment in result[1:]] == ["notes.txt", "text.txt"]
+
+
+# asyncio
+
+def test_async_fan_out_keeps_a_shared_client_open(server):
+    sheets = [server.state.addSheet(f"sheet {n}", COLUMNS) for n in range(3)]
+    client = newClient(server)
+
+    async def addColumns():
+        wrapper = AsyncSmartsheet(client.token, max_concurrency=2, client=client)
+        result = await wrapper.create_columns(sheets, [{"title": "New", "type": "TEXT_NUMBER"}])
+        await wrapper.close()
+        return result
+    assert asyncio.run(addColumns()) == [None, None, None]
+    assert all(client.getColumnDict(sheetId).get("New") for sheetId in sheets)
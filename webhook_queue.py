@@ -0,0 +1,146 @@
+import json
+import logging
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class EventQueue:
+
+    def __init__(self, path: str, process: Callable[[int, list], dict], window: float = 5.0,
+                 max_delay: float = 60.0, max_workers: int = 4):
+        """
+        Coalescing queue of webhook events backed by SQLite. Callbacks of a sheet are kept until no
+        new callback arrives for window seconds (or max_delay seconds after the first one), then all
+        their events are merged and process(sheetId, events) is called once for the batch. Batches run
+        in a pool of max_workers threads and a sheet never has two batches running at the same time.
+        Events are removed only after they are processed, so pending events survive a restart.
+        Args:
+            :param path is the SQLite file of the queue
+            :param process is the function that applies the merged events of a sheet
+            :param window is the number of quiet seconds before the events of a sheet are processed
+            :param max_delay is the maximum number of seconds an event waits during a continuous burst
+            :param max_workers is the number of batches processed at the same time
+        """
+        self.process = process
+        self.window = window
+        self.max_delay = max_delay
+        self.max_workers = max_workers
+        self._lock = threading.Lock()
+        self._wakeup = threading.Condition(self._lock)
+        self._running = set()
+        self._stopped = True
+        self._dispatcher = None
+        self._executor = None
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("""CREATE TABLE IF NOT EXISTS events (
+                                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                                sheet_id INTEGER NOT NULL,
+                                received_at REAL NOT NULL,
+                                events TEXT NOT NULL,
+                                claim TEXT)""")
+        self._db.execute("CREATE INDEX IF NOT EXISTS events_sheet ON events (sheet_id, claim)")
+        # batches claimed by a process that died are processed again
+        self._db.execute("UPDATE events SET claim = NULL WHERE claim IS NOT NULL")
+
+    def enqueue(self, sheetId: int, events: list) -> None:
+        with self._wakeup:
+            self._db.execute("INSERT INTO events (sheet_id, received_at, events) VALUES (?, ?, ?)",
+                             (sheetId, time.time(), json.dumps(events)))
+            self._wakeup.notify()
+
+    def pending(self) -> int:
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM events").fetchone()[0]
+
+    def _dueSheets(self, now: float, force: bool = False) -> tuple:
+        """Sheets ready to be processed and the seconds until the next one is ready"""
+        rows = self._db.execute("""SELECT sheet_id, MIN(received_at), MAX(received_at) FROM events
+                                   WHERE claim IS NULL GROUP BY sheet_id""").fetchall()
+        due = []
+        wait = None
+        for sheetId, first, last in rows:
+            if sheetId in self._running:
+                continue
+            ready_at = min(last + self.window, first + self.max_delay)
+            if force or ready_at <= now:
+                due.append(sheetId)
+            else:
+                wait = ready_at - now if wait is None else min(wait, ready_at - now)
+        return due, wait
+
+    def _claim(self, sheetId: int) -> tuple:
+        claim = uuid.uuid4().hex
+        self._db.execute("UPDATE events SET claim = ? WHERE sheet_id = ? AND claim IS NULL", (claim, sheetId))
+        batches = self._db.execute("SELECT events FROM events WHERE claim = ? ORDER BY id", (claim,)).fetchall()
+        self._running.add(sheetId)
+        events = [event for (batch,) in batches for event in json.loads(batch)]
+        return claim, events, len(batches)
+
+    def _run(self, sheetId: int, claim: str, events: list, callbacks: int) -> Optional[dict]:
+        try:
+            result = self.process(sheetId, events)
+        except Exception:
+            logger.exception("failed processing %s callbacks of sheet %s", callbacks, sheetId)
+            with self._wakeup:
+                # the batch waits a new window before it is tried again
+                self._db.execute("UPDATE events SET claim = NULL, received_at = ? WHERE claim = ?", (time.time(), claim))
+                self._running.discard(sheetId)
+                self._wakeup.notify()
+            return None
+        with self._wakeup:
+            self._db.execute("DELETE FROM events WHERE claim = ?", (claim,))
+            self._running.discard(sheetId)
+            # events received while the batch was running may be due now
+            self._wakeup.notify()
+        logger.info("sheet %s: %s callbacks, %s events processed once", sheetId, callbacks, len(events))
+        return result
+
+    def _dispatch(self) -> None:
+        with self._wakeup:
+            while not self._stopped:
+                due, wait = self._dueSheets(time.time())
+                for sheetId in due:
+                    if len(self._running) >= self.max_workers:
+                        break
+                    self._executor.submit(self._run, sheetId, *self._claim(sheetId))
+                self._wakeup.wait(timeout=wait)
+
+    def start(self) -> "EventQueue":
+        with self._lock:
+            if not self._stopped:
+                return self
+            self._stopped = False
+            self._executor = ThreadPoolExecutor(max_workers=self.max_workers)
+            self._dispatcher = threading.Thread(target=self._dispatch, name="webhook-queue", daemon=True)
+            self._dispatcher.start()
+        return self
+
+    def stop(self, wait: bool = True) -> None:
+        """Stop dispatching batches, running batches are finished when wait is True. Events not processed
+        stay in the queue for the next start"""
+        with self._wakeup:
+            if self._stopped:
+                return
+            self._stopped = True
+            self._wakeup.notify()
+        self._dispatcher.join()
+        self._executor.shutdown(wait=wait)
+
+    def flush(self) -> List[Optional[dict]]:
+        """Process now, in the calling thread, every pending event without waiting for the window,
+        e.g. before the process ends. Sheets with a batch running are left for the dispatcher"""
+        with self._wakeup:
+            due, _ = self._dueSheets(time.time(), force=True)
+            claimed = [(sheetId, *self._claim(sheetId)) for sheetId in due]
+        return [self._run(*batch) for batch in claimed]
+
+    def close(self) -> None:
+        self.stop()
+        self._db.close()